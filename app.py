@@ -1,33 +1,413 @@
-from flask import Flask, render_template, jsonify, request, session
+from flask import Flask, Response, render_template, jsonify, request, session, abort, has_request_context, copy_current_request_context
 from flask_socketio import SocketIO, emit, join_room, leave_room
+from socketio import Manager as SocketIOManager
 from avalon import AvalonGame
+from room_actor import RoomScheduler, MailboxFull
+from game_id import GameIdAllocator
+from room_reaper import RoomReaper
+from journal import Journal
+from static_assets import StaticAssets, Asset, asset_response
+from cluster import HashRing, UnixSocketBus, BusError
+from room_store import CachedStore, open_store
+from log_pipeline import LogPipeline
+from metrics import Registry, CountingJSON
+from posterior import RolePosterior
+from spectators import SpectatorHub
+from rate_limit import RateLimiter
+from idempotency import AckWindow
+from timer_wheel import TimerWheel
+from handoff import write_handoff, read_handoff, HandoffError
+from game_history import GameHistory, REJECTIONS, QUESTS_FAILED, MERLIN_KILLED, MERLIN_SURVIVED
+import atexit
+import functools
+import gc
+import os
 import secrets
-import random
+import signal
+import threading
+import time
 import logging
 
-# 设置日志级别
-logging.basicConfig(level=logging.DEBUG)
+# 日志在后台线程中格式化和写出（见 log_pipeline.py）；带房间的记录保存在房间的
+# 环形缓冲区中，低于输出级别的调试记录只在该房间出错时一起写出
+log_pipeline = LogPipeline(
+    os.environ.get('LOG_LEVEL', 'DEBUG'),
+    sample_rate=float(os.environ.get('LOG_DEBUG_SAMPLE', 1.0)),
+    ring_size=int(os.environ.get('LOG_RING_SIZE', 64)),
+    fmt=os.environ.get('LOG_FORMAT', 'text')
+).install()
+atexit.register(log_pipeline.stop)
 logger = logging.getLogger(__name__)
+log_pipeline.capture(logger)
 
-app = Flask(__name__)
+# 静态资源由 /assets 路由提供（带内容哈希、预压缩），不使用 Flask 默认的 /static
+app = Flask(__name__, static_folder=None)
 app.secret_key = secrets.token_hex(16)
+# 指标：/metrics 以 Prometheus 文本格式输出
+metrics_registry = Registry()
+handler_seconds = metrics_registry.histogram(
+    'awalong_handler_seconds', 'Socket.IO event handling time, including queueing in the room actor', 'event')
+handler_errors = metrics_registry.counter(
+    'awalong_handler_errors_total', 'Exceptions raised by Socket.IO event handlers', 'event')
+function_seconds = metrics_registry.histogram(
+    'awalong_function_seconds', 'Time spent in selected functions', 'function')
+emit_messages = metrics_registry.counter('awalong_emit_total', 'Socket.IO messages emitted', 'event')
+emit_recipients = metrics_registry.counter(
+    'awalong_emit_recipients_total', 'Clients addressed by emitted messages (fan-out)', 'event')
+emit_payload_bytes = metrics_registry.counter(
+    'awalong_emit_payload_bytes_total', 'Encoded payload bytes of emitted messages', 'event')
+emit_sent_bytes = metrics_registry.counter(
+    'awalong_emit_sent_bytes_total', 'Payload bytes times recipients of emitted messages', 'event')
+emit_fanout = metrics_registry.histogram(
+    'awalong_emit_fanout', 'Recipients per emitted message', buckets=(0, 1, 2, 5, 10, 20, 50, 100))
+spectator_skipped = metrics_registry.counter(
+    'awalong_spectator_skipped_total', 'Spectator frames not sent to watchers with a send backlog')
+throttled_events = metrics_registry.counter(
+    'awalong_throttled_total', 'Socket.IO events rejected by the per-connection or per-room rate limit', 'event')
+duplicate_votes = metrics_registry.counter(
+    'awalong_duplicate_votes_total', 'Votes identical to the one already cast, ignored', 'event')
+replayed_actions = metrics_registry.counter(
+    'awalong_replayed_actions_total', 'Retried client actions answered from the ack cache', 'event')
+stale_actions = metrics_registry.counter(
+    'awalong_stale_actions_total', 'Client actions rejected as older than the current round or sequence', 'event')
+phase_timeouts = metrics_registry.counter(
+    'awalong_phase_timeouts_total', 'Phase deadlines that expired and triggered default actions', 'phase')
+store_conflicts = metrics_registry.counter(
+    'awalong_store_conflicts_total', 'Room writes rejected because another worker changed the room first')
+dropped_frames = metrics_registry.counter(
+    'awalong_dropped_frames_total', 'game_state frames not sent to connections with a send backlog', 'event')
+socket_json = CountingJSON()
+# 连接的发送积压（尚未发出的 Engine.IO 数据包）超过该值时，不再给它发送 game_state 增量
+MAX_SEND_BACKLOG = int(os.environ.get('MAX_SEND_BACKLOG', 64))
+# 可以丢弃的广播：客户端发现版本号不连续时会自己请求完整快照
+DROPPABLE_EVENTS = frozenset({'game_state'})
+
+def eio_backlog(eio_sid):
+    """Engine.IO 连接尚未发出的数据包数（不在本进程或已关闭的连接为 0）"""
+    socket = socketio.server.eio.sockets.get(eio_sid)
+    return socket.queue.qsize() if socket is not None else 0
+
+class BackpressureManager(SocketIOManager):
+    """发送积压过多的连接跳过 game_state：单独的帧不发，合并帧去掉其中的 game_state 后发送
+
+    慢连接的发送队列因此只增长到 MAX_SEND_BACKLOG 左右（其他消息仍然照常发送），
+    恢复后客户端根据版本号的缺口请求一次完整快照，相当于把过期的增量合并成一帧。
+    只丢弃房间广播：直接回复单个连接的消息（例如 request_game_state 返回的快照）总是发送，
+    否则最需要重新同步的慢连接永远收不到快照。
+    """
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, **kwargs):
+        droppable = (event in DROPPABLE_EVENTS or event == 'batch') and room is not None \
+            and self.eio_sid_from_sid(room, namespace) is None
+        slow = [sid for sid, eio_sid in self.get_participants(namespace, room)
+                if eio_backlog(eio_sid) > MAX_SEND_BACKLOG] if droppable else ()
+        if not slow:
+            return super().emit(event, data, namespace, room=room, skip_sid=skip_sid, callback=callback, **kwargs)
+        skipped = skip_sid if isinstance(skip_sid, list) else [skip_sid] if skip_sid is not None else []
+        if event == 'batch':
+            kept = [frame for frame in data if frame[0] not in DROPPABLE_EVENTS]
+            for frame in data:
+                if frame[0] in DROPPABLE_EVENTS:
+                    dropped_frames.inc(frame[0], len(slow))
+            if kept:
+                # 所有慢连接共用一个去掉 game_state 的合并帧（只编码一次）
+                super().emit(event, kept, namespace, room=slow, callback=callback, **kwargs)
+        else:
+            dropped_frames.inc(event, len(slow))
+        return super().emit(event, data, namespace, room=room, skip_sid=skipped + slow, callback=callback, **kwargs)
+
+class MeteredManager(BackpressureManager):
+    """统计每条发送消息的接收者数量和负载字节数（负载只编码一次，见 CountingJSON）"""
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, **kwargs):
+        before = socket_json.encoded_bytes
+        super().emit(event, data, namespace, room=room, skip_sid=skip_sid, callback=callback, **kwargs)
+        payload = socket_json.encoded_bytes - before
+        members = self.rooms.get(namespace, {}).get(room)
+        recipients = len(members) if members is not None else 0
+        if skip_sid is not None and members is not None:
+            skipped = skip_sid if isinstance(skip_sid, list) else [skip_sid]
+            recipients -= sum(1 for sid in skipped if sid in members)
+        emit_messages.inc(event)
+        emit_recipients.inc(event, recipients)
+        emit_payload_bytes.inc(event, payload)
+        emit_sent_bytes.inc(event, payload * recipients)
+        emit_fanout.observe(recipients)
+
 # 修改 SocketIO 的初始化配置，允许跨域访问
-socketio = SocketIO(app, cors_allowed_origins="*")
+# 多个进程共享房间（ROOM_STORE）且不按游戏ID分配连接时，房间广播需要经过
+# SOCKETIO_MESSAGE_QUEUE（例如 redis://127.0.0.1:6379/1）转发到其他进程的连接
+# （此时使用消息队列的管理器，不统计发送的扇出和字节数）
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE'),
+                    client_manager=MeteredManager(), json=socket_json)
 games = {}  # 存储游戏实例
 game_states = {}  # 存储每个游戏的状态
 rooms = {}  # 存储房间信息
+sid_index = {}  # sid -> (房间ID, 玩家内部编号)
+# 多进程部署（cluster.py）：每个工作进程只负责一致性哈希环上属于自己的房间，
+# 大厅查询其他进程的房间时通过消息总线转发给房间所在的进程
+WORKER_INDEX = int(os.environ.get('WORKER_INDEX', 0))
+WORKER_COUNT = int(os.environ.get('WORKER_COUNT', 1))
+hash_ring = HashRing(WORKER_COUNT)
+cluster_bus = UnixSocketBus(os.environ['BUS_DIR']) if WORKER_COUNT > 1 else None
+# 游戏ID分配器：4位ID空间紧张时自动扩展到5位
+game_id_allocator = GameIdAllocator(
+    digits=4, max_digits=5,
+    owns=(lambda game_id: hash_ring.owner(game_id) == WORKER_INDEX) if WORKER_COUNT > 1 else None
+)
+# 房间回收：空闲超时、游戏结束后的保留时间（秒）和最大房间数
+ROOM_IDLE_TTL = float(os.environ.get('ROOM_IDLE_TTL', 1800))
+ROOM_FINISHED_TTL = float(os.environ.get('ROOM_FINISHED_TTL', 300))
+MAX_ROOMS = int(os.environ.get('MAX_ROOMS', 10000))
+REAPER_INTERVAL = float(os.environ.get('REAPER_INTERVAL', 10))
+room_reaper = RoomReaper(ROOM_IDLE_TTL, ROOM_FINISHED_TTL, MAX_ROOMS)
+# 每个房间一个 actor，保证同一房间内的事件按顺序执行
+ROOM_MAILBOX_SIZE = 64
+MAX_PLAYERS = 5  # join_game 允许的最大玩家数
+room_scheduler = RoomScheduler(socketio.server.eio, mailbox_size=ROOM_MAILBOX_SIZE)
+# 操作日志：设置 JOURNAL_DIR 后记录每个房间已接受的操作，重启时回放恢复房间
+JOURNAL_DIR = os.environ.get('JOURNAL_DIR')
+JOURNAL_SNAPSHOT_EVERY = int(os.environ.get('JOURNAL_SNAPSHOT_EVERY', 50))
+journal = Journal(JOURNAL_DIR) if JOURNAL_DIR else None
+# 广播合并：处理一条消息期间产生的房间广播先放入发件箱，处理结束后合并为一帧发送给
+# 声明支持 'batch' 的客户端（连接时 auth={'batch': true}），其余客户端仍逐条接收
+COALESCE_EMITS = os.environ.get('COALESCE_EMITS', '1') != '0'
+outboxes = {}  # room -> [(事件名, 数据)]
+batch_sids = set()  # 支持合并帧的客户端
+# 共享房间存储：设置 ROOM_STORE（memory://、sqlite:///路径、redis://主机:端口/库）后，
+# 每个事件处理完后把房间的紧凑记录写入存储，本地没有的房间按需从存储加载，
+# 因此多个进程和重启后的进程都可以接手任何房间。本地的 rooms/games 相当于缓存。
+ROOM_STORE = os.environ.get('ROOM_STORE')
+room_store = CachedStore(open_store(ROOM_STORE)) if ROOM_STORE else None
+# 观战：观众在 "<房间ID>:watch" 中，每 SPECTATOR_INTERVAL 秒收到一帧合并的公开事件
+# （见 spectators.py）；发送端积压超过 SPECTATOR_MAX_BACKLOG 个数据包的观众跳过当前帧
+SPECTATOR_INTERVAL = float(os.environ.get('SPECTATOR_INTERVAL', 0.25))
+SPECTATOR_MAX_BACKLOG = int(os.environ.get('SPECTATOR_MAX_BACKLOG', 32))
+spectator_hub = SpectatorHub(
+    max_pending=int(os.environ.get('SPECTATOR_MAX_PENDING', 64)),
+    max_watchers=int(os.environ.get('MAX_SPECTATORS', 1000))
+)
+
+# 阶段截止时间（秒，0 表示不限时）：超时后代替未行动的玩家执行默认操作（见 expire_phase）。
+# 所有房间共用一个分层时间轮，由一个后台任务每 DEADLINE_TICK 秒推进
+PHASE_TIMEOUTS = {
+    'proposal': float(os.environ.get('PROPOSAL_TIMEOUT', 120)),
+    'team_vote': float(os.environ.get('TEAM_VOTE_TIMEOUT', 90)),
+    'quest_vote': float(os.environ.get('QUEST_VOTE_TIMEOUT', 60)),
+    'assassination': float(os.environ.get('ASSASSINATION_TIMEOUT', 120)),
+}
+DEADLINE_TICK = float(os.environ.get('DEADLINE_TICK', 0.5))
+DEADLINE_RETRY = 1.0  # 房间繁忙时延后重试超时处理的秒数
+deadline_wheel = TimerWheel(tick=DEADLINE_TICK)
+
+# 对局历史：设置 HISTORY_DB（SQLite 文件路径）后，已结束的对局由后台线程批量写入，
+# /stats/games 从增量维护的聚合表返回各角色、各人数的胜率等统计（见 game_history.py）
+HISTORY_DB = os.environ.get('HISTORY_DB')
+game_history = GameHistory(HISTORY_DB) if HISTORY_DB else None
+if game_history is not None:
+    atexit.register(game_history.close)
+
+# 交接：收到 SIGTERM（docker stop）时进入排空模式，不再创建房间、不再接受房间事件，
+# 等房间 actor 处理完已投递的事件后把所有房间写入 HANDOFF_FILE，通知客户端重连后退出。
+# 新进程启动时读取该文件恢复房间，客户端重连后用恢复凭证回到原来的座位
+HANDOFF_FILE = os.environ.get('HANDOFF_FILE')
+DRAIN_TIMEOUT = float(os.environ.get('DRAIN_TIMEOUT', 5))
+draining = False
+
+# 限流：每个连接和每个房间各一个令牌桶（平均每秒事件数和允许的突发数），
+# 在事件投递到房间 actor 之前检查；速率设为 0 时不限制
+sid_limiter = RateLimiter(float(os.environ.get('SID_RATE', 10)), float(os.environ.get('SID_BURST', 20)))
+room_limiter = RateLimiter(float(os.environ.get('ROOM_RATE', 50)), float(os.environ.get('ROOM_BURST', 100)))
+throttled_sids = set()  # 上一个事件被限流的连接（只通知一次，直到再有事件被接受）
+
+def rate_limited(handler):
+    """按连接和房间限流：超出时不执行处理函数，连续被拒绝的连接只收到一次提示"""
+    event = handler.__name__[len('handle_'):]
+
+    @functools.wraps(handler)
+    def wrapper(data=None, *args):
+        room = data.get('game_id') if isinstance(data, dict) else None
+        room = str(room) if room else None
+        if sid_limiter.allow(request.sid) and (room not in rooms or room_limiter.allow(room)):
+            throttled_sids.discard(request.sid)
+            return handler(data, *args)
+        throttled_events.inc(event)
+        if request.sid not in throttled_sids:
+            throttled_sids.add(request.sid)
+            emit('error', {'message': '操作过于频繁，请稍后重试'})
+        return False
+    return wrapper
+
+# 幂等操作：客户端为每个操作带上座位内递增的序号 seq（以及看到的提名轮次 round），
+# 每个座位保存最近 ACK_WINDOW 个操作的回执
+ACK_WINDOW = int(os.environ.get('ACK_WINDOW', 16))
+
+def action_round(game):
+    """当前的提名轮次（已提名的次数），操作带的 round 与之不同说明客户端看到的状态已经过期"""
+    return len(game.history)
+
+def idempotent(handler):
+    """带序号的操作只执行一次：重复提交返回缓存的 action_ack，过期的序号或轮次直接拒绝
+
+    在房间 actor 中执行。不带 seq 的请求（旧客户端）照常处理；回执按座位保存，
+    断线后用恢复凭证回到座位的新连接重试时同样命中。
+    """
+    event = handler.__name__[len('handle_'):]
+
+    @functools.wraps(handler)
+    def wrapper(data=None, *args):
+        seq = data.get('seq') if isinstance(data, dict) else None
+        seat = sid_index.get(request.sid)
+        if not isinstance(seq, int) or isinstance(seq, bool) or seat is None or seat[0] != str(data.get('game_id')):
+            return handler(data, *args)
+        room, player = seat
+        window = game_states[room].setdefault('acks', {}).get(player)
+        if window is None:
+            window = game_states[room]['acks'][player] = AckWindow(ACK_WINDOW)
+        ack = window.get(seq)
+        if ack is not None:
+            replayed_actions.inc(event)
+            emit('action_ack', ack)
+            return ack['ok']
+        if window.is_stale(seq):
+            stale_actions.inc(event)
+            emit('action_ack', {'seq': seq, 'event': event, 'ok': False, 'message': '操作已过期'})
+            return False
+        stamped = data.get('round')
+        game = games.get(room)
+        if stamped is not None and game is not None and stamped != action_round(game):
+            stale_actions.inc(event)
+            ack = {'seq': seq, 'event': event, 'ok': False, 'message': '操作已过期'}
+        else:
+            ack = {'seq': seq, 'event': event, 'ok': handler(data, *args) is not False}
+        window.put(seq, ack)
+        emit('action_ack', ack)
+        return ack['ok']
+    return wrapper
+
+def run_in_room(room, fn, *args):
+    """在房间的 actor 中执行 fn 并等待结果；整个过程（包括写入共享存储）在当前请求的上下文中"""
+    run = copy_current_request_context(in_room) if has_request_context() else in_room
+    try:
+        return room_scheduler.call(room, run, room, fn, *args)
+    except MailboxFull:
+        logger.warning("Mailbox is full, rejecting event", extra={'room': room})
+        emit('error', {'message': '房间繁忙，请稍后重试'})
+        return False
+    finally:
+        if room in rooms:
+            room_reaper.touch(room)
+
+def in_room(room, fn, *args):
+    """在房间 actor 中执行 fn：先与共享存储同步，结束后保存房间，期间的房间广播合并发送"""
+    if room in outboxes:
+        return fn(*args)
+    sync_room(room)
+    if COALESCE_EMITS:
+        outboxes[room] = []
+    try:
+        return fn(*args)
+    finally:
+        arm_deadline(room)
+        persist_room(room)
+        if COALESCE_EMITS:
+            flush_outbox(room)
+
+def room_emit(room, event, data):
+    """向房间广播；正在处理该房间的消息时先放入发件箱。同时交给观战频道（观众稍后收到）"""
+    spectator_hub.publish(room, event, data)
+    outbox = outboxes.get(room)
+    if outbox is None:
+        socketio.emit(event, data, room=room)
+    else:
+        outbox.append((event, data))
+
+def flush_outbox(room):
+    """发送发件箱中的广播：只有一条时直接发送，多条时合并帧发给 batch 子房间，逐条发给 legacy 子房间"""
+    events = outboxes.pop(room, None)
+    if not events:
+        return
+    if len(events) == 1:
+        socketio.emit(*events[0], room=room)
+        return
+    socketio.emit('batch', [[event, data] for event, data in events], room=f"{room}:batch")
+    for event, data in events:
+        socketio.emit(event, data, room=f"{room}:legacy")
+
+def join_game_room(room):
+    """当前连接加入房间，以及按是否支持合并帧加入对应的子房间"""
+    join_room(room)
+    join_room(f"{room}:{'batch' if request.sid in batch_sids else 'legacy'}")
+
+def room_serialized(handler):
+    """按 data['game_id'] 把事件投递到对应房间的 actor 中串行处理"""
+    @functools.wraps(handler)
+    def wrapper(data=None, *args):
+        if draining:
+            # 房间已经（或即将）写入交接文件，之后的修改会丢失；客户端重连后重试
+            emit('error', {'message': '服务器正在更新，请稍后重试'})
+            return False
+        room = data.get('game_id') if isinstance(data, dict) else None
+        if not room or (str(room) not in rooms and not sync_room(str(room))):
+            # 缺少游戏ID或房间不存在（不在本进程也不在共享存储中）时交给处理函数
+            # 自己报错或转发，不为其创建 actor
+            return handler(data, *args)
+        return run_in_room(str(room), handler, data, *args)
+    return wrapper
+
+# 静态资源和页面在启动时加载、渲染并预先压缩
+STATIC_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+static_assets = StaticAssets(STATIC_ROOT)
+
+def render_index():
+    """渲染 index.html（没有动态内容，资源地址带内容哈希）"""
+    with app.app_context():
+        html = render_template('index.html', asset=static_assets.url)
+    return Asset(html.encode('utf-8'), 'text/html; charset=utf-8')
+
+index_page = render_index()
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    # 页面地址不变，浏览器每次用 ETag 重新验证
+    return asset_response(index_page, 'no-cache')
+
+@app.route('/assets/<path:filename>')
+def static_asset(filename):
+    asset = static_assets.get(filename)
+    if asset is None:
+        abort(404)
+    return asset_response(asset, ASSET_CACHE_CONTROL)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/stats/game_ids')
+def game_id_stats():
+    return jsonify(game_id_allocator.stats())
+
+@app.route('/stats/games')
+def game_stats():
+    if game_history is None:
+        abort(404)
+    return jsonify(game_history.stats())
 
 @socketio.on('create_game')
-def handle_create_game():
-    logger.debug("Handling create_game request")
+@rate_limited
+def handle_create_game(data=None):
+    if draining:
+        emit('error', {'message': '服务器正在更新，请稍后再创建游戏'})
+        return False
+    if request.sid in sid_index:
+        # 每个连接只占一个座位（sid 索引和断线释放都按一个座位处理）
+        emit('error', {'message': '你已经在其他游戏中'})
+        return False
     room = generate_game_id()
-    logger.debug(f"Created room with ID: {room}")
+    logger.debug("Created room", extra={'room': room})
     
-    join_room(room)
+    join_game_room(room)
     
     # 初始化房间数据
     rooms[room] = {
@@ -35,46 +415,45 @@ def handle_create_game():
         'started': False,
         'game_id': room
     }
-    logger.debug(f"Rooms after creation: {rooms}")
-    
     # 初始化游戏状态
     if room not in game_states:
-        logger.debug(f"Initializing game state for room {room}")
         game_states[room] = {
             'connected_players': set(),
-            'player_sids': {},
-            'team_votes': {},
-            'quest_votes': {}
+            'player_sids': {}
         }
     
     # 添加创建者到玩家列表
     player_number = 0
+    token = secrets.token_urlsafe(12)
     rooms[room]['players'].append({
         'sid': request.sid,
-        'number': player_number + 1
+        'number': player_number + 1,
+        'token': token
     })
     
     # 更新游戏状态中的玩家信息
-    game_states[room]['connected_players'].add(player_number)
-    game_states[room]['player_sids'][player_number] = request.sid
+    bind_sid(request.sid, room, player_number)
+    room_reaper.touch(room)
+    record(room, {'e': 'create', 'k': token})
+    persist_room(room)
     
     emit('game_created', {
         'game_id': room,
         'player_id': player_number + 1,
         'player_count': 1,
-        'connected_players': [1]
+        'connected_players': [1],
+        'resume_token': resume_token(player_number, token)
     })
-    logger.debug(f"Emitted game_created event with game ID: {room}")
     return room
 
 @socketio.on('join_game')
+@rate_limited
+@room_serialized
 def handle_join_game(data):
     """处理加入游戏的请求"""
     try:
         room = data.get('game_id')
-        logger.debug(f"Attempting to join game with ID: {room}")
-        logger.debug(f"Request SID: {request.sid}")
-        logger.debug(f"Current rooms: {list(rooms.keys())}")
+        logger.debug("Join requested by %s", request.sid, extra={'room': room})
         
         # 检查游戏ID是否存在
         if not room:
@@ -85,284 +464,703 @@ def handle_join_game(data):
         # 确保room是字符串类型
         room = str(room)
         
+        # 房间属于其他工作进程：询问能否加入，可以时让客户端带上游戏ID重新连接
+        owner = remote_owner(room)
+        if owner is not None:
+            reply = ask_owner(owner, {'op': 'join_check', 'game_id': room})
+            if reply.get('ok'):
+                emit('switch_worker', {'game_id': room})
+            else:
+                emit('error', {'message': reply.get('message') or '游戏服务器暂时不可用'})
+            return False
+        
         # 检查游戏室是否存在
         if room not in rooms:
-            logger.debug(f"Room {room} not found")
-            logger.debug(f"Available rooms: {list(rooms.keys())}")
+            logger.debug("Room not found", extra={'room': room})
             emit('error', {'message': '游戏ID不存在'})
             return False
         
         # 游戏室存在
-        logger.debug(f"Found room {room}")
-        
         # 检查玩家是否已经在该房间中
-        player_sids = []
-        if room in game_states and 'player_sids' in game_states[room]:
-            player_sids = list(game_states[room]['player_sids'].values())
-        
-        if request.sid in player_sids:
-            logger.debug(f"Player {request.sid} already in room {room}")
+        seat = sid_index.get(request.sid)
+        if seat is not None and seat[0] == room:
+            logger.debug("Player %s already in room", request.sid, extra={'room': room})
             emit('error', {'message': '你已经在该游戏中'})
             return False
+        if seat is not None:
+            emit('error', {'message': '你已经在其他游戏中'})
+            return False
         
-        # 检查游戏是否已经开始
-        if rooms[room]['started']:
-            logger.debug(f"Room {room} has already started")
-            emit('error', {'message': '游戏已经开始'})
+        # 检查游戏是否已经开始、房间是否已满
+        reason = join_rejection(room)
+        if reason is not None:
+            logger.debug("Cannot join: %s", reason, extra={'room': room})
+            emit('error', {'message': reason})
             return False
         
         # 处理加入游戏
         try:
             # 初始化游戏状态
             if room not in game_states:
-                logger.debug(f"Initializing game state for room {room}")
                 game_states[room] = {
                     'connected_players': set(),
-                    'player_sids': {},
-                    'team_votes': {},
-                    'quest_votes': {}
+                    'player_sids': {}
                 }
             
-            # 检查房间是否已满
-            max_players = 5  # 默认最大玩家数
-            if 'players' not in rooms[room]:
-                rooms[room]['players'] = []
-                
-            if len(rooms[room]['players']) >= max_players:
-                logger.debug(f"Room {room} is full")
-                emit('error', {'message': '游戏房间已满'})
-                return False
-            
             # 获取当前玩家编号（基于已加入玩家数量）
             player_number = len(rooms[room]['players'])
-            logger.debug(f"Assigning player number {player_number + 1} in room {room}")
             
             # 添加新玩家到房间
+            token = secrets.token_urlsafe(12)
             rooms[room]['players'].append({
                 'sid': request.sid,
-                'number': player_number + 1
+                'number': player_number + 1,
+                'token': token
             })
             
             # 更新游戏状态中的玩家信息
-            game_states[room]['connected_players'].add(player_number)
-            game_states[room]['player_sids'][player_number] = request.sid
+            bind_sid(request.sid, room, player_number)
+            record(room, {'e': 'join', 'p': player_number, 'k': token})
             
             # 现在真正加入Socket.IO房间
-            join_room(room)
-            logger.debug(f"Successfully joined room: {room}")
-            
-            logger.debug(f"Added player {player_number + 1} to room {room}")
-            logger.debug(f"Current players in room: {[p['number'] for p in rooms[room]['players']]}")
+            join_game_room(room)
+            logger.debug("Player %d joined", player_number + 1, extra={'room': room})
             
             # 先发送加入成功的确认
             emit('joined_game', {
                 'game_id': room, 
                 'player_id': player_number + 1,
                 'player_count': len(rooms[room]['players']),
-                'connected_players': [p['number'] for p in rooms[room]['players']]
+                'connected_players': [p['number'] for p in rooms[room]['players']],
+                'resume_token': resume_token(player_number, token)
             })
-            logger.debug(f"Emitted joined_game event for room: {room}")
             
             # 广播玩家加入信息
-            socketio.emit('player_joined', {
+            room_emit(room, 'player_joined', {
                 'player_id': player_number + 1,
                 'connected_players': [p['number'] for p in rooms[room]['players']],
                 'player_count': len(rooms[room]['players'])
-            }, room=room)
+            })
             
             return True
             
         except Exception as e:
-            logger.error(f"Error processing join_game: {str(e)}")
-            logger.exception("详细错误堆栈")
+            logger.exception("Error processing join_game", extra={'room': room})
             emit('error', {'message': f'加入游戏处理失败: {str(e)}'})
             return False
     except Exception as e:
-        logger.error(f"Unexpected error in join_game: {str(e)}")
-        logger.exception("详细错误堆栈")
+        logger.exception("Unexpected error in join_game")
         try:
             emit('error', {'message': f'加入游戏失败: {str(e)}'})
         except Exception as emit_error:
-            logger.error(f"Failed to emit error: {str(emit_error)}")
+            logger.error("Failed to emit error: %s", emit_error)
         return False
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    # 获取当前socket的session id
-    sid = request.sid
-    for game_id in games:
-        if game_id in game_states and 'player_sids' not in game_states[game_id]:
-            game_states[game_id]['player_sids'] = {}
-        
-        # 找到断开连接的玩家
-        player_sids = game_states[game_id]['player_sids']
-        disconnected_player = None
-        for player_id, player_sid in player_sids.items():
-            if player_sid == sid:
-                disconnected_player = player_id
-                break
-        
-        if disconnected_player is not None:
-            game_states[game_id]['connected_players'].remove(disconnected_player)
-            del game_states[game_id]['player_sids'][disconnected_player]
-            socketio.emit('player_left', {
-                'player_id': disconnected_player + 1,  # 转换回显示用的编号
-                'connected_players': [p + 1 for p in game_states[game_id]['connected_players']]
-            }, room=game_id)
+    batch_sids.discard(request.sid)
+    sid_limiter.forget(request.sid)
+    throttled_sids.discard(request.sid)
+    spectator_hub.unwatch(request.sid)
+    # 通过 sid 索引直接找到断开连接的玩家所在的房间和座位
+    seat = sid_index.pop(request.sid, None)
+    if seat is None:
+        return
+    room, player_index = seat
+    run_in_room(room, release_seat, room, player_index, request.sid)
 
-def emit_game_state(game_id):
-    game = games[game_id]
-    socketio.emit('game_state', {
+def bind_sid(sid, room, player_index):
+    """把 sid 绑定到房间中的座位，并同步更新 sid 索引"""
+    sid_index[sid] = (room, player_index)
+    game_states[room]['connected_players'].add(player_index)
+    game_states[room]['player_sids'][player_index] = sid
+    if not game_over(room):
+        # 无人时按结束状态标记的房间重新有人，恢复空闲超时
+        room_reaper.reopen(room)
+
+def release_seat(room, player_index, sid):
+    """玩家断开连接后释放座位（房间可能尚未开始游戏）"""
+    state = game_states.get(room)
+    if state is None or state.get('player_sids', {}).get(player_index) != sid:
+        return
+    state['connected_players'].discard(player_index)
+    del state['player_sids'][player_index]
+    if not state['connected_players']:
+        # 所有玩家都已离开，房间按结束状态回收
+        room_reaper.mark_finished(room)
+    room_emit(room, 'player_left', {
+        'player_id': player_index + 1,  # 转换回显示用的编号
+        'connected_players': [p + 1 for p in state['connected_players']]
+    })
+
+def resume_token(player_index, token):
+    """发给客户端的恢复凭证：座位编号加上该座位的随机串，恢复时不需要查找"""
+    return f"{player_index + 1}.{token}"
+
+@socketio.on('resume_session')
+@rate_limited
+@room_serialized
+def handle_resume_session(data):
+    """断线重连：用加入时得到的恢复凭证把新连接绑定回原来的座位
+
+    只修改连接状态（不写入日志和共享存储），回复一个包含角色、当前状态、待表决
+    队伍和自己投票情况的快照，大量客户端同时重连时每个请求都是 O(1)。
+    """
+    room = str(data.get('game_id') or '')
+    owner = remote_owner(room) if room else None
+    if owner is not None:
+        emit('switch_worker', {'game_id': room})
+        return False
+    if room not in rooms:
+        emit('resume_failed', {'game_id': room, 'message': '游戏ID不存在'})
+        return False
+    number, _, secret = str(data.get('token') or '').partition('.')
+    players = rooms[room]['players']
+    seat = int(number) - 1 if number.isdigit() else -1
+    if not 0 <= seat < len(players) or not players[seat].get('token') \
+            or not secrets.compare_digest(players[seat]['token'], secret):
+        emit('resume_failed', {'game_id': room, 'message': '无效的恢复凭证'})
+        return False
+    
+    bound = sid_index.get(request.sid)
+    if bound is not None and bound != (room, seat):
+        emit('resume_failed', {'game_id': room, 'message': '你已经在其他游戏中'})
+        return False
+    
+    state = game_states[room]
+    previous = state['player_sids'].get(seat)
+    if previous != request.sid:
+        if previous is not None:
+            # 旧连接还没有断开（例如网络切换）：解除它与座位的绑定，不再收到房间广播
+            sid_index.pop(previous, None)
+            for name in (room, f"{room}:batch", f"{room}:legacy"):
+                socketio.server.leave_room(previous, name)
+        players[seat]['sid'] = request.sid
+        bind_sid(request.sid, room, seat)
+        join_game_room(room)
+    
+    emit('session_resumed', resume_snapshot(room, seat))
+    if previous is None:
+        room_emit(room, 'player_joined', {
+            'player_id': seat + 1,
+            'connected_players': sorted(p + 1 for p in state['connected_players']),
+            'player_count': len(players)
+        })
+    return True
+
+def resume_snapshot(room, seat):
+    """重连玩家需要的全部状态"""
+    state = game_states[room]
+    snapshot = {
+        'game_id': room,
+        'player_id': seat + 1,
+        'player_count': len(rooms[room]['players']),
+        'connected_players': sorted(p + 1 for p in state['connected_players']),
+        'started': rooms[room]['started'],
+        'role_info': None,
+        'state': None,
+        'team': None,
+        'team_vote': None,
+        'quest_team': None,
+        'quest_vote': None,
+        'round': 0
+    }
+    game = games.get(room)
+    if game is None:
+        return snapshot
+    role_infos = state.get('role_infos')
+    if role_infos is None:
+        role_infos = state['role_infos'] = game.role_infos()
+    snapshot['role_info'] = {**role_infos[seat], 'player_number': seat + 1}
+    if 'public_state' not in state:
+        state['public_state'] = public_game_state(game)
+        state['state_version'] = state.get('state_version', 0) + 1
+    snapshot['state'] = game_state_snapshot(room)
+    snapshot['round'] = action_round(game)
+    if game.team_ballot is not None:
+        snapshot['team'] = [i + 1 for i in game.quest_team]
+        snapshot['team_vote'] = game.team_ballot.vote_of(seat)
+    if game.quest_ballot is not None:
+        snapshot['quest_team'] = [i + 1 for i in game.quest_team]
+        snapshot['quest_vote'] = game.quest_ballot.vote_of(seat)
+    return snapshot
+
+def public_game_state(game):
+    """游戏的公开状态（不包含任何玩家的阵营信息）"""
+    return {
         'current_quest': game.current_quest + 1,
         'quest_results': ['成功' if r else '失败' for r in game.quest_results],
-        'required_players': game.get_quest_requirement(),
+        'required_players': game.get_quest_requirement() if game.current_quest < 5 else None,
         'leader': game.leader_index + 1,
         'vote_track': game.vote_track,
-        'player_count': game.player_count,
-        'camps': {i: game.ROLE_CAMPS[role] for i, (_, role) in enumerate(game.players)}  # 添加所有玩家的阵营信息
-    }, room=game_id)
+        'player_count': game.player_count
+    }
+
+@function_seconds.time('emit_game_state')
+def emit_game_state(game_id):
+    """广播带版本号的增量状态：只包含与上一次相比发生变化的字段"""
+    state = game_states[game_id]
+    current = public_game_state(games[game_id])
+    previous = state.get('public_state')
+    state['state_version'] = state.get('state_version', 0) + 1
+    state['public_state'] = current
+    if previous is None:
+        payload = {**current, 'version': state['state_version'], 'delta': False}
+    else:
+        payload = {k: v for k, v in current.items() if previous.get(k) != v}
+        payload['version'] = state['state_version']
+        payload['delta'] = True
+    room_emit(game_id, 'game_state', payload)
+
+def game_state_snapshot(game_id):
+    """最近一次广播的完整状态，用于客户端发现版本号不连续时重新同步"""
+    state = game_states[game_id]
+    return {**state['public_state'], 'version': state['state_version'], 'delta': False}
+
+@socketio.on('request_game_state')
+@rate_limited
+@room_serialized
+def handle_request_game_state(data):
+    game_id = str(data.get('game_id', ''))
+    if game_id not in games or 'public_state' not in game_states.get(game_id, {}):
+        emit('error', {'message': '游戏不存在'})
+        return
+    emit('game_state', game_state_snapshot(game_id))
 
 @socketio.on('propose_team')
+@rate_limited
+@room_serialized
+@idempotent
 def handle_propose_team(data):
     game_id = data['game_id']
     team = [int(x) - 1 for x in data['team']]  # 转换为内部索引
     
     if game_id not in games:
         emit('error', {'message': '游戏不存在'})
-        return
+        return False
+    if deadline_phase(game_id) != 'proposal':
+        emit('error', {'message': '现在不是提名队伍的阶段'})
+        return False
+    if sid_index.get(request.sid) != (game_id, games[game_id].leader_index):
+        emit('error', {'message': '只有队长可以提名队伍'})
+        return False
         
+    if propose(game_id, team):
+        return True
+    emit('error', {'message': '无效的队伍选择'})
+    return False
+
+def propose(game_id, team):
+    """队长提名队伍：记录并广播，队伍无效时返回 False"""
     game = games[game_id]
-    if game.propose_team(game.leader_index, team):
-        game_states[game_id]['team_votes'] = {}  # 重置投票状态
-        socketio.emit('team_proposed', {
-            'team': [x + 1 for x in team],
-            'player_count': game.player_count
-        }, room=game_id)
-    else:
-        emit('error', {'message': '无效的队伍选择'})
+    if not game.propose_team(game.leader_index, team):
+        return False
+    record(game_id, {'e': 'propose', 't': team})
+    room_emit(game_id, 'team_proposed', {
+        'team': [x + 1 for x in team],
+        'player_count': game.player_count,
+        'round': len(game.history)
+    })
+    return True
 
 @socketio.on('team_vote')
+@rate_limited
+@room_serialized
+@idempotent
 def handle_team_vote(data):
     game_id = data['game_id']
-    vote = data['vote']
-    player_id = int(data['player_id']) - 1  # 转换为内部索引
-    
-    logger.debug(f"收到玩家{player_id+1}的投票: {vote}")
+    vote = bool(data['vote'])
     
     if game_id not in games:
-        logger.error(f"游戏ID {game_id} 不存在")
+        logger.warning("Team vote for unknown game", extra={'room': game_id})
         emit('error', {'message': '游戏不存在'})
-        return
+        return False
+    player_id = voter_seat(game_id, data)
+    if player_id is None:
+        return False
         
+    ballot = games[game_id].team_ballot
+    if ballot is not None and ballot.vote_of(player_id) == vote:
+        # 重复提交相同的票：状态不变，不记录、不写入、不广播
+        duplicate_votes.inc('team_vote')
+        return True
+    logger.debug("Team vote from player %d: %s", player_id + 1, vote, extra={'room': game_id})
+    try:
+        cast_team_vote(game_id, player_id, vote)
+    except ValueError as e:
+        emit('error', {'message': str(e)})
+        return False
+    return True
+
+def voter_seat(game_id, data):
+    """投票者的座位（内部索引），来自 sid 索引而不是客户端提交的编号；发送者不在该房间的
+    座位上，或 player_id 不是自己的编号时报错并返回 None"""
+    bound = sid_index.get(request.sid)
+    if bound is None or bound[0] != game_id:
+        emit('error', {'message': '你不在该游戏中'})
+        return None
+    claimed = data.get('player_id')
+    if claimed is not None and int(claimed) - 1 != bound[1]:
+        emit('error', {'message': '不能替其他玩家投票'})
+        return None
+    return bound[1]
+
+def cast_team_vote(game_id, player_id, vote):
+    """记录一票（重复投票会覆盖之前的选择），所有玩家投完后立即结算并广播结果；
+    投票无效时抛出 ValueError"""
     game = games[game_id]
-    game_states[game_id]['team_votes'][player_id] = vote
-    logger.debug(f"当前投票状态: {game_states[game_id]['team_votes']}")
-    logger.debug(f"已投票人数: {len(game_states[game_id]['team_votes'])}, 总人数: {game.player_count}")
-    
-    # 检查是否所有玩家都已投票
-    if len(game_states[game_id]['team_votes']) == game.player_count:
-        logger.debug("所有玩家已投票，计算结果")
-        votes = []
-        try:
-            votes = [game_states[game_id]['team_votes'][i] 
-                    for i in range(game.player_count)]
-            logger.debug(f"投票列表: {votes}")
-        except Exception as e:
-            logger.error(f"生成投票列表时出错: {str(e)}")
-            logger.debug(f"当前投票字典: {game_states[game_id]['team_votes']}")
-            # 尝试按索引顺序创建投票列表
-            votes = []
-            for i in range(game.player_count):
-                if i in game_states[game_id]['team_votes']:
-                    votes.append(game_states[game_id]['team_votes'][i])
-                else:
-                    logger.error(f"玩家{i+1}的投票数据缺失")
-                    # 默认为反对票
-                    votes.append(False)
-        
-        result = game.team_vote(votes)
-        logger.debug(f"投票结果: {'通过' if result else '未通过'}")
-        logger.debug(f"任务队员: {game.quest_team}")
-        
-        # 转换为前端所需的格式
-        team_votes_for_client = {str(k): v for k, v in game_states[game_id]['team_votes'].items()}
-        logger.debug(f"发送给客户端的投票数据: {team_votes_for_client}")
-        
-        socketio.emit('team_vote_result', {
-            'success': result,
-            'votes': team_votes_for_client,
-            'team': [x + 1 for x in game.quest_team] if result else []  # 如果投票通过，发送队员列表
-        }, room=game_id)
-        
-        # 重置投票状态
-        game_states[game_id]['team_votes'] = {}
-        logger.debug("投票状态已重置")
-        
-        # 更新游戏状态
-        emit_game_state(game_id)
+    ballot = game.team_ballot
+    result = game.cast_team_vote(player_id, vote)
+    record(game_id, {'e': 'team_vote', 'p': player_id, 'v': vote})
+    
+    if result is None:
+        return
+    
+    if game.vote_track >= 5:
+        finish_game(game_id, REJECTIONS)
+    logger.debug("Team vote %s", 'approved' if result else 'rejected', extra={'room': game_id})
+    
+    room_emit(game_id, 'team_vote_result', {
+        'success': result,
+        'votes': {str(k): v for k, v in ballot.votes().items()},  # 转换为前端所需的格式
+        'team': [x + 1 for x in game.quest_team] if result else []  # 如果投票通过，发送队员列表
+    })
+    
+    # 更新游戏状态
+    emit_game_state(game_id)
 
 @socketio.on('quest_vote')
+@rate_limited
+@room_serialized
+@idempotent
 def handle_quest_vote(data):
     game_id = data['game_id']
-    vote = data['vote']
-    player_id = int(data['player_id']) - 1  # 转换为内部索引
+    vote = bool(data['vote'])
     
     if game_id not in games:
         emit('error', {'message': '游戏不存在'})
-        return
+        return False
+    player_id = voter_seat(game_id, data)
+    if player_id is None:
+        return False
         
+    ballot = games[game_id].quest_ballot
+    if ballot is not None and ballot.vote_of(player_id) == vote:
+        duplicate_votes.inc('quest_vote')
+        return True
+    try:
+        cast_quest_vote(game_id, player_id, vote)
+    except ValueError as e:
+        emit('error', {'message': str(e)})
+        return False
+    return True
+
+def cast_quest_vote(game_id, player_id, vote):
+    """记录一名任务队员的投票，所有队员都投票后才公布结果；投票无效时抛出 ValueError"""
     game = games[game_id]
-    if player_id not in game.quest_team:
-        emit('error', {'message': '你不是任务队员'})
+    ballot = game.quest_ballot
+    result = game.cast_quest_vote(player_id, vote)
+    record(game_id, {'e': 'quest_vote', 'p': player_id, 'v': vote})
+    
+    if result is None:
         return
-        
-    game_states[game_id]['quest_votes'][player_id] = vote
     
-    # 检查是否所有任务队员都已投票
-    if len(game_states[game_id]['quest_votes']) == len(game.quest_team):
-        votes = [game_states[game_id]['quest_votes'][i] for i in game.quest_team]
-        result = game.quest_vote(votes)
-        game_over, message = game.check_game_state()
-        
-        socketio.emit('quest_vote_result', {
-            'success': result,
-            'vote_count': {
-                'success': sum(1 for v in votes if v),
-                'fail': sum(1 for v in votes if not v)
-            },
-            'game_over': game_over,
-            'message': message
-        }, room=game_id)
-        
-        game_states[game_id]['quest_votes'] = {}  # 重置投票状态
-        emit_game_state(game_id)
+    game_over, message = game.check_game_state()
+    if game_over and not result:
+        finish_game(game_id, QUESTS_FAILED)
+    elif game_over:
+        # 正义方完成3次任务，等待刺杀结果
+        room_reaper.mark_finished(game_id)
+    
+    room_emit(game_id, 'quest_vote_result', {
+        'success': result,
+        'vote_count': {
+            'success': ballot.yes,
+            'fail': ballot.no
+        },
+        'game_over': game_over,
+        'message': message
+    })
+    
+    emit_game_state(game_id)
 
 @socketio.on('assassinate')
+@rate_limited
+@room_serialized
+@idempotent
 def handle_assassinate(data):
     game_id = data['game_id']
     target = int(data['target']) - 1
     
     if game_id not in games:
         emit('error', {'message': '游戏不存在'})
-        return
+        return False
+    if game_states[game_id].get('assassinated'):
+        emit('error', {'message': '刺杀已经结束'})
+        return False
+    if deadline_phase(game_id) != 'assassination':
+        emit('error', {'message': '现在不是刺杀阶段'})
+        return False
+    if sid_index.get(request.sid) != (game_id, games[game_id].assassin_index):
+        emit('error', {'message': '只有刺客可以刺杀'})
+        return False
         
+    assassinate(game_id, target)
+    return True
+
+def assassinate(game_id, target):
+    """结算刺杀；target 为 None 表示刺客超时未行动"""
     game = games[game_id]
-    merlin_index = next(i for i, (_, role) in enumerate(game.players) if role == '梅林')
-    success = target == merlin_index
+    success = target == game.merlin_index
+    game_states[game_id]['assassinated'] = True
+    record(game_id, {'e': 'assassinate', 't': target})
+    finish_game(game_id, MERLIN_KILLED if success else MERLIN_SURVIVED, target)
     
-    emit('assassination_result', {
-        'success': success,
-        'message': "刺客成功刺杀梅林！邪恶方获胜！" if success else "刺客猜错了！正义方获胜！"
-    }, room=game_id)
+    if target is None:
+        message = "刺客未在时限内行动！正义方获胜！"
+    elif success:
+        message = "刺客成功刺杀梅林！邪恶方获胜！"
+    else:
+        message = "刺客猜错了！正义方获胜！"
+    room_emit(game_id, 'assassination_result', {'success': success, 'message': message})
+
+def deadline_phase(room):
+    """房间当前等待玩家行动的阶段；游戏未开始或已结束时返回 None"""
+    game = games.get(room)
+    if game is None or not game.roles_assigned:
+        return None
+    if game.team_ballot is not None:
+        return 'team_vote'
+    if game.quest_ballot is not None:
+        return 'quest_vote'
+    if game.vote_track >= 5:
+        return None
+    successes = sum(1 for r in game.quest_results if r)
+    if successes >= 3:
+        return None if game_states[room].get('assassinated') else 'assassination'
+    if len(game.quest_results) - successes >= 3:
+        return None
+    return 'proposal'
+
+def deadline_key(room):
+    """标识当前阶段的一次出现（阶段、提名轮次、任务序号），阶段推进后即改变"""
+    phase = deadline_phase(room)
+    if phase is None:
+        return None
+    game = games[room]
+    return phase, len(game.history), game.current_quest
+
+def arm_deadline(room):
+    """阶段变化后在时间轮上重新设置房间的截止时间；阶段未变时保留原来的定时器"""
+    state = game_states.get(room)
+    if state is None:
+        return
+    key = deadline_key(room)
+    armed = state.get('deadline')
+    if armed is not None:
+        if armed.payload[1] == key:
+            return
+        armed.cancel()
+    timeout = PHASE_TIMEOUTS.get(key[0], 0) if key is not None else 0
+    if timeout > 0:
+        state['deadline'] = deadline_wheel.schedule(timeout, (room, key))
+    else:
+        state.pop('deadline', None)
+
+def expire_phase(room, key):
+    """阶段超时（在房间 actor 中执行）：代替未行动的玩家执行默认操作
+
+    队长未提名时提名队长及其后的玩家；未表决的玩家赞成；未投票的任务队员投成功；
+    刺客未行动时视为放弃刺杀，正义方获胜。
+    """
+    if room not in games or deadline_key(room) != key:
+        return  # 玩家已经行动，或房间已关闭
+    game = games[room]
+    phase = key[0]
+    if phase == 'proposal':
+        idle = [game.leader_index]
+    elif phase == 'team_vote':
+        idle = [seat for seat in range(game.player_count) if game.team_ballot.vote_of(seat) is None]
+    elif phase == 'quest_vote':
+        idle = [seat for seat in game.quest_team if game.quest_ballot.vote_of(seat) is None]
+    else:
+        idle = [game.assassin_index]
+    phase_timeouts.inc(phase)
+    logger.info("Phase %s timed out, acting for players %s", phase, [seat + 1 for seat in idle], extra={'room': room})
+    room_emit(room, 'phase_timeout', {'phase': phase, 'players': [seat + 1 for seat in idle]})
+    if phase == 'proposal':
+        size = game.get_quest_requirement()
+        propose(room, [(game.leader_index + i) % game.player_count for i in range(size)])
+    elif phase == 'team_vote':
+        for seat in idle:
+            cast_team_vote(room, seat, True)
+    elif phase == 'quest_vote':
+        for seat in idle:
+            cast_quest_vote(room, seat, True)
+    else:
+        assassinate(room, None)
+
+def expire_deadlines(now=None):
+    """推进时间轮，把到期的阶段交给对应房间的 actor 处理，返回到期的 (房间, 阶段) 列表"""
+    fired = deadline_wheel.advance(now)
+    for room, key in fired:
+        state = game_states.get(room)
+        if state is None:
+            continue
+        try:
+            room_scheduler.submit(room, in_room, room, expire_phase, room, key)
+        except MailboxFull:
+            # 房间繁忙，稍后重试
+            state['deadline'] = deadline_wheel.schedule(DEADLINE_RETRY, (room, key))
+    return fired
+
+def deadline_loop():
+    """后台任务：推进阶段截止时间的时间轮"""
+    while True:
+        socketio.sleep(DEADLINE_TICK)
+        expire_deadlines()
+
+def finish_game(game_id, reason, assassin_target=None):
+    """游戏分出最终胜负：取消阶段截止时间，房间按结束状态回收，对局写入历史（每局只写一次）"""
+    state = game_states[game_id]
+    deadline = state.pop('deadline', None)
+    if deadline is not None:
+        deadline.cancel()
+    room_reaper.mark_finished(game_id)
+    if state.get('recorded'):
+        return
+    state['recorded'] = True
+    if game_history is not None:
+        game_history.record(game_id, games[game_id], reason, assassin_target)
+
+def game_over(room):
+    """房间中的游戏已经完全结束（包括刺杀）"""
+    game = games.get(room)
+    return game is not None and game.roles_assigned and deadline_phase(room) is None
+
+def role_posterior(room):
+    """房间公开记录上的角色后验，缓存在房间状态中，每次只处理新增的记录"""
+    game = games[room]
+    state = game_states[room]
+    cached = state.get('posterior')
+    if cached is None or cached[0] is not game:
+        # 从共享存储或日志重新加载的游戏是新的对象，从头计算
+        cached = state['posterior'] = (game, RolePosterior(game.player_count))
+    return cached[1].sync(game.history)
+
+@socketio.on('request_role_probabilities')
+@rate_limited
+@room_serialized
+def handle_request_role_probabilities(data):
+    game_id = str(data.get('game_id', ''))
+    if game_id not in games or not games[game_id].roles_assigned:
+        emit('error', {'message': '游戏不存在'})
+        return
+    watching = spectator_hub.room_of(request.sid) == game_id and request.sid not in sid_index
+    if not game_over(game_id) and not watching:
+        # 游戏进行中（包括刺杀阶段，推断会暴露梅林）只有观众可以查看推断，玩家在游戏结束后复盘时查看
+        emit('error', {'message': '游戏结束后才能查看推断'})
+        return
+    posterior = role_posterior(game_id)
+    emit('role_probabilities', {
+        'game_id': game_id,
+        'players': posterior.summary(),
+        'worlds': posterior.world_count
+    })
+
+@socketio.on('spectate_game')
+@rate_limited
+@room_serialized
+def handle_spectate_game(data):
+    """观看房间：回复公开状态的快照，之后定期收到 spectator_update"""
+    room = str(data.get('game_id') or '')
+    owner = remote_owner(room) if room else None
+    if owner is not None:
+        emit('switch_worker', {'game_id': room, 'spectate': True})
+        return False
+    if room not in rooms:
+        emit('error', {'message': '游戏ID不存在'})
+        return False
+    if sid_index.get(request.sid, (None,))[0] == room:
+        emit('error', {'message': '你已经在该游戏中'})
+        return False
+    previous = spectator_hub.room_of(request.sid)
+    if not spectator_hub.watch(room, request.sid):
+        emit('error', {'message': '观战人数已满'})
+        return False
+    if previous is not None and previous != room:
+        leave_room(f"{previous}:watch")
+    join_room(f"{room}:watch")
+    emit('spectating', spectator_snapshot(room))
+    return True
+
+def spectator_snapshot(room):
+    """观众看到的完整公开状态：座位、当前状态、待表决或执行中的队伍和全部公开记录"""
+    state = game_states.get(room, {})
+    game = games.get(room)
+    snapshot = {
+        'game_id': room,
+        'player_count': len(rooms[room]['players']),
+        'connected_players': sorted(p + 1 for p in state.get('connected_players', ())),
+        'started': rooms[room]['started'],
+        'state': game_state_snapshot(room) if 'public_state' in state else None,
+        'team': None,
+        'history': []
+    }
+    if game is not None:
+        if game.team_ballot is not None or game.quest_ballot is not None:
+            snapshot['team'] = [i + 1 for i in game.quest_team]
+        snapshot['history'] = [
+            {'leader': leader + 1, 'team': [i + 1 for i in team],
+             'approvals': None if yes is None else [i + 1 for i in range(game.player_count) if yes >> i & 1],
+             'fails': fails}
+            for leader, team, yes, fails in game.history]
+    return snapshot
+
+def outbound_backlog(sid):
+    """连接尚未发出的数据包数（不在本进程的连接为 0）"""
+    eio_sid = socketio.server.manager.eio_sid_from_sid(sid, '/')
+    return eio_backlog(eio_sid) if eio_sid is not None else 0
+
+def flush_spectators():
+    """把每个房间待发的公开事件合并成一帧发给该房间的观众（一帧只编码一次）"""
+    for room, seq, events in spectator_hub.take():
+        if room not in rooms:
+            continue
+        frame = {'game_id': room, 'seq': seq}
+        if events is None:
+            frame['snapshot'] = spectator_snapshot(room)
+        else:
+            frame['events'] = events
+        skip = []
+        for sid in spectator_hub.watchers(room):
+            if outbound_backlog(sid) > SPECTATOR_MAX_BACKLOG:
+                skip.append(sid)
+                spectator_hub.mark_stale(room, sid)
+                spectator_skipped.inc()
+            elif spectator_hub.is_stale(room, sid):
+                # 积压已清空：单独补发快照代替跳过的帧
+                skip.append(sid)
+                spectator_hub.clear_stale(room, sid)
+                socketio.emit('spectator_update', {'game_id': room, 'seq': seq,
+                                                   'snapshot': spectator_snapshot(room)}, room=sid)
+        socketio.emit('spectator_update', frame, room=f"{room}:watch", skip_sid=skip)
+
+def spectator_loop():
+    """后台任务：定期向观众发送合并的更新"""
+    while True:
+        socketio.sleep(SPECTATOR_INTERVAL)
+        try:
+            flush_spectators()
+        except Exception:
+            logger.exception("Failed to flush spectator updates")
 
 @socketio.on('validate_game')
+@rate_limited
+@room_serialized
 def handle_validate_game(data):
     game_id = data.get('game_id', '')
-    logger.debug(f"Validating game with ID: {game_id}")
-    logger.debug(f"All rooms: {list(rooms.keys())}")
-    
     if not game_id:
-        logger.error("Empty game_id in validate_game request")
         emit('game_validated', {
             'valid': False,
             'message': '游戏ID不能为空'
@@ -372,84 +1170,442 @@ def handle_validate_game(data):
     # 确保game_id是字符串
     game_id = str(game_id)
     
-    if game_id in rooms:  # 使用 rooms 而不是 games 来验证
-        logger.debug(f"Found game {game_id}")
-        room = rooms[game_id]
-        
-        # 确保 game_states 中有该游戏的条目
-        if game_id not in game_states:
-            logger.debug(f"Initializing game_states for game {game_id}")
-            game_states[game_id] = {
-                'connected_players': set(),
-                'player_sids': {}
-            }
-        
-        connected_players = []
-        if 'connected_players' in game_states[game_id]:
-            connected_players = [p + 1 for p in game_states[game_id]['connected_players']]
-            logger.debug(f"Connected players for game {game_id}: {connected_players}")
-        
-        emit('game_validated', {
-            'valid': True,
-            'player_count': len(room['players']),  # 使用房间中的玩家数量
-            'connected_players': connected_players
-        })
-        logger.debug(f"Sent game_validated:true for game {game_id}")
-    else:
-        logger.debug(f"Game {game_id} not found")
-        emit('game_validated', {
-            'valid': False,
-            'message': '游戏ID不存在'
-        })
-        logger.debug(f"Sent game_validated:false for game {game_id}")
-
-def send_role_info(players, roles):
-    print("开始发送角色信息...")
-    print(f"当前所有玩家信息: {players}")
+    owner = remote_owner(game_id)
+    if owner is not None:
+        # 房间在其他工作进程中，由房间所在的进程回答
+        emit('game_validated', ask_owner(owner, {'op': 'validate', 'game_id': game_id}))
+        return
     
-    for player in players:
-        role = player['role']
-        print(f"\n处理玩家 {player['name']}, 角色: {role}, sid: {player['sid']}")
-        
-        if role == '梅林':
-            print(f"发现梅林玩家: {player['name']}")
-            evil_players = [p for p in players if p['camp'] == 'evil' and p['role'] != '莫德雷德']
-            print(f"梅林可见的邪恶方玩家: {evil_players}")
-            evil_info = [{
-                'name': p['name'],
-                'role': p['role']
-            } for p in evil_players]
-            print(f"准备发送给梅林的信息: {evil_info}")
-            socketio.emit('evil_players_info', evil_info, room=player['sid'])
-            
-        elif player['camp'] == 'evil':
-            print(f"发现邪恶方玩家: {player['name']}")
-            other_evil_players = [p for p in players if p['camp'] == 'evil' and p['sid'] != player['sid']]
-            print(f"该邪恶方可见的其他邪恶方: {other_evil_players}")
-            evil_info = [{
-                'name': p['name'],
-                'role': p['role']
-            } for p in other_evil_players]
-            print(f"准备发送给邪恶方的信息: {evil_info}")
-            socketio.emit('evil_players_info', evil_info, room=player['sid'])
+    result = validation_result(game_id)
+    emit('game_validated', result)
+    logger.debug("Validated: %s", result['valid'], extra={'room': game_id})
+
+def validation_result(game_id):
+    """validate_game 的回复（也用于回答其他工作进程的查询，只读取房间状态）"""
+    if game_id not in rooms:  # 使用 rooms 而不是 games 来验证
+        return {'valid': False, 'message': '游戏ID不存在'}
+    state = game_states.get(game_id, {})
+    return {
+        'valid': True,
+        'player_count': len(rooms[game_id]['players']),  # 使用房间中的玩家数量
+        'connected_players': [p + 1 for p in state.get('connected_players', ())]
+    }
+
+def join_rejection(room):
+    """不能加入房间的原因，可以加入时返回 None"""
+    if room not in rooms:
+        return '游戏ID不存在'
+    if rooms[room]['started']:
+        return '游戏已经开始'
+    if len(rooms[room]['players']) >= MAX_PLAYERS:
+        return '游戏房间已满'
+    return None
+
+def remote_owner(room):
+    """房间属于其他工作进程时返回该进程的编号，否则返回 None"""
+    if cluster_bus is None:
+        return None
+    owner = hash_ring.owner(room)
+    return owner if owner != WORKER_INDEX else None
+
+def ask_owner(owner, message):
+    """通过消息总线向房间所在的工作进程查询
+
+    总线请求是阻塞的套接字调用（本模块没有 monkey patch），在 gevent 下放到 hub 的线程池中
+    执行，等待回复时事件循环继续处理其他连接和其他进程发来的总线消息。
+    """
+    try:
+        if socketio.async_mode == 'gevent':
+            import gevent
+            return gevent.get_hub().threadpool.spawn(cluster_bus.request, owner, message).get()
+        return cluster_bus.request(owner, message)
+    except BusError as e:
+        logger.error("Bus request to worker %d failed: %s", owner, e)
+        return {'valid': False, 'ok': False, 'message': '游戏服务器暂时不可用'}
+
+def handle_bus_message(message):
+    """回答其他工作进程的大厅查询（经 hub_handler 在主线程的事件循环中执行）"""
+    op = message.get('op')
+    room = str(message.get('game_id', ''))
+    if op == 'validate':
+        return validation_result(room)
+    if op == 'join_check':
+        reason = join_rejection(room)
+        return {'ok': reason is None, 'message': reason}
+    return {'error': f'unknown op {op}'}
+
+def hub_handler(handler):
+    """包装总线的处理函数：总线在自己的线程中收到请求，交给主线程的 gevent hub 执行，
+    与房间事件处理在同一个线程中读取房间状态；总线线程等待结果后回复"""
+    if socketio.async_mode != 'gevent':
+        return handler
+    import gevent
+    loop = gevent.get_hub().loop  # 必须在主线程中获取
+
+    def call(message):
+        done = threading.Event()
+        outcome = []
+
+        def run():
+            try:
+                outcome.append((True, handler(message)))
+            except Exception as e:
+                outcome.append((False, e))
+            done.set()
+
+        loop.run_callback_threadsafe(gevent.spawn, run)  # 在普通 greenlet 中执行，可以等待 I/O
+        if not done.wait(cluster_bus.timeout if cluster_bus is not None else 2.0):
+            raise BusError("事件循环没有及时处理总线消息")
+        ok, value = outcome[0]
+        if not ok:
+            raise value
+        return value
+    return call
 
 def generate_game_id():
-    game_id = str(random.randint(1000, 9999))
-    logger.debug(f"Generated new game ID: {game_id}")
+    game_id = game_id_allocator.allocate()
+    # 使用共享存储时在存储中占用ID；已被其他进程占用的ID保持保留状态，换下一个
+    while room_store is not None and not room_store.create(game_id, empty_room_record()):
+        game_id = game_id_allocator.allocate()
     return game_id
 
+def close_room(room):
+    """关闭房间：清理房间数据、sid 索引和 actor，并回收游戏ID"""
+    state = game_states.pop(room, None)
+    if state is not None:
+        if state.get('deadline') is not None:
+            state['deadline'].cancel()
+        for sid in state.get('player_sids', {}).values():
+            if sid_index.get(sid, (None,))[0] == room:
+                del sid_index[sid]
+    rooms.pop(room, None)
+    games.pop(room, None)
+    room_scheduler.close(room)
+    room_reaper.forget(room)
+    room_limiter.forget(room)
+    game_id_allocator.release(room)
+    if journal is not None:
+        journal.remove(room)
+    if room_store is not None:
+        room_store.delete(room)
+    logger.debug("Closed room", extra={'room': room})
+
+def evict_room(room, reason):
+    """回收房间，并通知仍在房间中的客户端"""
+    logger.info("Evicting room (%s)", reason, extra={'room': room})
+    socketio.emit('room_closed', {'game_id': room, 'reason': reason}, room=room)
+    socketio.emit('room_closed', {'game_id': room, 'reason': reason}, room=f"{room}:watch")
+    for name in (room, f"{room}:batch", f"{room}:legacy", f"{room}:watch"):
+        socketio.close_room(name)
+    spectator_hub.close(room)
+    close_room(room)
+
+def sweep_rooms(now=None):
+    """回收空闲超时、已结束和超出房间上限的房间"""
+    evicted = room_reaper.expired(now) + room_reaper.over_capacity()
+    for room, reason in evicted:
+        try:
+            room_scheduler.submit(room, evict_room, room, reason)
+        except MailboxFull:
+            # 房间仍然繁忙，下一轮再处理
+            room_reaper.touch(room)
+    return evicted
+
+def reap_rooms():
+    """后台任务：定期回收房间"""
+    while True:
+        socketio.sleep(REAPER_INTERVAL)
+        sweep_rooms()
+
+def record(room, event):
+    """记录已接受的操作：标记房间需要写入共享存储，并写入房间日志，
+    每 JOURNAL_SNAPSHOT_EVERY 条操作写一次快照"""
+    state = game_states[room]
+    state['dirty'] = True
+    if journal is None:
+        return
+    journal.append(room, event)
+    state['journal_count'] = state.get('journal_count', 0) + 1
+    if state['journal_count'] % JOURNAL_SNAPSHOT_EVERY == 0:
+        journal.snapshot(room, room_snapshot(room))
+
+def room_snapshot(room):
+    """房间的紧凑快照（不包含连接相关的 sid）"""
+    game = games.get(room)
+    return {
+        'players': [p['number'] for p in rooms[room]['players']],
+        'tokens': [p.get('token') for p in rooms[room]['players']],
+        'started': rooms[room]['started'],
+        'game': game.to_state() if game is not None else None,
+        'assassinated': game_states[room].get('assassinated', False),
+        'recorded': game_states[room].get('recorded', False)
+    }
+
+def apply_event(room, event):
+    """回放一条日志记录，与对应处理函数对状态的修改保持一致（不发送任何事件）"""
+    kind = event['e']
+    if kind == 'create':
+        rooms[room]['players'].append({'sid': None, 'number': 1, 'token': event.get('k')})
+    elif kind == 'join':
+        rooms[room]['players'].append({'sid': None, 'number': event['p'] + 1, 'token': event.get('k')})
+    elif kind == 'start':
+        rooms[room]['started'] = True
+        game = AvalonGame(len(rooms[room]['players']))
+        game.assign_roles([AvalonGame.ROLE_NAMES[code] for code in event['c']])
+        games[room] = game
+    elif kind == 'propose':
+        game = games[room]
+        game.propose_team(game.leader_index, event['t'])
+    elif kind == 'team_vote':
+        games[room].cast_team_vote(event['p'], event['v'])
+    elif kind == 'quest_vote':
+        games[room].cast_quest_vote(event['p'], event['v'])
+    elif kind == 'assassinate':
+        # 不改变游戏状态，只表示刺杀已经结算、房间已结束
+        game_states[room]['assassinated'] = True
+
+def empty_room_record():
+    return {'players': [], 'started': False, 'game': None, 'version': 0}
+
+def load_room(room, snapshot):
+    """用快照（或共享存储中的记录）替换本地的房间状态，保留本进程中已连接的 sid"""
+    sids = {p['number']: p['sid'] for p in rooms[room]['players']} if room in rooms else {}
+    tokens = snapshot.get('tokens') or [None] * len(snapshot['players'])
+    rooms[room] = {
+        'players': [{'sid': sids.get(n), 'number': n, 'token': token}
+                    for n, token in zip(snapshot['players'], tokens)],
+        'started': snapshot['started'],
+        'game_id': room
+    }
+    if snapshot['game'] is not None:
+        games[room] = AvalonGame.from_state(snapshot['game'])
+    else:
+        games.pop(room, None)
+    state = game_states.setdefault(room, {
+        'connected_players': set(),
+        'player_sids': {}
+    })
+    state['store_version'] = snapshot.get('version', 0)
+    state['assassinated'] = snapshot.get('assassinated', False)
+    state['recorded'] = snapshot.get('recorded', False)
+
+def settle_room(room):
+    """房间在本进程中重建后：保留游戏ID、开始计时，并准备增量状态的基准"""
+    game_id_allocator.reserve(room)
+    room_reaper.touch(room)
+    state = game_states[room]
+    game = games.get(room)
+    if game is not None:
+        state['public_state'] = public_game_state(game)
+        state['state_version'] = state.get('state_version', 0) + 1
+        if game.check_game_state()[0] or game.vote_track >= 5:
+            room_reaper.mark_finished(room)
+    arm_deadline(room)
+
+def sync_room(room):
+    """本地房间落后于共享存储时从存储重新加载，返回房间是否存在
+
+    CachedStore 每次都向存储查询版本号，其他进程刚刚写入的记录不会被缓存掩盖；
+    版本号没有变化时使用缓存的记录。
+    """
+    if room_store is None:
+        return room in rooms
+    snapshot = room_store.load(room)
+    state = game_states.get(room)
+    if snapshot is None:
+        if state is not None and state.get('store_version'):
+            # 已经写入过存储的房间被其他进程关闭
+            evict_room(room, 'closed')
+        return room in rooms
+    if state is None or snapshot['version'] > state.get('store_version', 0):
+        load_room(room, snapshot)
+        settle_room(room)
+    return True
+
+@function_seconds.time('persist_room')
+def persist_room(room):
+    """把处理本次事件期间修改过的房间作为一条记录写入共享存储
+
+    只有存储中的版本号仍是处理前读到的版本号时才写入。其他进程在这期间修改了房间时
+    放弃本次修改：重新加载存储中的记录，向房间广播完整状态，并告知发送者重试。
+    """
+    state = game_states.get(room)
+    if room_store is None or state is None or not state.pop('dirty', False) or room not in rooms:
+        return
+    version = state.get('store_version', 0)
+    if room_store.save_if(room, {**room_snapshot(room), 'version': version + 1}, version):
+        state['store_version'] = version + 1
+        return
+    store_conflicts.inc()
+    logger.warning("Room changed in the shared store by another worker, discarding local change",
+                   extra={'room': room})
+    snapshot = room_store.load(room)
+    if snapshot is None:
+        evict_room(room, 'closed')
+        return
+    load_room(room, snapshot)
+    settle_room(room)
+    # 被放弃的修改中加入的座位在存储的记录中不存在
+    seats = len(rooms[room]['players'])
+    for seat, sid in list(game_states[room]['player_sids'].items()):
+        if seat >= seats:
+            sid_index.pop(sid, None)
+            release_seat(room, seat, sid)
+    if room in games:
+        room_emit(room, 'game_state', game_state_snapshot(room))
+    if has_request_context():
+        emit('error', {'message': '房间状态已被其他服务器更新，请重试'})
+
+def restore_room(room, snapshot, events):
+    """从快照和之后的日志记录重建房间；所有座位在玩家重新连接前都处于断开状态"""
+    rooms.pop(room, None)
+    game_states.pop(room, None)
+    load_room(room, snapshot if snapshot is not None else empty_room_record())
+    for event in events:
+        apply_event(room, event)
+    game_states[room]['journal_count'] = len(events)
+    settle_room(room)
+
+def restore_rooms():
+    """启动时从操作日志恢复所有房间，返回恢复的房间数"""
+    if journal is None:
+        return 0
+    restored = 0
+    for room, (snapshot, events) in journal.load_all().items():
+        if room in rooms:
+            continue  # 已从交接文件恢复，交接文件不会比日志旧
+        try:
+            restore_room(room, snapshot, events)
+            restored += 1
+        except Exception:
+            logger.exception("Failed to restore room from journal", extra={'room': room})
+            rooms.pop(room, None)
+            games.pop(room, None)
+            game_states.pop(room, None)
+    logger.info("Restored %d rooms from journal", restored)
+    return restored
+
+def handoff_path():
+    """本进程的交接文件；多进程部署时每个工作进程一个（哈希环不变，房间回到同一个进程）"""
+    if not HANDOFF_FILE:
+        return None
+    return HANDOFF_FILE if WORKER_COUNT == 1 else f"{HANDOFF_FILE}.{WORKER_INDEX}"
+
+def handoff_record(room):
+    """交接用的房间记录：快照加上共享存储版本和各座位的操作回执"""
+    state = game_states[room]
+    record = {**room_snapshot(room), 'version': state.get('store_version', 0)}
+    if state.get('acks'):
+        record['acks'] = {player: window.to_state() for player, window in state['acks'].items()}
+    return record
+
+def drain():
+    """进入排空模式并写入交接文件，返回写入的房间数
+
+    新的房间和房间事件从此被拒绝；每个房间 actor 先处理完已投递的事件（最多等待
+    DRAIN_TIMEOUT 秒），然后一次性序列化所有房间，期间不让出执行权。
+    """
+    global draining
+    draining = True
+    logger.info("Draining %d rooms", len(rooms))
+    deadline = time.monotonic() + DRAIN_TIMEOUT
+    barriers = []
+    for room in list(room_scheduler.actors):
+        try:
+            barriers.append(room_scheduler.submit(room, lambda: None))
+        except MailboxFull:
+            logger.warning("Mailbox is full while draining, queued events may be lost", extra={'room': room})
+    for envelope in barriers:
+        envelope.done.wait(max(0.0, deadline - time.monotonic()))
+    path = handoff_path()
+    if path is None:
+        return 0
+    start = time.perf_counter()
+    records = {room: handoff_record(room) for room in rooms}
+    size = write_handoff(path, records)
+    logger.info("Wrote %d rooms to %s (%d bytes) in %.3fs", len(records), path, size, time.perf_counter() - start)
+    return len(records)
+
+def drain_and_exit():
+    """后台任务：排空、交接并通知所有客户端重连，然后退出进程"""
+    try:
+        drain()
+    except Exception:
+        logger.exception("Failed to write handoff file")
+    # 客户端在连接断开后自动重连，并用恢复凭证回到新进程中的座位
+    socketio.emit('server_restarting', {'message': '服务器正在更新，稍后自动重新连接'})
+    socketio.sleep(0.5)
+    if journal is not None:
+        journal.close()
+    if game_history is not None:
+        game_history.close()
+    log_pipeline.stop()
+    os._exit(0)
+
+def install_drain_handler():
+    """SIGTERM 时排空并交接房间，而不是直接结束进程"""
+    def on_sigterm(*args):
+        socketio.start_background_task(drain_and_exit)
+    if socketio.async_mode == 'gevent':
+        import gevent
+        gevent.signal_handler(signal.SIGTERM, on_sigterm)
+    else:
+        signal.signal(signal.SIGTERM, on_sigterm)
+
+def restore_handoff():
+    """启动时从上一个进程的交接文件恢复房间，返回恢复的房间数"""
+    path = handoff_path()
+    if path is None:
+        return 0
+    start = time.perf_counter()
+    # 加载时一次创建大量长期存在的对象，暂停分代垃圾回收，避免反复扫描（耗时约减少一半以上）
+    gc.disable()
+    try:
+        records = read_handoff(path)
+        if records is None:
+            return 0
+        restored = 0
+        for room, record in records.items():
+            try:
+                load_room(room, record)
+                if record.get('acks'):
+                    game_states[room]['acks'] = {int(player): AckWindow.from_state(state, ACK_WINDOW)
+                                                 for player, state in record['acks'].items()}
+                settle_room(room)
+                restored += 1
+            except Exception:
+                logger.exception("Failed to restore room from handoff", extra={'room': room})
+                rooms.pop(room, None)
+                games.pop(room, None)
+                game_states.pop(room, None)
+    except HandoffError:
+        logger.exception("Ignoring unreadable handoff file")
+        return 0
+    finally:
+        gc.enable()
+    # 只交接一次：之后重启时以操作日志或共享存储为准
+    os.remove(path)
+    logger.info("Restored %d rooms from handoff in %.3fs", restored, time.perf_counter() - start)
+    return restored
+
 # 如果还有其他地方可能生成或使用房间ID，也需要检查
 @socketio.on('connect')
-def handle_connect():
-    logger.debug(f"New client connected: {request.sid}")
+def handle_connect(auth=None):
+    logger.debug("New client connected: %s", request.sid)
+    if isinstance(auth, dict) and auth.get('batch'):
+        batch_sids.add(request.sid)
 
 # 添加错误处理
 @socketio.on_error()
 def error_handler(e):
-    logger.error(f"SocketIO error: {str(e)}")
+    handler_errors.inc(request.event['message'])
+    seat = sid_index.get(request.sid)
+    logger.exception("SocketIO error: %s", e, extra={'room': seat[0] if seat else None})
     emit('error', {'message': '发生错误，请重试'})
 
 @socketio.on('start_game_manual')
+@rate_limited
+@room_serialized
 def handle_start_game_manual(data):
     """处理手动开始游戏的请求"""
     game_id = data.get('game_id')
@@ -481,14 +1637,15 @@ def handle_start_game_manual(data):
         return False
     
     # 开始游戏
-    logger.debug(f"Manually starting game in room {game_id} with {player_count} players")
     start_game(game_id)
     return True
 
+@function_seconds.time('start_game')
 def start_game(room):
     """开始游戏"""
-    logger.debug(f"Starting game in room {room}")
+    logger.debug("Starting game", extra={'room': room})
     rooms[room]['started'] = True
+    room_reaper.reopen(room)
     
     # 获取玩家数量
     player_count = len(rooms[room]['players'])
@@ -497,73 +1654,69 @@ def start_game(room):
     game = AvalonGame(player_count)  # 传入实际玩家数量
     games[room] = game
     game.assign_roles()
+    record(room, {'e': 'start', 'c': list(game.role_codes)})
     
-    logger.debug("Assigning roles to players...")
-    # 给每个玩家发送角色信息
+    # 角色信息按预先编译的可见性表一次生成，然后集中发送
+    role_infos = game_states[room]['role_infos'] = game.role_infos()
+    outgoing = []
     for player in rooms[room]['players']:
-        player_index = player['number'] - 1
-        player_name, role = game.players[player_index]
-        logger.debug(f"Assigning role {role} to player {player['number']}")
-        
-        role_info = {
-            'role': role,
-            'camp': game.ROLE_CAMPS[role]
-        }
-        
-        if role == '梅林':
-            evil_players = [j for j, (_, r) in enumerate(game.players)
-                        if r in ["刺客", "爪牙", "莫甘娜", "莫德雷德"] and r != "莫德雷德"]
-            role_info['evil_players'] = [p + 1 for p in evil_players]
-            role_info['evil_roles'] = [game.players[p][1] for p in evil_players]
-        elif role == '派西维尔':
-            # 派西维尔可以看到梅林和莫甘娜，但无法区分
-            merlin_morgana = []
-            for j, (_, r) in enumerate(game.players):
-                if r in ['梅林', '莫甘娜']:
-                    merlin_morgana.append(j)
-            role_info['merlin_morgana'] = [p + 1 for p in merlin_morgana]
-            role_info['merlin_morgana_roles'] = ["梅林或莫甘娜"] * len(merlin_morgana)
-        elif role in ["刺客", "爪牙", "莫甘娜", "莫德雷德"]:
-            # 邪恶方互相认识，除了奥伯伦
-            evil_players = [j for j, (_, r) in enumerate(game.players)
-                        if r in ["刺客", "爪牙", "莫甘娜", "莫德雷德"] and j != player_index and r != "奥伯伦"]
-            role_info['evil_players'] = [p + 1 for p in evil_players]
-            role_info['evil_roles'] = [game.players[p][1] for p in evil_players]
-        
-        logger.debug(f"Sending role info to player {player['number']}: {role_info}")
-        # 在测试环境中使用广播
+        if player['sid'] is None:
+            continue  # 从日志恢复后尚未重新连接的座位
+        role_info = role_infos[player['number'] - 1]
+        # 添加玩家编号到角色信息中
+        role_info['player_number'] = player['number']
+        outgoing.append((player['sid'], role_info))
+    
+    for sid, role_info in outgoing:
+        # 在测试环境中使用广播（不指定房间），在生产环境中只发给对应的玩家
         if app.config.get('TESTING'):
-            socketio.emit('role_info', {
-                **role_info,
-                'player_number': player['number']
-            }, broadcast=True)
+            socketio.emit('role_info', role_info)
         else:
-            # 在生产环境中使用房间
-            # 添加玩家编号到角色信息中
-            role_info['player_number'] = player['number']
-            socketio.emit('role_info', role_info, room=player['sid'])
-    
-    logger.debug("All roles assigned, sending game state...")
-    # 发送游戏开始状态
-    if app.config.get('TESTING'):
-        socketio.emit('game_state', {
-            'current_quest': game.current_quest + 1,
-            'quest_results': ['成功' if r else '失败' for r in game.quest_results],
-            'required_players': game.get_quest_requirement(),
-            'leader': game.leader_index + 1,
-            'vote_track': game.vote_track,
-            'player_count': game.player_count,
-            'camps': {i: game.ROLE_CAMPS[role] for i, (_, role) in enumerate(game.players)}
-        }, broadcast=True)
-    else:
-        emit_game_state(room)
+            socketio.emit('role_info', role_info, room=sid)
+    
+    # 发送游戏开始状态（第一次为完整快照）
+    emit_game_state(room)
     
     # 发送游戏开始事件，通知前端切换界面
-    socketio.emit('game_started', {
+    room_emit(room, 'game_started', {
         'leader': game.leader_index + 1,
         'player_count': game.player_count
-    }, room=room)
+    })
 
-if __name__ == '__main__':
+metrics_registry.gauge('awalong_rooms', 'Rooms held by this process', lambda: len(rooms))
+metrics_registry.gauge('awalong_games_started', 'Rooms whose game has started',
+                       lambda: sum(1 for room in rooms.values() if room['started']))
+metrics_registry.gauge('awalong_seats', 'Seats taken in all rooms',
+                       lambda: sum(len(room['players']) for room in rooms.values()))
+metrics_registry.gauge('awalong_connected_players', 'Seats bound to a connected client', lambda: len(sid_index))
+metrics_registry.gauge('awalong_spectators', 'Clients watching a room', lambda: len(spectator_hub))
+metrics_registry.gauge('awalong_sockets', 'Open Engine.IO connections', lambda: len(socketio.server.eio.sockets))
+
+def instrument_handlers():
+    """为所有已注册的 Socket.IO 事件处理函数记录耗时（在 Flask-SocketIO 的包装之外，包括请求上下文）"""
+    for handlers in socketio.server.handlers.values():
+        for event, handler in list(handlers.items()):
+            handlers[event] = handler_seconds.time(event)(handler)
+
+instrument_handlers()
+
+def main():
+    """服务进程入口：恢复房间、安装 SIGTERM 处理、启动后台任务后开始服务
+
+    不使用自动重载：重载器的父进程不处理请求，若在父进程中恢复交接文件，房间会留在
+    父进程中（文件已被删除），SIGTERM 也只会发给父进程。
+    """
+    restore_handoff()
+    restore_rooms()
+    install_drain_handler()
+    socketio.start_background_task(reap_rooms)
+    socketio.start_background_task(spectator_loop)
+    socketio.start_background_task(deadline_loop)
+    if cluster_bus is not None:
+        cluster_bus.serve(WORKER_INDEX, hub_handler(handle_bus_message))
     # 修改运行配置，允许外部访问
-    socketio.run(app, debug=True, host='0.0.0.0', port=5001) 
\ No newline at end of file
+    socketio.run(app, debug=True, use_reloader=False,
+                 host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', 5001)))
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,78 @@
 import random
-from typing import List, Dict
+from types import MappingProxyType
+from typing import List, Dict, Tuple, Optional
+
+class Ballot:
+    """一轮投票：用位掩码记录谁已投票、谁投了赞成，并维护赞成/反对计数
+
+    每记录一票都是 O(1)。同一玩家再次投票会覆盖之前的选择并修正计数，重复
+    提交相同的票不产生任何变化。赞成票达到 yes_needed 或反对票多到赞成方
+    不可能再达到时，outcome 立即给出结果。
+    """
+    __slots__ = ('eligible', 'size', 'yes_needed', 'voted', 'yes_mask', 'yes', 'no')
+
+    def __init__(self, eligible: int, yes_needed: int):
+        self.eligible = eligible
+        self.size = bin(eligible).count('1')
+        self.yes_needed = yes_needed
+        self.voted = 0
+        self.yes_mask = 0
+        self.yes = 0
+        self.no = 0
+
+    def cast(self, seat: int, yes: bool) -> bool:
+        """记录一票；没有投票资格返回 False"""
+        bit = 1 << seat
+        if seat < 0 or not self.eligible & bit:
+            return False
+        yes = bool(yes)
+        if self.voted & bit:
+            if bool(self.yes_mask & bit) == yes:
+                return True
+            # 改票：从原来的一方移到另一方
+            self.yes_mask ^= bit
+            delta = 1 if yes else -1
+            self.yes += delta
+            self.no -= delta
+            return True
+        self.voted |= bit
+        if yes:
+            self.yes_mask |= bit
+            self.yes += 1
+        else:
+            self.no += 1
+        return True
+
+    @property
+    def complete(self) -> bool:
+        return self.voted == self.eligible
+
+    @property
+    def outcome(self) -> Optional[bool]:
+        """已确定的结果：True 通过，False 不通过，尚不能确定时为 None"""
+        if self.yes >= self.yes_needed:
+            return True
+        if self.no > self.size - self.yes_needed:
+            return False
+        return None
+
+    def vote_of(self, seat: int) -> Optional[bool]:
+        """某个座位已投的票，尚未投票（或座位无效）时为 None"""
+        if seat < 0 or not self.voted >> seat & 1:
+            return None
+        return bool(self.yes_mask >> seat & 1)
+
+    def votes(self) -> Dict[int, bool]:
+        """按座位顺序返回已投的票"""
+        return {i: bool(self.yes_mask >> i & 1) for i in range(self.voted.bit_length()) if self.voted >> i & 1}
+
+    def to_state(self) -> list:
+        return [self.voted, self.yes_mask]
+
+    def restore(self, state: list):
+        self.voted, self.yes_mask = state
+        self.yes = bin(self.yes_mask).count('1')
+        self.no = bin(self.voted).count('1') - self.yes
 
 class AvalonGame:
     # 添加角色阵营映射
@@ -14,6 +87,54 @@ class AvalonGame:
         "奥伯伦": "邪恶方"
     }
 
+    # 角色编号：按 ROLE_CAMPS 的顺序使用小整数表示角色
+    ROLE_NAMES = tuple(ROLE_CAMPS)
+    ROLE_CODES = MappingProxyType({name: code for code, name in enumerate(ROLE_NAMES)})
+    MERLIN, PERCIVAL, LOYAL, ASSASSIN, MINION, MORGANA, MORDRED, OBERON = range(len(ROLE_NAMES))
+    # 邪恶方角色的位掩码（按角色编号）
+    EVIL_ROLES = sum(1 << code for code, camp in enumerate(ROLE_CAMPS.values()) if camp == "邪恶方")
+
+    # 角色可见性：按角色编号索引，值为该角色能看到的角色编号位掩码
+    # 梅林看不到莫德雷德和奥伯伦；派西维尔看到梅林和莫甘娜；邪恶方互相认识，除了奥伯伦
+    _EVIL_KNOWN = 1 << ASSASSIN | 1 << MINION | 1 << MORGANA | 1 << MORDRED
+    VISIBLE_ROLES = (
+        1 << ASSASSIN | 1 << MINION | 1 << MORGANA,  # 梅林
+        1 << MERLIN | 1 << MORGANA,                  # 派西维尔
+        0,                                           # 忠臣
+        _EVIL_KNOWN,                                 # 刺客
+        _EVIL_KNOWN,                                 # 爪牙
+        _EVIL_KNOWN,                                 # 莫甘娜
+        _EVIL_KNOWN,                                 # 莫德雷德
+        0,                                           # 奥伯伦
+    )
+    # 可见信息在 role_info 中使用的字段：'evil' 或 'merlin_morgana'
+    VISIBILITY_KIND = ('evil', 'merlin_morgana', None, 'evil', 'evil', 'evil', 'evil', None)
+
+    # 设置每个任务需要的人数（所有实例共享，只读）
+    quest_requirements = MappingProxyType({
+        5: (2, 3, 2, 3, 3),
+        6: (2, 3, 4, 3, 4),
+        7: (2, 3, 3, 4, 4),
+        8: (3, 4, 4, 5, 5),
+        9: (3, 4, 4, 5, 5),
+        10: (3, 4, 4, 5, 5)
+    })
+
+    # 根据玩家数量获取可用角色（所有实例共享，只读）
+    roles = MappingProxyType({
+        5: ("梅林", "派西维尔", "忠臣", "莫甘娜", "刺客"),
+        6: ("梅林", "派西维尔", "忠臣", "忠臣", "莫甘娜", "刺客"),
+        7: ("梅林", "派西维尔", "忠臣", "忠臣", "莫甘娜", "刺客", "奥伯伦"),
+        8: ("梅林", "派西维尔", "忠臣", "忠臣", "忠臣", "莫甘娜", "刺客", "爪牙"),
+        9: ("梅林", "派西维尔", "忠臣", "忠臣", "忠臣", "忠臣", "莫甘娜", "刺客", "莫德雷德"),
+        10: ("梅林", "派西维尔", "忠臣", "忠臣", "忠臣", "忠臣", "莫甘娜", "刺客", "莫德雷德", "奥伯伦")
+    })
+    _PLAYER_NAMES = tuple(f"玩家{i+1}" for i in range(10))
+
+    __slots__ = ('player_count', 'current_quest', 'quest_results', 'leader_index', 'vote_track',
+                 'quest_team', 'role_codes', 'evil_mask', 'merlin_index', 'assassin_index',
+                 'team_ballot', 'quest_ballot', 'history')
+
     def __init__(self, player_count: int):
         if player_count < 5 or player_count > 10:
             raise ValueError("游戏人数必须在5-10人之间")
@@ -24,60 +145,209 @@ class AvalonGame:
         self.leader_index = 0
         self.vote_track = 0
         self.quest_team = []
+        # 进行中的队伍表决和任务投票（没有时为 None）
+        self.team_ballot = None
+        self.quest_ballot = None
+        # 公开记录：每次提名一项 [队长, 队伍, 赞成票位掩码, 失败票数]，后两项在结算前为 None
+        self.history = []
         
-        # 设置每个任务需要的人数
-        self.quest_requirements = {
-            5: [2, 3, 2, 3, 3],
-            6: [2, 3, 4, 3, 4],
-            7: [2, 3, 3, 4, 4],
-            8: [3, 4, 4, 5, 5],
-            9: [3, 4, 4, 5, 5],
-            10: [3, 4, 4, 5, 5]
-        }
-        
-        # 根据玩家数量获取可用角色
-        self.roles = {
-            5: ["梅林", "派西维尔", "忠臣", "莫甘娜", "刺客"],
-            6: ["梅林", "派西维尔", "忠臣", "忠臣", "莫甘娜", "刺客"],
-            7: ["梅林", "派西维尔", "忠臣", "忠臣", "莫甘娜", "刺客", "奥伯伦"],
-            8: ["梅林", "派西维尔", "忠臣", "忠臣", "忠臣", "莫甘娜", "刺客", "爪牙"],
-            9: ["梅林", "派西维尔", "忠臣", "忠臣", "忠臣", "忠臣", "莫甘娜", "刺客", "莫德雷德"],
-            10: ["梅林", "派西维尔", "忠臣", "忠臣", "忠臣", "忠臣", "莫甘娜", "刺客", "莫德雷德", "奥伯伦"]
+        # 角色在分配前为空；分配后按座位保存角色编号，并缓存阵营位掩码和关键角色的座位
+        self.role_codes = None
+        self.evil_mask = 0
+        self.merlin_index = None
+        self.assassin_index = None
+
+    @property
+    def roles_assigned(self) -> bool:
+        return self.role_codes is not None
+
+    @property
+    def players(self) -> List[Tuple[str, str]]:
+        """玩家列表 [(名称, 角色)]，角色分配前角色为 None"""
+        names = self._PLAYER_NAMES[:self.player_count]
+        if self.role_codes is None:
+            return [(name, None) for name in names]
+        return [(name, self.ROLE_NAMES[code]) for name, code in zip(names, self.role_codes)]
+
+    def to_state(self) -> dict:
+        """紧凑的可序列化状态（用于快照）；任务结果按轮次编成位掩码"""
+        return {
+            'p': self.player_count,
+            'q': self.current_quest,
+            'r': sum(1 << i for i, r in enumerate(self.quest_results) if r),
+            'l': self.leader_index,
+            'v': self.vote_track,
+            't': list(self.quest_team),
+            'c': list(self.role_codes) if self.role_codes is not None else None,
+            'tb': self.team_ballot.to_state() if self.team_ballot is not None else None,
+            'qb': self.quest_ballot.to_state() if self.quest_ballot is not None else None,
+            'h': [list(entry) for entry in self.history]
         }
-        
-        # 初始化玩家列表，但不分配角色
-        self.players = [(f"玩家{i+1}", None) for i in range(player_count)]
-        self.roles_assigned = False
 
-    def assign_roles(self):
-        """在所有玩家加入后分配角色"""
+    @classmethod
+    def from_state(cls, state: dict) -> 'AvalonGame':
+        """从 to_state() 的结果恢复游戏"""
+        game = cls(state['p'])
+        game.current_quest = state['q']
+        game.quest_results = [bool(state['r'] >> i & 1) for i in range(state['q'])]
+        game.leader_index = state['l']
+        game.vote_track = state['v']
+        game.quest_team = list(state['t'])
+        if state['c'] is not None:
+            game.assign_roles([cls.ROLE_NAMES[code] for code in state['c']])
+        if state.get('tb') is not None:
+            game.team_ballot = game._new_team_ballot()
+            game.team_ballot.restore(state['tb'])
+        if state.get('qb') is not None:
+            game.quest_ballot = game._new_quest_ballot()
+            game.quest_ballot.restore(state['qb'])
+        game.history = [list(entry) for entry in state.get('h', ())]
+        return game
+
+    def role_of(self, index: int) -> str:
+        return self.ROLE_NAMES[self.role_codes[index]]
+
+    def camp_of(self, index: int) -> str:
+        return "邪恶方" if self.evil_mask >> index & 1 else "正义方"
+
+    def assign_roles(self, roles: List[str] = None):
+        """在所有玩家加入后分配角色；roles 指定按座位顺序的角色（用于回放）"""
         if self.roles_assigned:
             return
         
-        available_roles = self.roles[self.player_count].copy()
-        random.shuffle(available_roles)
-        self.players = [(name, available_roles[i]) for i, (name, _) in enumerate(self.players)]
-        self.roles_assigned = True
+        if roles is not None:
+            if sorted(roles) != sorted(self.roles[self.player_count]):
+                raise ValueError("角色列表与玩家人数不匹配")
+        else:
+            roles = list(self.roles[self.player_count])
+            random.shuffle(roles)
+        codes = [self.ROLE_CODES[role] for role in roles]
+        self.role_codes = bytes(codes)
+        self.evil_mask = sum(1 << i for i, code in enumerate(codes) if self.EVIL_ROLES >> code & 1)
+        self.merlin_index = codes.index(self.MERLIN)
+        self.assassin_index = codes.index(self.ASSASSIN)
         
+    def role_infos(self) -> List[dict]:
+        """按座位生成所有玩家的角色信息
+
+        先把每个角色所在的座位编成位掩码，再按 VISIBLE_ROLES 合并出每种角色能看到的
+        座位，之后每个玩家只需一次查表。
+        """
+        seats_by_role = [0] * len(self.ROLE_NAMES)
+        for seat, code in enumerate(self.role_codes):
+            seats_by_role[code] |= 1 << seat
+        visible_by_role = [0] * len(self.ROLE_NAMES)
+        for code, visible in enumerate(self.VISIBLE_ROLES):
+            for other, seats in enumerate(seats_by_role):
+                if visible >> other & 1:
+                    visible_by_role[code] |= seats
+
+        infos = []
+        for seat, code in enumerate(self.role_codes):
+            info = {
+                'role': self.ROLE_NAMES[code],
+                'camp': self.camp_of(seat)
+            }
+            kind = self.VISIBILITY_KIND[code]
+            if kind is not None:
+                mask = visible_by_role[code] & ~(1 << seat)
+                visible = [i for i in range(self.player_count) if mask >> i & 1]
+                if kind == 'evil':
+                    info['evil_players'] = [i + 1 for i in visible]
+                    info['evil_roles'] = [self.ROLE_NAMES[self.role_codes[i]] for i in visible]
+                else:
+                    info['merlin_morgana'] = [i + 1 for i in visible]
+                    info['merlin_morgana_roles'] = ["梅林或莫甘娜"] * len(visible)
+            infos.append(info)
+        return infos
+
     def get_quest_requirement(self) -> int:
         return self.quest_requirements[self.player_count][self.current_quest]
         
     def propose_team(self, leader: int, team: List[int]) -> bool:
+        """队长提名队伍；不是当前队长，或者还有进行中的表决或任务投票时拒绝"""
+        if leader != self.leader_index or self.team_ballot is not None or self.quest_ballot is not None:
+            return False
         if len(team) != self.get_quest_requirement():
             return False
+        if len(set(team)) != len(team) or not all(0 <= i < self.player_count for i in team):
+            return False
         
         self.quest_team = team
+        self.team_ballot = self._new_team_ballot()
+        self.quest_ballot = None
+        self.history.append([leader, list(team), None, None])
         return True
+
+    def _new_team_ballot(self) -> Ballot:
+        """所有玩家参与表决，超过半数赞成才通过"""
+        return Ballot((1 << self.player_count) - 1, self.player_count // 2 + 1)
+
+    def _new_quest_ballot(self) -> Ballot:
+        """任务队员投票；第4轮任务特殊规则：7人及以上时需要2个失败才算失败"""
+        fails_needed = 2 if self.player_count >= 7 and self.current_quest == 3 else 1
+        eligible = sum(1 << i for i in self.quest_team)
+        return Ballot(eligible, len(self.quest_team) - fails_needed + 1)
+
+    def cast_team_vote(self, player: int, approve: bool) -> Optional[bool]:
+        """记录一名玩家对当前队伍的表决（可以改票）
+
+        所有玩家都投票后结算并返回是否通过，否则返回 None。没有待表决的队伍或
+        玩家编号无效时抛出 ValueError。
+        """
+        ballot = self.team_ballot
+        if ballot is None:
+            raise ValueError("当前没有待表决的队伍")
+        if not ballot.cast(player, approve):
+            raise ValueError("无效的玩家编号")
+        if not ballot.complete:
+            return None
+        return self._close_team_vote(ballot)
+
+    def cast_quest_vote(self, player: int, success: bool) -> Optional[bool]:
+        """记录一名任务队员的投票（可以改票）
+
+        所有队员都投票后结算并返回任务是否成功，否则返回 None。没有进行中的任务
+        或玩家不是任务队员时抛出 ValueError。
+        """
+        ballot = self.quest_ballot
+        if ballot is None:
+            raise ValueError("当前没有进行中的任务")
+        if not ballot.cast(player, success):
+            raise ValueError("你不是任务队员")
+        if not ballot.complete:
+            return None
+        return self._close_quest_vote(ballot)
         
     def team_vote(self, votes: List[bool]) -> bool:
+        """一次性提交所有玩家的表决（按座位顺序）"""
         if len(votes) != self.player_count:
             return False
-            
-        approve_count = sum(1 for v in votes if v)
-        if approve_count > len(votes) // 2:
+        
+        ballot = self._new_team_ballot()
+        for i, vote in enumerate(votes):
+            ballot.cast(i, vote)
+        return self._close_team_vote(ballot)
+
+    def quest_vote(self, votes: List[bool]) -> bool:
+        """一次性提交所有任务队员的投票（按 quest_team 的顺序）"""
+        if len(votes) != len(self.quest_team):
+            return False
+        
+        ballot = self._new_quest_ballot()
+        for i, vote in zip(self.quest_team, votes):
+            ballot.cast(i, vote)
+        return self._close_quest_vote(ballot)
+
+    def _close_team_vote(self, ballot: Ballot) -> bool:
+        self.team_ballot = None
+        if self.history:
+            self.history[-1][2] = ballot.yes_mask
+        if ballot.outcome:
             self.vote_track = 0
             if not self.quest_team:
                 return False
+            self.quest_ballot = self._new_quest_ballot()
             return True
         
         self.vote_track += 1
@@ -88,16 +358,12 @@ class AvalonGame:
         self.leader_index = (self.leader_index + 1) % self.player_count
         self.quest_team = []  # 清空队员列表
         return False
-        
-    def quest_vote(self, votes: List[bool]) -> bool:
-        if len(votes) != len(self.quest_team):
-            return False
-            
-        fail_count = sum(1 for v in votes if not v)
-        quest_success = fail_count == 0  # 第4轮任务特殊规则：8-10人时需要2个失败才算失败
-        if self.player_count >= 7 and self.current_quest == 3:
-            quest_success = fail_count < 2
-            
+
+    def _close_quest_vote(self, ballot: Ballot) -> bool:
+        self.quest_ballot = None
+        if self.history:
+            self.history[-1][3] = ballot.no
+        quest_success = ballot.outcome
         self.quest_results.append(quest_success)
         self.current_quest += 1
         self.leader_index = (self.leader_index + 1) % self.player_count
@@ -115,6 +381,8 @@ class AvalonGame:
         return False, "游戏继续"
 
 def play_game():
+    from posterior import RolePosterior, format_table
+
     print("\n=== 角色说明 ===")
     print("正义方：")
     print("- 梅林：知道所有邪恶方成员，但不能明显表现出来，否则会被刺客刺杀")
@@ -175,32 +443,31 @@ def play_game():
         
         # 所有玩家投票
         print("\n=== 队伍投票环节 ===")
-        votes = []
         for i in range(game.player_count):
             while True:
                 vote = input(f"玩家{i+1} 请投票 (同意Y/反对N): ").upper()
                 if vote in ['Y', 'N']:
-                    votes.append(vote == 'Y')
+                    approved = game.cast_team_vote(i, vote == 'Y')
                     break
                 print("请输入 Y 或 N")
         
-        if not game.team_vote(votes):
+        if not approved:
             print("队伍被否决！")
             continue
         
         # 任务执行
         print("\n=== 任务执行环节 ===")
-        quest_votes = []
         for player_index in team:
             while True:
                 vote = input(f"玩家{player_index + 1} 请为任务投票 (成功S/失败F): ").upper()
                 if vote in ['S', 'F']:
-                    quest_votes.append(vote == 'S')
+                    success = game.cast_quest_vote(player_index, vote == 'S')
                     break
                 print("请输入 S 或 F")
         
-        success = game.quest_vote(quest_votes)
         print("任务成功！" if success else "任务失败！")
+        print("\n=== 公开记录推断 ===")
+        print(format_table(RolePosterior.from_game(game)))
         
         # 检查游戏状态
         game_over, message = game.check_game_state()
@@ -209,8 +476,7 @@ def play_game():
             if "正义方获胜" in message:
                 # 刺客猜测梅林
                 assassin_guess = int(input("刺客，请猜测谁是梅林 (输入玩家编号): ")) - 1
-                merlin_index = next(i for i, (_, role) in enumerate(game.players) if role == '梅林')
-                if assassin_guess == merlin_index:
+                if assassin_guess == game.merlin_index:
                     print("刺客成功刺杀梅林！邪恶方获胜！")
                 else:
                     print("刺客猜错了！正义方获胜！")
@@ -0,0 +1,280 @@
+"""阿瓦隆批量模拟引擎
+
+用 NumPy 数组同时推进大量对局，规则与 AvalonGame 一致：每轮任务人数、
+连续5次否决邪恶方获胜、第4轮任务（7人及以上）需要2张失败票、三胜/三负结束
+以及刺客刺杀梅林。机器人策略以整批对局为单位做出决策，可以自由替换。
+
+    sim = BatchSimulation(7, 1_000_000, HeuristicPolicy(), seed=1)
+    result = sim.run()
+    print(result.summary())
+
+cross_check() 用 AvalonGame 逐步回放抽样对局的决策，验证两者结果一致。
+"""
+import numpy as np
+
+from avalon import AvalonGame
+
+# 角色编号与阵营，与 AvalonGame 共用
+ROLE_NAMES = AvalonGame.ROLE_NAMES
+ROLE_CODES = AvalonGame.ROLE_CODES
+MERLIN = AvalonGame.MERLIN
+MORDRED = AvalonGame.MORDRED
+OBERON = AvalonGame.OBERON
+IS_EVIL = np.array([bool(AvalonGame.EVIL_ROLES >> code & 1) for code in range(len(ROLE_NAMES))])
+# 梅林能看到的角色（不包括莫德雷德和奥伯伦），与 AvalonGame.VISIBLE_ROLES 一致
+VISIBLE_TO_MERLIN = np.array([bool(AvalonGame.VISIBLE_ROLES[MERLIN] >> code & 1) for code in range(len(ROLE_NAMES))])
+
+# 对局结果
+UNDECIDED, GOOD_WINS, EVIL_WINS = 0, 1, 2
+REASON_QUESTS, REASON_REJECTIONS, REASON_ASSASSINATED, REASON_ASSASSIN_MISSED = 1, 2, 3, 4
+REASON_NAMES = {
+    REASON_QUESTS: '三次任务失败',
+    REASON_REJECTIONS: '连续5次否决',
+    REASON_ASSASSINATED: '梅林被刺杀',
+    REASON_ASSASSIN_MISSED: '刺客猜错',
+}
+MAX_ROUNDS = 25  # 5个任务 × 每个任务最多5次提议
+
+
+class RandomPolicy:
+    """随机策略：队长随机组队（包含自己），每人以固定概率赞成，邪恶方以固定概率投失败票"""
+
+    def __init__(self, approve_prob: float = 0.5, fail_prob: float = 1.0):
+        self.approve_prob = approve_prob
+        self.fail_prob = fail_prob
+
+    def propose(self, sim, idx, required):
+        keys = sim.rng.random((len(idx), sim.player_count))
+        keys[np.arange(len(idx)), sim.leader[idx]] = -1.0  # 队长总是在队伍中
+        rank = keys.argsort(axis=1).argsort(axis=1)
+        return rank < required[:, None]
+
+    def team_vote(self, sim, idx, team):
+        return sim.rng.random((len(idx), sim.player_count)) < self.approve_prob
+
+    def quest_vote(self, sim, idx, team):
+        fails = sim.evil[idx] & (sim.rng.random((len(idx), sim.player_count)) < self.fail_prob)
+        return ~fails
+
+    def assassinate(self, sim, idx):
+        # 刺客在所有非邪恶方（刺客视角下）的玩家中随机选择
+        keys = sim.rng.random((len(idx), sim.player_count))
+        keys[sim.known_evil[idx]] = 2.0
+        return keys.argmin(axis=1)
+
+
+class HeuristicPolicy(RandomPolicy):
+    """简单机器人：梅林反对包含可见邪恶方的队伍，邪恶方赞成包含邪恶方的队伍"""
+
+    def __init__(self, good_approve_prob: float = 0.7, fail_prob: float = 0.9):
+        super().__init__(approve_prob=good_approve_prob, fail_prob=fail_prob)
+
+    def team_vote(self, sim, idx, team):
+        votes = super().team_vote(sim, idx, team)
+        roles = sim.roles[idx]
+        evil = sim.evil[idx]
+        # 队伍中有自己的玩家总是赞成
+        votes |= team
+        team_has_evil = (team & evil).any(axis=1)
+        visible_to_merlin = VISIBLE_TO_MERLIN[roles]
+        merlin_sees_evil = (team & visible_to_merlin).any(axis=1)
+        is_merlin = roles == MERLIN
+        votes[is_merlin] = ~merlin_sees_evil[np.nonzero(is_merlin)[0]]
+        votes[evil] = np.broadcast_to(team_has_evil[:, None], evil.shape)[evil]
+        return votes
+
+
+class SimulationResult:
+    """批量模拟的结果"""
+
+    def __init__(self, sim):
+        self.player_count = sim.player_count
+        self.winner = sim.winner
+        self.reason = sim.reason
+        self.rounds = sim.rounds
+        self.quest_results = sim.quest_results
+        self.traces = sim.traces
+
+    def summary(self) -> dict:
+        games = len(self.winner)
+        reasons = {REASON_NAMES[code]: int((self.reason == code).sum()) / games
+                   for code in REASON_NAMES}
+        return {
+            'player_count': self.player_count,
+            'games': games,
+            'good_win_rate': float((self.winner == GOOD_WINS).mean()),
+            'evil_win_rate': float((self.winner == EVIL_WINS).mean()),
+            'end_reasons': reasons,
+            'mean_rounds': float(self.rounds.mean()),
+        }
+
+
+class BatchSimulation:
+    """用数组保存 game_count 局对局的状态，逐轮批量推进"""
+
+    def __init__(self, player_count: int, game_count: int, policy=None, seed=None):
+        if player_count < 5 or player_count > 10:
+            raise ValueError("游戏人数必须在5-10人之间")
+        self.player_count = player_count
+        self.game_count = game_count
+        self.policy = policy or HeuristicPolicy()
+        self.rng = np.random.default_rng(seed)
+        self.requirements = np.array(AvalonGame.quest_requirements[player_count], dtype=np.int8)
+
+        codes = np.array([ROLE_CODES[r] for r in AvalonGame.roles[player_count]], dtype=np.int8)
+        self.roles = self.rng.permuted(np.tile(codes, (game_count, 1)), axis=1)
+        self.evil = IS_EVIL[self.roles]
+        # 刺客视角下已知的邪恶方（奥伯伦不与其他邪恶方互认）
+        self.known_evil = self.evil & (self.roles != OBERON)
+
+        self.current_quest = np.zeros(game_count, dtype=np.int8)
+        self.success_count = np.zeros(game_count, dtype=np.int8)
+        self.fail_count = np.zeros(game_count, dtype=np.int8)
+        self.leader = np.zeros(game_count, dtype=np.int8)
+        self.vote_track = np.zeros(game_count, dtype=np.int8)
+        self.quest_results = np.full((game_count, 5), -1, dtype=np.int8)
+        self.winner = np.zeros(game_count, dtype=np.int8)
+        self.reason = np.zeros(game_count, dtype=np.int8)
+        self.rounds = np.zeros(game_count, dtype=np.int16)
+        self.traces = {}
+        self._recorded = np.array([], dtype=np.int64)
+
+    def run(self, record=()) -> SimulationResult:
+        """推进所有对局直到结束；record 中的对局会记录每一步的决策，用于 cross_check"""
+        self.traces = {int(g): {'roles': [ROLE_NAMES[c] for c in self.roles[g]], 'rounds': [],
+                                'assassinate': None} for g in record}
+        self._recorded = np.array(sorted(self.traces), dtype=np.int64)
+        for _ in range(MAX_ROUNDS):
+            idx = np.nonzero(self.winner == UNDECIDED)[0]
+            if len(idx) == 0:
+                break
+            self._play_round(idx)
+        return SimulationResult(self)
+
+    def _play_round(self, idx):
+        n = self.player_count
+        self.rounds[idx] += 1
+        required = self.requirements[self.current_quest[idx]]
+        team = self.policy.propose(self, idx, required)
+        votes = self.policy.team_vote(self, idx, team)
+        approved = votes.sum(axis=1) > n // 2
+        traced = [(i, int(idx[i])) for i in np.nonzero(np.isin(idx, self._recorded))[0]]
+        for i, g in traced:
+            self.traces[g]['rounds'].append({
+                'team': np.nonzero(team[i])[0].tolist(),
+                'votes': votes[i].tolist(),
+                'quest_votes': None,
+            })
+
+        # 否决：否决计数加一，连续5次否决邪恶方获胜，否则队长轮换
+        rejected = idx[~approved]
+        self.vote_track[rejected] += 1
+        lost = rejected[self.vote_track[rejected] >= 5]
+        self._finish(lost, EVIL_WINS, REASON_REJECTIONS)
+        rotate = rejected[self.vote_track[rejected] < 5]
+        self.leader[rotate] = (self.leader[rotate] + 1) % n
+
+        # 通过：执行任务
+        sel = np.nonzero(approved)[0]
+        if len(sel) == 0:
+            return
+        games = idx[sel]
+        self.vote_track[games] = 0
+        team = team[sel]
+        quest_votes = self.policy.quest_vote(self, games, team)
+        fails = (team & ~quest_votes).sum(axis=1)
+        quest = self.current_quest[games]
+        success = fails == 0
+        if n >= 7:
+            fourth = quest == 3
+            success[fourth] = fails[fourth] < 2
+        for i, g in traced:
+            if approved[i]:
+                j = np.searchsorted(sel, i)
+                members = np.nonzero(team[j])[0]
+                self.traces[g]['rounds'][-1]['quest_votes'] = quest_votes[j, members].tolist()
+
+        self.quest_results[games, quest] = success
+        self.current_quest[games] += 1
+        self.leader[games] = (self.leader[games] + 1) % n
+        self.success_count[games] += success
+        self.fail_count[games] += ~success
+
+        self._finish(games[self.fail_count[games] >= 3], EVIL_WINS, REASON_QUESTS)
+        assassination = games[self.success_count[games] >= 3]
+        if len(assassination):
+            target = self.policy.assassinate(self, assassination)
+            hit = self.roles[assassination, target] == MERLIN
+            self._finish(assassination[hit], EVIL_WINS, REASON_ASSASSINATED)
+            self._finish(assassination[~hit], GOOD_WINS, REASON_ASSASSIN_MISSED)
+            for i in np.nonzero(np.isin(assassination, self._recorded))[0]:
+                self.traces[int(assassination[i])]['assassinate'] = int(target[i])
+
+    def _finish(self, games, winner, reason):
+        self.winner[games] = winner
+        self.reason[games] = reason
+
+
+def replay(player_count: int, trace: dict):
+    """用 AvalonGame 按记录的决策回放一局，返回 (winner, reason, quest_results)"""
+    game = AvalonGame(player_count)
+    game.assign_roles(trace['roles'])
+    for step in trace['rounds']:
+        if not game.propose_team(game.leader_index, step['team']):
+            raise AssertionError(f"回放时队伍人数不符: {step['team']}")
+        if not game.team_vote(step['votes']):
+            if game.vote_track == 5:
+                return EVIL_WINS, REASON_REJECTIONS, game.quest_results
+            continue
+        game.quest_vote(step['quest_votes'])
+        game_over, _ = game.check_game_state()
+        if game_over:
+            if sum(game.quest_results) < 3:
+                return EVIL_WINS, REASON_QUESTS, game.quest_results
+            if trace['assassinate'] == game.merlin_index:
+                return EVIL_WINS, REASON_ASSASSINATED, game.quest_results
+            return GOOD_WINS, REASON_ASSASSIN_MISSED, game.quest_results
+    return UNDECIDED, 0, game.quest_results
+
+
+def cross_check(player_count: int, game_count: int, samples: int = 100,
+                policy=None, seed=None) -> list:
+    """批量模拟后抽样回放，返回不一致的对局列表（为空表示结果一致）"""
+    rng = np.random.default_rng(seed)
+    sim = BatchSimulation(player_count, game_count, policy, seed=seed)
+    record = rng.choice(game_count, size=min(samples, game_count), replace=False)
+    result = sim.run(record=record)
+    mismatches = []
+    for g, trace in result.traces.items():
+        winner, reason, quest_results = replay(player_count, trace)
+        expected = [bool(r) for r in result.quest_results[g] if r >= 0]
+        if (winner, reason, quest_results) != (result.winner[g], result.reason[g], expected):
+            mismatches.append({'game': g, 'batch': (int(result.winner[g]), int(result.reason[g]), expected),
+                               'avalon': (winner, reason, quest_results)})
+    return mismatches
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='阿瓦隆批量模拟')
+    parser.add_argument('--games', type=int, default=1_000_000)
+    parser.add_argument('--players', default='5,6,7,8,9,10')
+    parser.add_argument('--policy', choices=['heuristic', 'random'], default='heuristic')
+    parser.add_argument('--cross-check', type=int, default=0, metavar='N', help='抽样回放 N 局进行校验')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    policy = HeuristicPolicy() if args.policy == 'heuristic' else RandomPolicy()
+    for player_count in (int(x) for x in args.players.split(',')):
+        start = time.perf_counter()
+        summary = BatchSimulation(player_count, args.games, policy, seed=args.seed).run().summary()
+        elapsed = time.perf_counter() - start
+        print(f"{player_count}人: 正义方胜率 {summary['good_win_rate']:.2%}, "
+              f"平均 {summary['mean_rounds']:.1f} 轮, {args.games / elapsed:,.0f} 局/秒")
+        for reason, rate in summary['end_reasons'].items():
+            print(f"    {reason}: {rate:.2%}")
+        if args.cross_check:
+            mismatches = cross_check(player_count, min(args.games, 10_000), args.cross_check, policy, args.seed)
+            print(f"    校验 {args.cross_check} 局: {'一致' if not mismatches else f'{len(mismatches)} 局不一致'}")
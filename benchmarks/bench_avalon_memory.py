@@ -0,0 +1,103 @@
+"""AvalonGame 内存占用和吞吐量基准测试
+
+对比紧凑表示（__slots__、共享规则表、角色编号）与原先每个实例各自保存规则表
+和 (名称, 角色字符串) 列表的表示方式。LegacyAvalonGame 是原实现中与内存布局
+相关部分的副本，仅用于对比。
+
+用法: python benchmarks/bench_avalon_memory.py [--games 10000]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from avalon import AvalonGame
+
+
+class LegacyAvalonGame:
+    """原先的内存布局：每个实例重建规则表，玩家保存为字符串元组列表"""
+
+    def __init__(self, player_count):
+        self.player_count = player_count
+        self.current_quest = 0
+        self.quest_results = []
+        self.leader_index = 0
+        self.vote_track = 0
+        self.quest_team = []
+        self.quest_requirements = {
+            5: [2, 3, 2, 3, 3],
+            6: [2, 3, 4, 3, 4],
+            7: [2, 3, 3, 4, 4],
+            8: [3, 4, 4, 5, 5],
+            9: [3, 4, 4, 5, 5],
+            10: [3, 4, 4, 5, 5]
+        }
+        self.roles = {
+            5: ["梅林", "派西维尔", "忠臣", "莫甘娜", "刺客"],
+            6: ["梅林", "派西维尔", "忠臣", "忠臣", "莫甘娜", "刺客"],
+            7: ["梅林", "派西维尔", "忠臣", "忠臣", "莫甘娜", "刺客", "奥伯伦"],
+            8: ["梅林", "派西维尔", "忠臣", "忠臣", "忠臣", "莫甘娜", "刺客", "爪牙"],
+            9: ["梅林", "派西维尔", "忠臣", "忠臣", "忠臣", "忠臣", "莫甘娜", "刺客", "莫德雷德"],
+            10: ["梅林", "派西维尔", "忠臣", "忠臣", "忠臣", "忠臣", "莫甘娜", "刺客", "莫德雷德", "奥伯伦"]
+        }
+        self.players = [(f"玩家{i+1}", None) for i in range(player_count)]
+        self.roles_assigned = False
+
+    def assign_roles(self):
+        available_roles = self.roles[self.player_count].copy()
+        random.shuffle(available_roles)
+        self.players = [(name, available_roles[i]) for i, (name, _) in enumerate(self.players)]
+        self.roles_assigned = True
+
+    @property
+    def merlin_index(self):
+        return next(i for i, (_, role) in enumerate(self.players) if role == '梅林')
+
+    def camp_of(self, index):
+        return AvalonGame.ROLE_CAMPS[self.players[index][1]]
+
+
+def measure_memory(cls, count):
+    gc.collect()
+    tracemalloc.start()
+    games = []
+    for i in range(count):
+        game = cls(5 + i % 6)
+        game.assign_roles()
+        games.append(game)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / count
+
+
+def measure_throughput(cls, count):
+    """创建并分配角色，然后查询梅林座位和所有玩家的阵营（start_game/emit_game_state 的典型访问）"""
+    start = time.perf_counter()
+    for i in range(count):
+        game = cls(5 + i % 6)
+        game.assign_roles()
+        game.merlin_index
+        for j in range(game.player_count):
+            game.camp_of(j)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'':<10} {'bytes/game':>12} {'MB total':>10} {'games/sec':>12}")
+    for name, cls in (('legacy', LegacyAvalonGame), ('compact', AvalonGame)):
+        per_game = measure_memory(cls, args.games)
+        rate = measure_throughput(cls, args.games)
+        print(f"{name:<10} {per_game:>12.0f} {per_game * args.games / 1e6:>10.1f} {rate:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""多进程部署的扩展性基准测试：不同工作进程数下每秒完成的房间数
+
+对每个工作进程数启动一次 cluster.py，并行运行多个 loadgen.py 进程（远程模式）
+连接调度器，统计全部房间完成所需的时间。加入其他进程的房间时会经过消息总线
+查询和一次重新连接（switch_worker），这部分开销也计入结果。
+
+用法: python benchmarks/bench_cluster.py [--workers 1 2 4] [--rooms 200] [--clients 4]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from cluster import wait_for_port
+
+
+def run_cluster(workers, port, args):
+    cluster = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'cluster.py'), '--workers', str(workers),
+         '--port', str(port), '--worker-base-port', str(port + 100), '--log-level', 'WARNING'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port('127.0.0.1', port):
+            raise RuntimeError(f"cluster with {workers} workers did not start")
+        with tempfile.TemporaryDirectory() as tmp:
+            rooms_per_client = args.rooms // args.clients
+            outputs = [os.path.join(tmp, f"client-{i}.json") for i in range(args.clients)]
+            start = time.perf_counter()
+            clients = [subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, 'benchmarks', 'loadgen.py'),
+                 '--url', f"http://127.0.0.1:{port}", '--rooms', str(rooms_per_client),
+                 '--concurrency', str(args.concurrency), '--output', output],
+                stdout=subprocess.DEVNULL) for output in outputs]
+            for client in clients:
+                client.wait()
+            elapsed = time.perf_counter() - start
+            reports = []
+            for output in outputs:
+                with open(output) as f:
+                    reports.append(json.load(f))
+    finally:
+        cluster.terminate()
+        cluster.wait()
+    completed = sum(r['rooms_completed'] for r in reports)
+    events = sum(r['events_total'] for r in reports)
+    errors = sum(r['errors_total'] for r in reports)
+    switches = sum(r['events'].get('switch_worker', {}).get('count', 0) for r in reports)
+    return completed, events, errors, switches, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--rooms', type=int, default=200, help='每种配置的房间总数')
+    parser.add_argument('--clients', type=int, default=4, help='并行的 loadgen 进程数')
+    parser.add_argument('--concurrency', type=int, default=25, help='每个 loadgen 进程同时进行的房间数')
+    parser.add_argument('--port', type=int, default=5201)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} load generator processes")
+    print(f"{'workers':>8} {'rooms':>7} {'rooms/s':>9} {'events/s':>10} {'switches':>9} {'errors':>7}")
+    baseline = None
+    for i, workers in enumerate(args.workers):
+        completed, events, errors, switches, elapsed = run_cluster(workers, args.port + i * 200, args)
+        rate = completed / elapsed
+        baseline = baseline or rate
+        print(f"{workers:>8} {completed:>7} {rate:>9.1f} {events / elapsed:>10.0f} {switches:>9} {errors:>7}"
+              f"   x{rate / baseline:.2f}")
+
+
+if __name__ == '__main__':
+    main()
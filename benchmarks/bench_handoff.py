@@ -0,0 +1,108 @@
+"""交接文件基准测试：进行中的房间的快照大小、写入时间和新进程的加载时间
+
+随机生成 --rooms 个进行到一半的房间（与 app.py 记录的操作相同，每个座位带恢复
+凭证），调用 app.drain() 写入交接文件，再清空内存调用 app.restore_handoff() 加载。
+对照组把同样的房间写成操作日志的逐房间快照，用 app.restore_rooms() 恢复。
+
+用法: python benchmarks/bench_handoff.py [--rooms 10000]
+"""
+import argparse
+import logging
+import os
+import random
+import secrets
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import rooms, games, game_states, apply_event, room_snapshot, restore_rooms, restore_handoff, drain
+from bench_journal import game_events
+from journal import Journal
+
+
+def build_rooms(room_count, rng):
+    """生成进行中的房间：每局随机截断在开始之后、结束之前的某个操作"""
+    for i in range(room_count):
+        room = str(1000 + i)
+        events = game_events(rng, rng.randint(5, 10))
+        start = next(n for n, event in enumerate(events) if event['e'] == 'start')
+        events = events[:rng.randint(start + 1, len(events) - 1)]
+        rooms[room] = {'players': [], 'started': False, 'game_id': room}
+        game_states[room] = {'connected_players': set(), 'player_sids': {}}
+        for event in events:
+            if event['e'] in ('create', 'join'):
+                event['k'] = secrets.token_urlsafe(12)
+            apply_event(room, event)
+
+
+def forget_rooms():
+    for room in list(rooms):
+        app_module.game_id_allocator.release(room)
+        app_module.room_reaper.forget(room)
+        state = game_states[room]
+        if state.get('deadline') is not None:
+            state['deadline'].cancel()
+    rooms.clear()
+    games.clear()
+    game_states.clear()
+
+
+def bench_journal_restore(directory):
+    """对照组：每个房间一个日志快照文件，返回恢复耗时"""
+    journal = Journal(directory)
+    for room in rooms:
+        journal.snapshot(room, room_snapshot(room))
+    journal.close()
+    forget_rooms()
+    app_module.journal = Journal(directory)
+    start = time.perf_counter()
+    restore_rooms()
+    elapsed = time.perf_counter() - start
+    app_module.journal.close()
+    app_module.journal = None
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    directory = tempfile.mkdtemp(prefix='bench_handoff_')
+    try:
+        app_module.HANDOFF_FILE = os.path.join(directory, 'rooms.bin')
+        build_rooms(args.rooms, random.Random(args.seed))
+        state_bytes = sum(len(repr(room_snapshot(room))) for room in rooms)
+
+        start = time.perf_counter()
+        written = drain()
+        drain_seconds = time.perf_counter() - start
+        size = os.path.getsize(app_module.HANDOFF_FILE)
+        app_module.draining = False
+        forget_rooms()
+
+        start = time.perf_counter()
+        restored = restore_handoff()
+        load_seconds = time.perf_counter() - start
+        assert written == restored == args.rooms
+
+        journal_seconds = bench_journal_restore(os.path.join(directory, 'journal'))
+        forget_rooms()
+
+        print(f"{args.rooms} rooms in progress ({state_bytes / args.rooms:.0f} bytes of state per room)")
+        print(f"handoff file:    {size / 1024:>8.1f} KiB ({size / args.rooms:.0f} bytes per room)")
+        print(f"drain + write:   {drain_seconds * 1000:>8.1f} ms")
+        print(f"handoff restore: {load_seconds * 1000:>8.1f} ms ({restored / load_seconds:.0f} rooms/s)")
+        print(f"journal restore: {journal_seconds * 1000:>8.1f} ms (one snapshot file per room)")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""操作日志基准测试：写入吞吐量和启动恢复时间
+
+写入阶段按房间轮流提交随机对局产生的操作（与 app.py 记录的格式相同），
+分别统计处理函数一侧 append 的开销、全部落盘所需的时间和 fsync 次数，
+并与每条记录单独 fsync 的方式对比。恢复阶段清空内存中的房间后调用
+app.restore_rooms()，对比不同快照间隔下的恢复时间。
+
+用法: python benchmarks/bench_journal.py [--rooms 2000] [--snapshot-every 0 50]
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import rooms, games, game_states, apply_event, record, restore_rooms
+from avalon import AvalonGame
+from journal import Journal
+
+
+def game_events(rng, player_count):
+    """随机进行一局游戏，返回按顺序记录的操作"""
+    events = [{'e': 'create'}] + [{'e': 'join', 'p': i} for i in range(1, player_count)]
+    game = AvalonGame(player_count)
+    game.assign_roles()
+    events.append({'e': 'start', 'c': list(game.role_codes)})
+    while not game.check_game_state()[0] and game.vote_track < 5:
+        team = rng.sample(range(player_count), game.get_quest_requirement())
+        game.propose_team(game.leader_index, team)
+        events.append({'e': 'propose', 't': team})
+        votes = [rng.random() < 0.6 for _ in range(player_count)]
+        events.extend({'e': 'team_vote', 'p': i, 'v': v} for i, v in enumerate(votes))
+        if game.team_vote(votes):
+            quest = [game.camp_of(i) == "正义方" or rng.random() < 0.5 for i in team]
+            events.extend({'e': 'quest_vote', 'p': i, 'v': v} for i, v in zip(team, quest))
+            game.quest_vote(quest)
+    events.append({'e': 'assassinate', 't': rng.randrange(player_count)})
+    return events
+
+
+def interleave(workload):
+    """按房间轮流取出操作，模拟多个房间同时进行"""
+    cursors = {room: 0 for room in workload}
+    while cursors:
+        for room in list(cursors):
+            events = workload[room]
+            yield room, events[cursors[room]]
+            cursors[room] += 1
+            if cursors[room] == len(events):
+                del cursors[room]
+
+
+def bench_write(workload, directory, snapshot_every):
+    """通过 app.record 写入所有操作，返回 (append 耗时, 落盘总耗时, 操作数, fsync 次数)"""
+    journal = Journal(directory)
+    app_module.journal = journal
+    app_module.JOURNAL_SNAPSHOT_EVERY = snapshot_every or float('inf')
+    for room in workload:
+        rooms[room] = {'players': [], 'started': False, 'game_id': room}
+        game_states[room] = {'connected_players': set(), 'player_sids': {}}
+    count = 0
+    append_seconds = 0.0
+    start = time.perf_counter()
+    for room, event in interleave(workload):
+        apply_event(room, event)
+        t = time.perf_counter()
+        record(room, event)
+        append_seconds += time.perf_counter() - t
+        count += 1
+    journal.close()
+    return append_seconds, time.perf_counter() - start, count, journal.fsyncs
+
+
+def bench_fsync_each(workload, directory, limit):
+    """对照组：每条操作打开文件、写入并 fsync，返回每秒操作数"""
+    count = 0
+    start = time.perf_counter()
+    for room, event in interleave(workload):
+        with open(os.path.join(directory, f"{room}.log"), 'a') as f:
+            f.write(repr(event) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        count += 1
+        if count >= limit:
+            break
+    return count / (time.perf_counter() - start)
+
+
+def bench_restore(directory):
+    rooms.clear()
+    games.clear()
+    game_states.clear()
+    app_module.journal = Journal(directory)
+    start = time.perf_counter()
+    restored = restore_rooms()
+    elapsed = time.perf_counter() - start
+    app_module.journal.close()
+    app_module.journal = None
+    for room in list(rooms):
+        app_module.game_id_allocator.release(room)
+        app_module.room_reaper.forget(room)
+    rooms.clear()
+    games.clear()
+    game_states.clear()
+    return restored, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=2000)
+    parser.add_argument('--snapshot-every', type=int, nargs='+', default=[0, 50],
+                        help='快照间隔（操作数），0 表示不写快照')
+    parser.add_argument('--fsync-each', type=int, default=500, help='对照组写入的操作数')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    rng = random.Random(args.seed)
+    workload = {str(1000 + i): game_events(rng, rng.randint(5, 10)) for i in range(args.rooms)}
+    total = sum(len(events) for events in workload.values())
+    print(f"{args.rooms} rooms, {total} events ({total / args.rooms:.1f} per room)")
+
+    directory = tempfile.mkdtemp(prefix='bench_journal_')
+    try:
+        rate = bench_fsync_each(workload, directory, args.fsync_each)
+        shutil.rmtree(directory)
+        print(f"fsync per event: {rate:>10.0f} events/sec")
+
+        print(f"{'snapshot':>8} {'append/s':>12} {'durable/s':>12} {'fsyncs':>8} "
+              f"{'restore ms':>11} {'rooms/s':>10}")
+        for snapshot_every in args.snapshot_every:
+            os.makedirs(directory)
+            append_seconds, write_seconds, count, fsyncs = bench_write(workload, directory, snapshot_every)
+            restored, restore_seconds = bench_restore(directory)
+            assert restored == args.rooms
+            shutil.rmtree(directory)
+            print(f"{snapshot_every or '-':>8} {count / append_seconds:>12.0f} {count / write_seconds:>12.0f} "
+                  f"{fsyncs:>8} {restore_seconds * 1000:>11.1f} {restored / restore_seconds:>10.0f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
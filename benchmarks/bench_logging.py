@@ -0,0 +1,111 @@
+"""日志开销基准测试：处理一次 join_game 时调用方线程中的日志开销
+
+"之前" 复现原来的写法：logging.basicConfig(DEBUG) 同步写出、f-string 立即格式化，
+并且每次都输出全部房间ID和房间内的玩家列表。"之后" 是 app.py 现在的两条延迟
+格式化的调试记录经过 log_pipeline 写出，分别测试输出全部调试记录、只输出 INFO
+（调试记录进入房间环形缓冲区）和关闭环形缓冲区三种配置。日志写入临时文件，
+"调用方" 一列是处理函数一侧的耗时，"全部写出" 包括等待后台线程写完。
+
+用法: python benchmarks/bench_logging.py [--rooms 1000] [--events 20000]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_pipeline import LogPipeline
+
+logger = logging.getLogger('bench')
+
+
+def before(rooms, room, sid, player_number):
+    logger.debug(f"Attempting to join game with ID: {room}")
+    logger.debug(f"Request SID: {sid}")
+    logger.debug(f"Current rooms: {list(rooms.keys())}")
+    logger.debug(f"Found room {room}")
+    logger.debug(f"Assigning player number {player_number + 1} in room {room}")
+    logger.debug(f"Successfully joined room: {room}")
+    logger.debug(f"Added player {player_number + 1} to room {room}")
+    logger.debug(f"Current players in room: {[p['number'] for p in rooms[room]['players']]}")
+    logger.debug(f"Emitted joined_game event for room: {room}")
+
+
+def after(rooms, room, sid, player_number):
+    logger.debug("Join requested by %s", sid, extra={'room': room})
+    logger.debug("Player %d joined", player_number + 1, extra={'room': room})
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    logger.setLevel(logging.NOTSET)
+
+
+def run(handler_fn, rooms, events):
+    ids = list(rooms)
+    start = time.perf_counter()
+    for i in range(events):
+        room = ids[i % len(ids)]
+        handler_fn(rooms, room, f"sid-{i}", i % 5)
+    return time.perf_counter() - start
+
+
+def bench(name, setup, handler_fn, rooms, events, directory):
+    path = os.path.join(directory, f"{name}.log")
+    with open(path, 'w') as stream:
+        pipeline = setup(stream)
+        start = time.perf_counter()
+        caller = run(handler_fn, rooms, events)
+        if pipeline is not None:
+            pipeline.stop()
+        stream.flush()
+        total = time.perf_counter() - start
+    size = os.path.getsize(path)
+    reset_root()
+    return caller, total, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=20000)
+    args = parser.parse_args()
+
+    rooms = {str(1000 + i): {'players': [{'sid': f"s{j}", 'number': j + 1} for j in range(5)],
+                             'started': False, 'game_id': str(1000 + i)}
+             for i in range(args.rooms)}
+
+    def basic_config(stream):
+        logging.basicConfig(level=logging.DEBUG, stream=stream)
+        return None
+
+    def pipeline(level, ring_size):
+        def setup(stream):
+            p = LogPipeline(level, ring_size=ring_size, stream=stream).install()
+            p.capture(logger)
+            return p
+        return setup
+
+    configs = [
+        ('before', basic_config, before),
+        ('after-debug', pipeline('DEBUG', 64), after),
+        ('after-info-ring', pipeline('INFO', 64), after),
+        ('after-info', pipeline('INFO', 0), after),
+    ]
+    print(f"{args.rooms} rooms, {args.events} join events")
+    print(f"{'config':>16} {'caller us/event':>16} {'all written us/event':>21} {'log MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, setup, handler_fn in configs:
+            caller, total, size = bench(name, setup, handler_fn, rooms, args.events, directory)
+            print(f"{name:>16} {caller / args.events * 1e6:>16.1f} {total / args.events * 1e6:>21.1f} "
+                  f"{size / 1e6:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""指标的开销：单次记录的耗时，以及整局游戏中打开/关闭指标的对比
+
+第一部分测量 Counter.inc、Histogram.observe、计时装饰器本身的耗时，以及向5人
+房间广播一条消息时 MeteredManager（加上计数的 json 编码）比原来的管理器多出的
+耗时。第二部分用 Socket.IO 测试客户端完整进行若干局游戏（创建、加入、开始、
+若干轮提名和投票），交替打开和关闭指标，比较每个事件的平均耗时；测试客户端
+本身的开销较大，这一部分的差异通常在测量噪声以内。
+
+用法: python benchmarks/bench_metrics.py [--games 200] [--repeat 3]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import app, socketio, rooms, games, game_states
+from metrics import Registry
+from socketio import Manager as SocketIOManager, packet
+
+
+def micro():
+    registry = Registry()
+    counter = registry.counter('c', 'c', 'event')
+    histogram = registry.histogram('h', 'h', 'event')
+
+    @histogram.time('f')
+    def timed():
+        pass
+
+    def plain():
+        pass
+
+    n = 200000
+    results = {
+        'Counter.inc': timeit.timeit(lambda: counter.inc('team_vote'), number=n),
+        'Histogram.observe': timeit.timeit(lambda: histogram.observe(0.0003, 'team_vote'), number=n),
+        'timed call - plain call': (timeit.timeit(timed, number=n) - timeit.timeit(plain, number=n)),
+    }
+    n_emit = 50000
+    emit_off = emit_cost(SocketIOManager, json, n_emit)
+    emit_on = emit_cost(app_module.MeteredManager, app_module.socket_json, n_emit)
+    results['metered emit - plain emit'] = (emit_on - emit_off) * n / n_emit
+    for name, seconds in results.items():
+        print(f"{name:>26}: {seconds / n * 1e9:8.0f} ns")
+    print(f"{'plain emit to 5 clients':>26}: {emit_off / n_emit * 1e9:8.0f} ns")
+
+
+class NullServer:
+    """只提供管理器发送消息所需接口的服务端，丢弃所有数据包"""
+    packet_class = packet.Packet
+
+    class eio:
+        @staticmethod
+        def generate_id():
+            return os.urandom(8).hex()
+
+    def _send_eio_packet(self, eio_sid, pkt):
+        pass
+
+
+def emit_cost(manager_class, json_module, n):
+    manager = manager_class()
+    manager.set_server(NullServer())
+    manager.initialize()
+    for i in range(5):
+        sid = manager.connect(f"eio-{i}", '/')
+        manager.enter_room(sid, '/', '1234')
+    data = {'player_id': 3, 'connected_players': [1, 2, 3], 'player_count': 3}
+    previous, packet.Packet.json = packet.Packet.json, json_module
+    try:
+        return timeit.timeit(lambda: manager.emit('player_joined', data, '/', room='1234'), number=n)
+    finally:
+        packet.Packet.json = previous
+
+
+def play(count):
+    """进行 count 局游戏，返回 (事件数, 耗时)"""
+    events = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        host = socketio.test_client(app)
+        host.emit('create_game')
+        game_id = host.get_received()[0]['args'][0]['game_id']
+        clients = [host] + [socketio.test_client(app) for _ in range(4)]
+        for client in clients[1:]:
+            client.emit('join_game', {'game_id': game_id})
+        host.emit('start_game_manual', {'game_id': game_id})
+        events += 6
+        for _ in range(3):
+            game = games[game_id]
+            clients[game.leader_index].emit('propose_team', {
+                'game_id': game_id, 'team': list(range(1, game.get_quest_requirement() + 1))})
+            for i, client in enumerate(clients):
+                client.emit('team_vote', {'game_id': game_id, 'player_id': i + 1, 'vote': False})
+            events += 6
+        for client in clients:
+            client.disconnect()
+        events += 5
+        app_module.close_room(game_id)
+    return events, time.perf_counter() - start
+
+
+# app.instrument_handlers() 包装前的处理函数（Flask-SocketIO 的包装）
+ORIGINAL_HANDLERS = {namespace: {event: handler.__wrapped__ for event, handler in handlers.items()}
+                     for namespace, handlers in socketio.server.handlers.items()}
+INSTRUMENTED_HANDLERS = {namespace: dict(handlers) for namespace, handlers in socketio.server.handlers.items()}
+
+
+def set_instrumented(enabled):
+    manager = socketio.server.manager
+    manager.__class__ = app_module.MeteredManager if enabled else SocketIOManager
+    packet.Packet.json = app_module.socket_json if enabled else json
+    source = INSTRUMENTED_HANDLERS if enabled else ORIGINAL_HANDLERS
+    for namespace, handlers in source.items():
+        socketio.server.handlers[namespace].update(handlers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    app.config['TESTING'] = True
+    micro()
+
+    play(10)  # 预热
+    best = {}
+    for _ in range(args.repeat):
+        for enabled in (False, True):
+            set_instrumented(enabled)
+            rooms.clear()
+            games.clear()
+            game_states.clear()
+            events, seconds = play(args.games)
+            per_event = seconds / events
+            best[enabled] = min(best.get(enabled, per_event), per_event)
+    off, on = best[False], best[True]
+    print(f"{args.games} games, best of {args.repeat}")
+    print(f"{'metrics off':>26}: {off * 1e6:8.1f} us/event")
+    print(f"{'metrics on':>26}: {on * 1e6:8.1f} us/event ({(on - off) / off * 100:+.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
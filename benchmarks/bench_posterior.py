@@ -0,0 +1,76 @@
+"""角色后验的更新耗时：随机进行若干局游戏，每个公开事件之后同步一次
+
+每局的表决和任务投票按 BehaviourModel 的默认倾向随机生成，记录每次 sync()
+（处理一个新事件）的耗时，输出平均值、95分位和最大值，以及游戏结束时剩余的
+相容世界数。
+
+用法: python benchmarks/bench_posterior.py [--players 10] [--games 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from avalon import AvalonGame
+from posterior import BehaviourModel, RolePosterior, worlds
+
+
+def play(player_count, rng, model, timings):
+    game = AvalonGame(player_count)
+    game.assign_roles()
+    posterior = RolePosterior(player_count, model)
+
+    def sync():
+        start = time.perf_counter()
+        posterior.sync(game.history)
+        timings.append(time.perf_counter() - start)
+
+    while not game.check_game_state()[0] and game.vote_track < 5:
+        game.propose_team(game.leader_index, rng.sample(range(player_count), game.get_quest_requirement()))
+        sync()
+        has_evil = bool(sum(1 << i for i in game.quest_team) & game.evil_mask)
+        votes = []
+        for seat in range(player_count):
+            if game.evil_mask >> seat & 1:
+                p = model.evil_approve[0 if has_evil else 1]
+            else:
+                p = model.good_approve
+            votes.append(rng.random() < p)
+        approved = game.team_vote(votes)
+        sync()
+        if approved:
+            game.quest_vote([not game.evil_mask >> i & 1 or rng.random() >= model.fail_prob
+                             for i in game.quest_team])
+            sync()
+    return posterior.world_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=10)
+    parser.add_argument('--games', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    model = BehaviourModel()
+    start = time.perf_counter()
+    worlds(args.players)
+    print(f"{args.players} players: {len(worlds(args.players))} worlds, "
+          f"enumerated in {(time.perf_counter() - start) * 1e3:.1f} ms")
+    timings = []
+    remaining = [play(args.players, rng, model, timings) for _ in range(args.games)]
+    timings.sort()
+    print(f"{args.games} games, {len(timings)} updates")
+    print(f"{'mean':>8}: {statistics.mean(timings) * 1e3:6.2f} ms")
+    print(f"{'p95':>8}: {timings[int(len(timings) * 0.95)] * 1e3:6.2f} ms")
+    print(f"{'max':>8}: {timings[-1] * 1e3:6.2f} ms")
+    print(f"worlds left at game end: median {statistics.median(remaining):.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""房间 actor 调度器基准测试：投票吞吐量随房间数量的变化
+
+每个房间 5 名玩家并发投票，每张票都经过房间 actor 串行处理。处理函数模拟
+handle_team_vote 的状态更新，并用 gevent.sleep 模拟一次房间广播的 I/O 延迟。
+同一房间的投票串行执行，不同房间的 I/O 等待可以重叠，因此吞吐量随房间数增长，
+直到单核 CPU 饱和。
+
+用法: python benchmarks/bench_room_actor.py [--votes 200] [--io-latency 0.001]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engineio
+import gevent
+
+from room_actor import RoomScheduler
+
+PLAYERS_PER_ROOM = 5
+
+
+def make_vote_handler(state, io_latency):
+    def handle_vote(room, player_id, vote):
+        votes = state.setdefault(room, {})
+        votes[player_id] = vote
+        if len(votes) == PLAYERS_PER_ROOM:
+            state[room] = {}
+        # 模拟房间广播
+        gevent.sleep(io_latency)
+    return handle_vote
+
+
+def run(room_count, votes_per_player, io_latency):
+    server = engineio.Server(async_mode='gevent')
+    scheduler = RoomScheduler(server, mailbox_size=PLAYERS_PER_ROOM * 2)
+    handler = make_vote_handler({}, io_latency)
+
+    def player(room, player_id):
+        for i in range(votes_per_player):
+            scheduler.call(room, handler, room, player_id, i % 2 == 0)
+
+    start = time.perf_counter()
+    players = [gevent.spawn(player, str(1000 + r), p)
+               for r in range(room_count) for p in range(PLAYERS_PER_ROOM)]
+    gevent.joinall(players)
+    elapsed = time.perf_counter() - start
+    for r in range(room_count):
+        scheduler.close(str(1000 + r))
+    return room_count * PLAYERS_PER_ROOM * votes_per_player / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', default='1,10,100,1000')
+    parser.add_argument('--votes', type=int, default=20, help='每名玩家的投票次数')
+    parser.add_argument('--io-latency', type=float, default=0.001, help='模拟广播延迟（秒）')
+    args = parser.parse_args()
+
+    print(f"{'rooms':>8} {'votes/sec':>12}")
+    for room_count in (int(x) for x in args.rooms.split(',')):
+        rate = run(room_count, args.votes, args.io_latency)
+        print(f"{room_count:>8} {rate:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""阶段截止时间的定时器开销：分层时间轮与堆（惰性删除）的对比
+
+先设置 --pending 个等待中的截止时间（模拟同样多的房间），然后模拟玩家行动：
+每次取消一个房间的定时器并按新阶段重新设置，每隔 --churn-per-tick 次操作推进
+一个 tick，统计每次设置+取消的平均耗时、推进的耗时和触发数。堆的取消只做标记，
+被取消的条目留在堆中直到到期弹出，因此堆的大小随操作次数增长。
+
+用法: python benchmarks/bench_timer_wheel.py [--pending 50000] [--ops 500000]
+"""
+import argparse
+import heapq
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timer_wheel import TimerWheel
+
+TIMEOUTS = (120, 90, 60, 120)  # 提名、表决、任务、刺杀
+TICK = 0.5
+
+
+class HeapTimers:
+    """对比用：heapq + 取消标记"""
+
+    def __init__(self, clock):
+        self._clock = clock
+        self._heap = []
+        self._ids = itertools.count()
+
+    def schedule(self, delay, payload):
+        entry = [self._clock() + delay, next(self._ids), payload, True]
+        heapq.heappush(self._heap, entry)
+        return entry
+
+    @staticmethod
+    def cancel(entry):
+        entry[3] = False
+
+    def advance(self, now):
+        fired = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if entry[3]:
+                fired.append(entry[2])
+        return fired
+
+    def __len__(self):
+        return len(self._heap)
+
+
+def run(name, pending, ops, churn_per_tick, seed):
+    rng = random.Random(seed)
+    now = [0.0]
+    clock = lambda: now[0]
+    if name == 'wheel':
+        timers = TimerWheel(tick=TICK, clock=clock)
+        cancel = lambda timer: timer.cancel()
+    else:
+        timers = HeapTimers(clock)
+        cancel = HeapTimers.cancel
+
+    armed = [timers.schedule(rng.choice(TIMEOUTS), room) for room in range(pending)]
+    churn = 0.0
+    advance = 0.0
+    fired = 0
+    for op in range(ops):
+        room = rng.randrange(pending)
+        start = time.perf_counter()
+        cancel(armed[room])
+        armed[room] = timers.schedule(rng.choice(TIMEOUTS), room)
+        churn += time.perf_counter() - start
+        if op % churn_per_tick == churn_per_tick - 1:
+            now[0] += TICK
+            start = time.perf_counter()
+            due = timers.advance(now[0])
+            advance += time.perf_counter() - start
+            fired += len(due)
+            for room in due:
+                armed[room] = timers.schedule(rng.choice(TIMEOUTS), room)
+    return churn / ops * 1e6, advance, fired, len(timers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pending', type=int, default=50000, help='等待中的截止时间数（房间数）')
+    parser.add_argument('--ops', type=int, default=500000, help='取消并重新设置的次数')
+    parser.add_argument('--churn-per-tick', type=int, default=1000, help='每个 tick 的操作数')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'实现':>6} {'设置+取消(µs)':>14} {'推进总耗时(s)':>14} {'触发数':>8} {'条目数':>8}")
+    for name in ('wheel', 'heap'):
+        per_op, advance, fired, size = run(name, args.pending, args.ops, args.churn_per_tick, args.seed)
+        print(f"{name:>6} {per_op:>14.2f} {advance:>14.3f} {fired:>8} {size:>8}")
+
+
+if __name__ == '__main__':
+    main()
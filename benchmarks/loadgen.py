@@ -0,0 +1,342 @@
+"""负载生成工具：模拟大量房间和玩家同时进行完整的游戏流程
+
+每个房间由 5-10 个脚本化客户端组成，依次执行
+create_game → join_game → start_game_manual → propose_team → team_vote
+→ quest_vote →（正义方完成3次任务时）assassinate，并记录每个事件的延迟。
+
+两种运行方式：
+  进程内:   python benchmarks/loadgen.py --rooms 200
+            使用 socketio.test_client 直接驱动 app.py 中的处理函数
+  真实服务: python benchmarks/loadgen.py --rooms 200 --url http://127.0.0.1:5001
+            需要安装 python-socketio 客户端依赖（requests、websocket-client）
+
+结果（各事件的延迟分位数、吞吐量和错误率）写入 --output 指定的 JSON 文件。
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict, deque
+
+import gevent
+from gevent.event import Event
+from gevent.pool import Pool
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+GOOD_CAMP = '正义方'
+
+
+class Recorder:
+    """按事件名称收集延迟和错误数"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, event, seconds, ok=True):
+        self.latencies[event].append(seconds)
+        if not ok:
+            self.errors[event] += 1
+
+    def report(self, elapsed, rooms, completed):
+        events = {}
+        total = 0
+        total_errors = 0
+        for event, samples in sorted(self.latencies.items()):
+            samples.sort()
+            count = len(samples)
+            total += count
+            total_errors += self.errors[event]
+            events[event] = {
+                'count': count,
+                'errors': self.errors[event],
+                'error_rate': self.errors[event] / count,
+                'mean_ms': sum(samples) / count * 1000,
+                'p50_ms': percentile(samples, 50) * 1000,
+                'p90_ms': percentile(samples, 90) * 1000,
+                'p99_ms': percentile(samples, 99) * 1000,
+                'max_ms': samples[-1] * 1000,
+            }
+        return {
+            'rooms': rooms,
+            'rooms_completed': completed,
+            'duration_sec': elapsed,
+            'events_total': total,
+            'events_per_sec': total / elapsed if elapsed else 0.0,
+            'errors_total': total_errors,
+            'error_rate': total_errors / total if total else 0.0,
+            'events': events,
+        }
+
+
+def percentile(sorted_samples, pct):
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+class SimulatedPlayer:
+    """一个脚本化客户端，收到的事件按名称放入收件箱"""
+
+    def __init__(self, recorder, timeout):
+        self.recorder = recorder
+        self.timeout = timeout
+        self.inbox = defaultdict(deque)
+        self.arrived = Event()
+        self.player_id = None
+        self.role_info = None
+
+    def deliver(self, name, *args):
+        self.inbox[name].append(args[0] if args else None)
+        self.arrived.set()
+
+    def call(self, event, data=None):
+        start = time.perf_counter()
+        ok = True
+        try:
+            self._send(event, data)
+        except Exception:
+            ok = False
+        self._poll()
+        if self.inbox.get('error'):
+            self.inbox['error'].clear()
+            ok = False
+        self.recorder.record(event, time.perf_counter() - start, ok)
+        return ok
+
+    def wait_for(self, name):
+        """等待并取出下一条指定名称的事件"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            self._poll()
+            if self.inbox[name]:
+                return self.inbox[name].popleft()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"等待 {name} 超时")
+            self.arrived.clear()
+            self.arrived.wait(min(remaining, 0.05))
+
+    def wait_any(self, *names):
+        """等待几种事件中最先到达的一个，返回 (名称, 数据)"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            self._poll()
+            for name in names:
+                if self.inbox[name]:
+                    return name, self.inbox[name].popleft()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"等待 {'/'.join(names)} 超时")
+            self.arrived.clear()
+            self.arrived.wait(min(remaining, 0.05))
+
+    def join(self, game_id):
+        """加入房间；房间在其他工作进程时按 switch_worker 重新连接后再加入"""
+        self.call('join_game', {'game_id': game_id})
+        name, data = self.wait_any('joined_game', 'switch_worker')
+        if name == 'switch_worker':
+            self.reconnect(game_id)
+            self.call('join_game', {'game_id': game_id})
+            data = self.wait_for('joined_game')
+        self.player_id = data['player_id']
+
+    def reconnect(self, game_id):
+        raise NotImplementedError
+
+    def discard(self, *names):
+        self._poll()
+        for name in names:
+            self.inbox[name].clear()
+
+    def _send(self, event, data):
+        raise NotImplementedError
+
+    def _poll(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class InProcessPlayer(SimulatedPlayer):
+    """通过 socketio.test_client 直接调用 app.py 的处理函数"""
+
+    def __init__(self, recorder, timeout):
+        super().__init__(recorder, timeout)
+        self._connect()
+
+    def _connect(self, query_string=None):
+        from app import app, socketio
+        self.client = socketio.test_client(app, query_string=query_string)
+
+    def reconnect(self, game_id):
+        """带上游戏ID重新建立测试连接，与 RemotePlayer 的重连流程相同"""
+        start = time.perf_counter()
+        self.client.disconnect()
+        self._connect(f"game_id={game_id}")
+        self.recorder.record('switch_worker', time.perf_counter() - start)
+
+    def _send(self, event, data):
+        if data is None:
+            self.client.emit(event)
+        else:
+            self.client.emit(event, data)
+
+    def _poll(self):
+        for message in self.client.get_received():
+            self.deliver(message['name'], *message['args'])
+
+    def close(self):
+        self.client.disconnect()
+
+
+class RemotePlayer(SimulatedPlayer):
+    """通过 Socket.IO 客户端连接真实的服务进程，延迟为请求到确认（ack）的往返时间"""
+
+    def __init__(self, recorder, timeout, url):
+        super().__init__(recorder, timeout)
+        self.url = url
+        self._connect(url)
+
+    def _connect(self, url):
+        import socketio
+        self.sio = socketio.Client(reconnection=False)
+        self.sio.on('*', self.deliver)
+        self.sio.connect(url, transports=['websocket'], wait_timeout=self.timeout)
+
+    def _send(self, event, data):
+        self.sio.call(event, data, timeout=self.timeout)
+
+    def reconnect(self, game_id):
+        """带上游戏ID重新连接，cluster.py 的调度器据此转发到房间所在的进程"""
+        start = time.perf_counter()
+        self.sio.disconnect()
+        self._connect(f"{self.url}?game_id={game_id}")
+        self.recorder.record('switch_worker', time.perf_counter() - start)
+
+    def close(self):
+        self.sio.disconnect()
+
+
+def play_room(make_player, player_count):
+    """完整地进行一局游戏，返回是否正常结束"""
+    players = [make_player() for _ in range(player_count)]
+    try:
+        host = players[0]
+        host.call('create_game')
+        created = host.wait_for('game_created')
+        game_id = created['game_id']
+        host.player_id = created['player_id']
+
+        for player in players[1:]:
+            player.join(game_id)
+
+        host.call('start_game_manual', {'game_id': game_id})
+        by_id = {}
+        for player in players:
+            player.role_info = player.wait_for('role_info')
+            by_id[player.player_id] = player
+        state = host.wait_for('game_state')
+        host.wait_for('game_started')
+
+        while True:
+            leader = by_id[state['leader']]
+            team = [(state['leader'] - 1 + i) % player_count + 1
+                    for i in range(state['required_players'])]
+            leader.call('propose_team', {'game_id': game_id, 'team': team})
+            host.wait_for('team_proposed')
+
+            for player in players:
+                player.call('team_vote', {'game_id': game_id, 'player_id': player.player_id, 'vote': True})
+            host.wait_for('team_vote_result')
+            state.update(host.wait_for('game_state'))  # 增量状态，合并到本地缓存
+
+            for player_id in team:
+                member = by_id[player_id]
+                member.call('quest_vote', {
+                    'game_id': game_id,
+                    'player_id': player_id,
+                    'vote': member.role_info['camp'] == GOOD_CAMP
+                })
+            result = host.wait_for('quest_vote_result')
+            for player in players[1:]:
+                player.discard('team_proposed', 'team_vote_result', 'quest_vote_result', 'game_state')
+            state.update(host.wait_for('game_state'))
+            if result['game_over']:
+                break
+
+        if state['quest_results'].count('成功') < 3:
+            return True  # 邪恶方完成3次破坏，没有刺杀阶段
+        assassin = next(p for p in players if p.role_info['role'] == '刺客')
+        target = random.choice([p.player_id for p in players if p is not assassin])
+        assassin.call('assassinate', {'game_id': game_id, 'target': target})
+        host.wait_for('assassination_result')
+        return True
+    finally:
+        for player in players:
+            player.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=100, help='房间总数')
+    parser.add_argument('--concurrency', type=int, default=100, help='同时进行的房间数')
+    parser.add_argument('--min-players', type=int, default=5)
+    parser.add_argument('--max-players', type=int, default=5,
+                        help='join_game 目前限制每个房间最多 5 名玩家')
+    parser.add_argument('--url', help='真实服务地址；不指定时在进程内运行')
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--output', default='loadgen_report.json')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    recorder = Recorder()
+    if args.url:
+        def make_player():
+            return RemotePlayer(recorder, args.timeout, args.url)
+    else:
+        import logging
+        logging.disable(logging.CRITICAL)
+        from app import app
+        app.config['TESTING'] = False
+
+        def make_player():
+            return InProcessPlayer(recorder, args.timeout)
+
+    outcomes = []
+
+    def run_room(_):
+        player_count = random.randint(args.min_players, args.max_players)
+        try:
+            outcomes.append(play_room(make_player, player_count))
+        except Exception:
+            recorder.record('room_failed', 0.0, ok=False)
+            outcomes.append(False)
+
+    start = time.perf_counter()
+    Pool(args.concurrency).map(run_room, range(args.rooms))
+    elapsed = time.perf_counter() - start
+
+    report = recorder.report(elapsed, args.rooms, sum(outcomes))
+    report['mode'] = 'remote' if args.url else 'in-process'
+    report['concurrency'] = args.concurrency
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"{report['rooms_completed']}/{args.rooms} rooms completed in {elapsed:.2f}s, "
+          f"{report['events_per_sec']:.0f} events/sec, error rate {report['error_rate']:.2%}")
+    for event, stats in report['events'].items():
+        print(f"  {event:<18} n={stats['count']:<7} p50={stats['p50_ms']:.2f}ms "
+              f"p99={stats['p99_ms']:.2f}ms errors={stats['errors']}")
+    print(f"report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""多进程部署：调度器按游戏ID把连接转发到固定的工作进程
+
+每个工作进程是一个独立的 app.py（环境变量 WORKER_INDEX/WORKER_COUNT），只分配
+一致性哈希环上属于自己的游戏ID，因此一个房间的所有连接都在同一个进程中。
+调度器读取每个 TCP 连接的第一个 HTTP 请求：带 game_id 查询参数的连接转发给
+房间所在的进程，其余连接（页面、创建房间）轮流分配。大厅中的 validate_game 和
+join_game 遇到其他进程的房间时，通过进程间消息总线向房间所在的进程查询。
+
+用法: python cluster.py --workers 4 --port 5001
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import itertools
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+
+logger = logging.getLogger(__name__)
+
+
+class HashRing:
+    """一致性哈希环：每个节点在环上放置 replicas 个虚拟节点"""
+
+    def __init__(self, nodes: int, replicas: int = 100):
+        self.nodes = nodes
+        points = sorted((self._hash(f"{node}:{i}"), node)
+                        for node in range(nodes) for i in range(replicas))
+        self._keys = [key for key, _ in points]
+        self._owners = [node for _, node in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+    def owner(self, key) -> int:
+        """key（游戏ID）所属的节点编号"""
+        if self.nodes == 1:
+            return 0
+        index = bisect.bisect(self._keys, self._hash(str(key))) % len(self._keys)
+        return self._owners[index]
+
+
+class BusError(Exception):
+    """无法联系目标工作进程"""
+
+
+class LocalBus:
+    """进程内的消息总线，用于测试或在一个进程中模拟多个节点
+
+    消息经过一次 JSON 编解码，与跨进程的总线保持相同的语义。
+    """
+
+    def __init__(self):
+        self._handlers = {}
+
+    def serve(self, node: int, handler):
+        self._handlers[node] = handler
+
+    def request(self, node: int, message: dict) -> dict:
+        handler = self._handlers.get(node)
+        if handler is None:
+            raise BusError(f"节点 {node} 不可用")
+        reply = handler(json.loads(json.dumps(message)))
+        return json.loads(json.dumps(reply))
+
+    def close(self):
+        self._handlers.clear()
+
+
+class UnixSocketBus:
+    """基于 Unix 域套接字的消息总线：每个节点监听 <directory>/node-<编号>.sock
+
+    一次请求使用一个连接，请求和回复各是一行 JSON。服务端在后台线程中调用处理函数，
+    处理函数需要访问房间状态时应把工作交回事件循环（见 app.hub_handler）。
+    """
+
+    def __init__(self, directory: str, timeout: float = 2.0):
+        self.directory = directory
+        self.timeout = timeout
+        self._server = None
+
+    def _path(self, node):
+        return os.path.join(self.directory, f"node-{node}.sock")
+
+    def serve(self, node: int, handler):
+        path = self._path(node)
+        if os.path.exists(path):
+            os.remove(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(64)
+        self._server = server
+        threading.Thread(target=self._accept, args=(server, handler),
+                         name=f"bus-node-{node}", daemon=True).start()
+
+    def _accept(self, server, handler):
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return  # 已关闭
+            with conn:
+                try:
+                    conn.settimeout(self.timeout)
+                    message = json.loads(self._read_line(conn))
+                    reply = handler(message)
+                except Exception:
+                    logger.exception("Failed to handle bus message")
+                    reply = {'error': 'internal'}
+                try:
+                    conn.sendall(json.dumps(reply, ensure_ascii=False).encode() + b'\n')
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _read_line(conn) -> bytes:
+        chunks = []
+        while True:
+            chunk = conn.recv(4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if chunk.endswith(b'\n'):
+                break
+        return b''.join(chunks)
+
+    def request(self, node: int, message: dict) -> dict:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+                conn.settimeout(self.timeout)
+                conn.connect(self._path(node))
+                conn.sendall(json.dumps(message, ensure_ascii=False).encode() + b'\n')
+                reply = self._read_line(conn)
+        except OSError as e:
+            raise BusError(f"节点 {node} 不可用: {e}") from e
+        if not reply:
+            raise BusError(f"节点 {node} 没有回复")
+        return json.loads(reply)
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+
+class Dispatcher:
+    """按第一个 HTTP 请求中的 game_id 把 TCP 连接转发到工作进程
+
+    Socket.IO 客户端需要只使用 websocket 传输（一个连接对应一个 Socket.IO 会话），
+    长轮询的多个 HTTP 请求无法保证落在同一个进程上。
+    """
+
+    MAX_HEAD = 65536
+
+    def __init__(self, ring: HashRing, backends: list):
+        self.ring = ring
+        self.backends = backends  # [(host, port)]，按节点编号排列
+        self._round_robin = itertools.cycle(range(len(backends)))
+        self.connections = [0] * len(backends)
+
+    def route(self, head: bytes) -> int:
+        """根据请求头选择工作进程"""
+        try:
+            target = head.split(b'\r\n', 1)[0].split(b' ')[1].decode('latin-1')
+            game_id = parse_qs(urlsplit(target).query).get('game_id')
+        except IndexError:
+            game_id = None
+        if game_id:
+            return self.ring.owner(game_id[0])
+        return next(self._round_robin)
+
+    async def handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        node = self.route(head)
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(*self.backends[node])
+        except OSError:
+            logger.error("Worker %d is unavailable", node)
+            writer.write(b'HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            writer.close()
+            return
+        self.connections[node] += 1
+        upstream_writer.write(head)
+        try:
+            await asyncio.gather(self._pipe(reader, upstream_writer),
+                                 self._pipe(upstream_reader, writer))
+        finally:
+            self.connections[node] -= 1
+
+    @staticmethod
+    async def _pipe(reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port, limit=self.MAX_HEAD)
+        async with server:
+            await server.serve_forever()
+
+
+def spawn_workers(count, base_port, bus_dir, extra_env=None):
+    """启动 count 个 app.py 工作进程，监听 127.0.0.1:base_port+编号"""
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+    workers = []
+    for index in range(count):
+        env = dict(os.environ, **(extra_env or {}))
+        env.update({
+            'WORKER_INDEX': str(index),
+            'WORKER_COUNT': str(count),
+            'BUS_DIR': bus_dir,
+            'HOST': '127.0.0.1',
+            'PORT': str(base_port + index),
+        })
+        if os.environ.get('JOURNAL_DIR'):
+            # 每个工作进程使用自己的日志目录，只恢复属于自己的房间
+            env['JOURNAL_DIR'] = os.path.join(os.environ['JOURNAL_DIR'], f"worker-{index}")
+        workers.append(subprocess.Popen([sys.executable, app_path], env=env))
+    return workers
+
+
+def wait_for_port(host, port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--worker-base-port', type=int, default=15001)
+    parser.add_argument('--bus-dir', help='消息总线套接字目录（默认使用临时目录）')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    bus_dir = args.bus_dir or tempfile.mkdtemp(prefix='awalong-bus-')
+    workers = spawn_workers(args.workers, args.worker_base_port, bus_dir,
+                            {'LOG_LEVEL': args.log_level})
+
+    def shutdown(*_):
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    backends = [('127.0.0.1', args.worker_base_port + i) for i in range(args.workers)]
+    for host, port in backends:
+        if not wait_for_port(host, port):
+            logger.error("Worker on port %d did not start", port)
+            shutdown()
+    logger.info("Dispatching %s:%d to %d workers", args.host, args.port, args.workers)
+    dispatcher = Dispatcher(HashRing(args.workers), backends)
+    try:
+        asyncio.run(dispatcher.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,11 @@
 VERSION=${1:-v2}
 docker build  .  -t aolifu/awalong:$VERSION
 docker push aolifu/awalong:$VERSION
-docker stop awalong
+# 旧容器收到 SIGTERM 后进入排空模式：把所有房间写入交接文件并通知客户端重连（最多等待30秒）
+docker stop -t 30 awalong
 docker rm awalong
-docker run -d --name awalong -p 11012:5001 aolifu/awalong:$VERSION
\ No newline at end of file
+# 操作日志保存在数据卷中，新容器启动时回放恢复进行中的房间；交接文件比日志更新、加载更快，优先使用
+docker run -d --name awalong -p 11012:5001 -v awalong-journal:/data/journal -e JOURNAL_DIR=/data/journal \
+    -v awalong-handoff:/data/handoff -e HANDOFF_FILE=/data/handoff/rooms.bin \
+    -v awalong-history:/data/history -e HISTORY_DB=/data/history/games.db \
+    -e LOG_LEVEL=INFO aolifu/awalong:$VERSION
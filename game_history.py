@@ -0,0 +1,193 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from avalon import AvalonGame
+
+logger = logging.getLogger(__name__)
+
+# 对局结束的原因
+REJECTIONS = 'rejections'            # 连续5次提议被否决，邪恶方获胜
+QUESTS_FAILED = 'quests_failed'      # 3次任务失败，邪恶方获胜
+MERLIN_KILLED = 'merlin_killed'      # 刺客刺中梅林，邪恶方获胜
+MERLIN_SURVIVED = 'merlin_survived'  # 刺客猜错或超时未行动，正义方获胜
+EVIL_WINS = frozenset({REJECTIONS, QUESTS_FAILED, MERLIN_KILLED})
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS games ('
+    ' id INTEGER PRIMARY KEY AUTOINCREMENT, room TEXT NOT NULL, finished_at REAL NOT NULL,'
+    ' player_count INTEGER NOT NULL, roles TEXT NOT NULL, winner TEXT NOT NULL, reason TEXT NOT NULL,'
+    ' assassin_target INTEGER, quests TEXT NOT NULL, history TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS role_stats ('
+    ' role TEXT NOT NULL, player_count INTEGER NOT NULL, games INTEGER NOT NULL, wins INTEGER NOT NULL,'
+    ' PRIMARY KEY (role, player_count))',
+    'CREATE TABLE IF NOT EXISTS count_stats ('
+    ' player_count INTEGER PRIMARY KEY, games INTEGER NOT NULL, good_wins INTEGER NOT NULL,'
+    ' rejection_losses INTEGER NOT NULL, assassinations INTEGER NOT NULL, assassin_hits INTEGER NOT NULL)',
+)
+
+
+def _rate(part, total):
+    return round(part / total, 4) if total else None
+
+
+class GameHistory:
+    """已结束对局的历史记录和统计（SQLite，WAL 模式）
+
+    record() 只把对局放入内存缓冲区，后台线程每隔 flush_interval 秒把一批对局写入
+    games 表，并在同一个事务中累加聚合表：role_stats（角色 × 人数的局数和胜局数）
+    和 count_stats（按人数的胜负、刺杀和否决次数）。stats() 只读取聚合表，行数只
+    取决于角色和人数的组合，与历史对局的数量无关；结果缓存 cache_ttl 秒。
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5, cache_ttl: float = 1.0, clock=time.monotonic):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.cache_ttl = cache_ttl
+        self._clock = clock
+        self._db = self._connect()
+        for statement in SCHEMA:
+            self._db.execute(statement)
+        self._reader = self._connect()
+        self._pending = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._cache = None  # (读取时间, 统计结果)
+        self.games_written = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    def record(self, room, game: AvalonGame, reason: str, assassin_target: int = None):
+        """记录一局已结束的游戏（异步写入）；reason 为本模块定义的结束原因之一"""
+        entry = (room, time.time(), game.player_count, bytes(game.role_codes), reason, assassin_target,
+                 list(game.quest_results), [list(item) for item in game.history])
+        with self._cond:
+            self._pending.append(entry)
+
+    def flush(self):
+        """同步写入所有缓冲的对局"""
+        with self._cond:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+        self._db.close()
+        self._reader.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.flush_interval)
+                batch, self._pending = self._pending, []
+                closed = self._closed
+            if batch:
+                try:
+                    self._write(batch)
+                except sqlite3.Error:
+                    logger.exception("Failed to write game history")
+            if closed:
+                return
+
+    def _write(self, batch):
+        """一批对局在一个事务中写入，聚合表的增量先在内存中按键合并"""
+        rows = []
+        roles = {}  # (角色, 人数) -> [局数, 胜局数]
+        counts = {}  # 人数 -> [局数, 正义方胜局, 否决失败, 刺杀次数, 刺中次数]
+        for room, finished_at, player_count, codes, reason, target, quests, history in batch:
+            evil_won = reason in EVIL_WINS
+            names = [AvalonGame.ROLE_NAMES[code] for code in codes]
+            rows.append((room, finished_at, player_count, json.dumps(names, ensure_ascii=False),
+                         'evil' if evil_won else 'good', reason, target,
+                         json.dumps(quests), json.dumps(history, separators=(',', ':'))))
+            for code, name in zip(codes, names):
+                stats = roles.setdefault((name, player_count), [0, 0])
+                stats[0] += 1
+                stats[1] += (AvalonGame.EVIL_ROLES >> code & 1) == evil_won
+            stats = counts.setdefault(player_count, [0, 0, 0, 0, 0])
+            stats[0] += 1
+            stats[1] += not evil_won
+            stats[2] += reason == REJECTIONS
+            stats[3] += target is not None
+            stats[4] += reason == MERLIN_KILLED
+        db = self._db
+        db.execute('BEGIN')
+        try:
+            db.executemany(
+                'INSERT INTO games (room, finished_at, player_count, roles, winner, reason, assassin_target,'
+                ' quests, history) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            db.executemany(
+                'INSERT INTO role_stats (role, player_count, games, wins) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(role, player_count) DO UPDATE SET '
+                'games = games + excluded.games, wins = wins + excluded.wins',
+                [(name, player_count, *stats) for (name, player_count), stats in roles.items()])
+            db.executemany(
+                'INSERT INTO count_stats (player_count, games, good_wins, rejection_losses, assassinations,'
+                ' assassin_hits) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(player_count) DO UPDATE SET '
+                'games = games + excluded.games, good_wins = good_wins + excluded.good_wins, '
+                'rejection_losses = rejection_losses + excluded.rejection_losses, '
+                'assassinations = assassinations + excluded.assassinations, '
+                'assassin_hits = assassin_hits + excluded.assassin_hits',
+                [(player_count, *stats) for player_count, stats in counts.items()])
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        self.games_written += len(rows)
+        self.batches += 1
+
+    def stats(self) -> dict:
+        """按人数和角色的胜率、刺客命中率和否决失败次数，只读取聚合表"""
+        now = self._clock()
+        if self._cache is not None and now - self._cache[0] < self.cache_ttl:
+            return self._cache[1]
+        by_count = {}
+        total = {'games': 0, 'good_wins': 0, 'rejection_losses': 0, 'assassinations': 0, 'assassin_hits': 0}
+        for row in self._reader.execute('SELECT player_count, games, good_wins, rejection_losses, assassinations,'
+                                        ' assassin_hits FROM count_stats ORDER BY player_count'):
+            player_count, games, good_wins, rejections, assassinations, hits = row
+            by_count[player_count] = {
+                'games': games,
+                'good_win_rate': _rate(good_wins, games),
+                'rejection_losses': rejections,
+                'assassin_hit_rate': _rate(hits, assassinations),
+                'roles': {}
+            }
+            for key, value in zip(total, row[1:]):
+                total[key] += value
+        roles = {}
+        for name, player_count, games, wins in self._reader.execute(
+                'SELECT role, player_count, games, wins FROM role_stats'):
+            by_count[player_count]['roles'][name] = {'games': games, 'win_rate': _rate(wins, games)}
+            role = roles.setdefault(name, [0, 0])
+            role[0] += games
+            role[1] += wins
+        result = {
+            'games': total['games'],
+            'good_win_rate': _rate(total['good_wins'], total['games']),
+            'rejection_losses': total['rejection_losses'],
+            'assassin_hit_rate': _rate(total['assassin_hits'], total['assassinations']),
+            'roles': {name: {'games': games, 'win_rate': _rate(wins, games)}
+                      for name, (games, wins) in roles.items()},
+            'by_player_count': by_count
+        }
+        self._cache = (now, result)
+        return result
@@ -0,0 +1,145 @@
+import random
+import time
+from collections import deque
+
+
+class GameIdSpaceExhausted(Exception):
+    """所有可用的游戏ID都已被占用"""
+
+
+class _Tier:
+    """某一位数的ID空间：打乱顺序的未使用ID + 回收的ID队列"""
+    __slots__ = ('digits', 'capacity', 'fresh', 'recycled', 'in_use')
+
+    def __init__(self, digits: int, rng: random.Random, owns=None):
+        low, high = 10 ** (digits - 1), 10 ** digits
+        self.digits = digits
+        self.fresh = list(range(low, high))
+        if owns is not None:
+            # 多进程部署时只使用属于当前进程的ID
+            self.fresh = [value for value in self.fresh if owns(str(value))]
+        self.capacity = len(self.fresh)
+        rng.shuffle(self.fresh)
+        self.recycled = deque()
+        self.in_use = 0
+
+    def pop(self):
+        # 优先使用从未分配过的ID，回收的ID按释放顺序复用，降低旧客户端误入新房间的概率
+        if self.fresh:
+            return self.fresh.pop()
+        if self.recycled:
+            return self.recycled.popleft()
+        return None
+
+
+class GameIdAllocator:
+    """无冲突的游戏ID分配器
+
+    每一位数的ID空间维护一个空闲列表，分配和释放都是 O(1)。当前位数的占用率
+    超过 widen_threshold 时，自动启用多一位的ID空间（最多 max_digits 位）。
+    owns 用于只分配部分ID（例如一致性哈希环上属于当前工作进程的ID）。
+    """
+
+    def __init__(self, digits: int = 4, max_digits: int = 5,
+                 widen_threshold: float = 0.9, seed=None, owns=None):
+        self.max_digits = max_digits
+        self.widen_threshold = widen_threshold
+        self._rng = random.Random(seed)
+        self._owns = owns
+        self._tiers = [_Tier(digits, self._rng, owns)]
+        self._in_use = set()
+        self.allocated_total = 0
+        self.released_total = 0
+        self.allocate_seconds_total = 0.0
+        self._recent = deque(maxlen=1024)  # 最近的分配时间，用于计算分配速率
+
+    def allocate(self) -> str:
+        """分配一个当前未被占用的游戏ID"""
+        start = time.perf_counter()
+        tier = self._pick_tier()
+        while True:
+            value = tier.pop()
+            if value is None:
+                raise GameIdSpaceExhausted(f"{tier.digits}位游戏ID已全部占用")
+            # 通过 reserve() 占用的ID可能仍留在空闲列表中，跳过即可
+            if value not in self._in_use:
+                break
+        self._in_use.add(value)
+        tier.in_use += 1
+        self.allocated_total += 1
+        now = time.perf_counter()
+        self.allocate_seconds_total += now - start
+        self._recent.append(now)
+        return str(value)
+
+    def reserve(self, game_id) -> bool:
+        """占用指定的游戏ID（例如从快照中恢复房间时），已被占用返回 False"""
+        value = int(game_id)
+        tier = self._tier_for(value, create=True)
+        if tier is None or value in self._in_use:
+            return False
+        self._in_use.add(value)
+        tier.in_use += 1
+        return True
+
+    def release(self, game_id) -> bool:
+        """回收已关闭房间的游戏ID"""
+        value = int(game_id)
+        if value not in self._in_use:
+            return False
+        self._in_use.discard(value)
+        tier = self._tier_for(value)
+        tier.in_use -= 1
+        tier.recycled.append(value)
+        self.released_total += 1
+        return True
+
+    def __contains__(self, game_id) -> bool:
+        try:
+            return int(game_id) in self._in_use
+        except (TypeError, ValueError):
+            return False
+
+    def _tier_for(self, value: int, create: bool = False):
+        digits = len(str(value))
+        for tier in self._tiers:
+            if tier.digits == digits:
+                return tier
+        if create and self._tiers[-1].digits < digits <= self.max_digits:
+            while self._tiers[-1].digits < digits:
+                self._tiers.append(_Tier(self._tiers[-1].digits + 1, self._rng, self._owns))
+            return self._tiers[-1]
+        return None
+
+    def _pick_tier(self) -> _Tier:
+        for tier in self._tiers:
+            if tier.in_use < tier.capacity * self.widen_threshold:
+                return tier
+        widest = self._tiers[-1]
+        if widest.digits < self.max_digits:
+            widest = _Tier(widest.digits + 1, self._rng, self._owns)
+            self._tiers.append(widest)
+            return widest
+        # 已达到最大位数，继续使用仍有空位的ID空间直到全部占满
+        for tier in self._tiers:
+            if tier.in_use < tier.capacity:
+                return tier
+        return widest
+
+    def stats(self) -> dict:
+        """ID空间占用率和分配吞吐量指标"""
+        capacity = sum(t.capacity for t in self._tiers)
+        rate = 0.0
+        if len(self._recent) > 1 and self._recent[-1] > self._recent[0]:
+            rate = (len(self._recent) - 1) / (self._recent[-1] - self._recent[0])
+        return {
+            'in_use': len(self._in_use),
+            'capacity': capacity,
+            'occupancy': len(self._in_use) / capacity,
+            'digits': [t.digits for t in self._tiers],
+            'occupancy_by_digits': {t.digits: t.in_use / t.capacity for t in self._tiers},
+            'allocated_total': self.allocated_total,
+            'released_total': self.released_total,
+            'allocate_seconds_total': self.allocate_seconds_total,
+            'allocation_rate': rate,
+        }
@@ -0,0 +1,40 @@
+import json
+import os
+import zlib
+
+MAGIC = b'AWHANDOFF1\n'
+
+
+class HandoffError(Exception):
+    """交接文件损坏或格式不对"""
+
+
+def write_handoff(path: str, records: dict, level: int = 6) -> int:
+    """把所有房间的记录 {room: record} 写成一个压缩的交接文件，返回文件字节数
+
+    先写临时文件并 fsync，再原子替换，新进程不会读到写了一半的文件。
+    """
+    data = json.dumps(records, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    payload = MAGIC + zlib.compress(data, level)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(payload)
+
+
+def read_handoff(path: str):
+    """读取交接文件，返回 {room: record}；文件不存在时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            payload = f.read()
+    except FileNotFoundError:
+        return None
+    if not payload.startswith(MAGIC):
+        raise HandoffError(f"{path} 不是交接文件")
+    try:
+        return json.loads(zlib.decompress(payload[len(MAGIC):]))
+    except (zlib.error, ValueError) as e:
+        raise HandoffError(f"{path} 已损坏: {e}")
@@ -0,0 +1,42 @@
+from collections import OrderedDict
+
+
+class AckWindow:
+    """一个座位最近处理过的操作序号和回执
+
+    客户端的序号单调递增。窗口中的序号是重复提交，直接返回当时的回执；不在窗口
+    中但不大于已处理的最大序号的，是早已处理过（或已被更新的操作取代）的过期
+    提交。查找和记录都是 O(1)。
+    """
+    __slots__ = ('size', 'acks', 'highest')
+
+    def __init__(self, size: int = 16):
+        self.size = size
+        self.acks = OrderedDict()  # seq -> 回执
+        self.highest = None
+
+    def get(self, seq):
+        """重复提交时返回缓存的回执，否则返回 None"""
+        return self.acks.get(seq)
+
+    def is_stale(self, seq) -> bool:
+        return self.highest is not None and seq <= self.highest and seq not in self.acks
+
+    def put(self, seq, ack):
+        self.acks[seq] = ack
+        if self.highest is None or seq > self.highest:
+            self.highest = seq
+        if len(self.acks) > self.size:
+            self.acks.popitem(last=False)
+
+    def to_state(self) -> list:
+        """[最大序号, [[seq, 回执], ...]]，用于交接快照"""
+        return [self.highest, [[seq, ack] for seq, ack in self.acks.items()]]
+
+    @classmethod
+    def from_state(cls, state: list, size: int = 16) -> 'AckWindow':
+        window = cls(size)
+        window.highest, acks = state
+        for seq, ack in acks[-size:]:
+            window.acks[seq] = ack
+        return window
@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class Journal:
+    """按房间记录已接受的操作，并定期写入快照
+
+    每个房间对应两个文件：<room>.log 每行一个 JSON 事件，<room>.snap 是最近一次
+    快照。append() 只把事件放入内存缓冲区，后台线程每隔 fsync_interval 秒批量
+    写入并 fsync，因此处理函数不会被磁盘 I/O 阻塞。快照与事件按提交顺序写入：
+    快照落盘后对应的日志被截断，恢复时只需重放快照之后的事件。
+    """
+
+    def __init__(self, directory: str, fsync_interval: float = 0.05, max_open_files: int = 256):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.max_open_files = max_open_files
+        os.makedirs(directory, exist_ok=True)
+        self._pending = []  # [(room, kind, payload)]，kind 为 'event'、'snapshot' 或 'remove'
+        self._cond = threading.Condition()
+        self._files = OrderedDict()  # room -> 打开的日志文件（LRU）
+        self._closed = False
+        self.events_written = 0
+        self.fsyncs = 0
+        self._thread = threading.Thread(target=self._run, name='journal-writer', daemon=True)
+        self._thread.start()
+
+    def append(self, room, event: dict):
+        """追加一个事件（异步落盘）"""
+        line = json.dumps(event, ensure_ascii=False, separators=(',', ':'))
+        with self._cond:
+            self._pending.append((room, 'event', line))
+
+    def snapshot(self, room, state: dict):
+        """写入房间快照，快照之前的事件随后从日志中删除"""
+        data = json.dumps(state, ensure_ascii=False, separators=(',', ':'))
+        with self._cond:
+            self._pending.append((room, 'snapshot', data))
+
+    def remove(self, room):
+        """房间关闭后删除它的日志和快照"""
+        with self._cond:
+            self._pending.append((room, 'remove', None))
+
+    def flush(self):
+        """同步写入所有缓冲的事件"""
+        with self._cond:
+            batch, self._pending = self._pending, []
+        self._write(batch)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def load_all(self):
+        """读取所有房间，返回 {room: (snapshot 或 None, [快照之后的事件])}"""
+        rooms = {}
+        for name in os.listdir(self.directory):
+            room, ext = os.path.splitext(name)
+            if ext in ('.log', '.snap') and room not in rooms:
+                rooms[room] = (self._read_snapshot(room), self._read_events(room))
+        return rooms
+
+    def _path(self, room, ext):
+        return os.path.join(self.directory, f"{room}{ext}")
+
+    def _read_snapshot(self, room):
+        try:
+            with open(self._path(room, '.snap'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _read_events(self, room):
+        events = []
+        try:
+            with open(self._path(room, '.log'), encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        events.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # 进程崩溃时最后一行可能只写了一半
+                        logger.warning("Ignoring torn journal record", extra={'room': room})
+                        break
+        except FileNotFoundError:
+            pass
+        return events
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.fsync_interval)
+                batch, self._pending = self._pending, []
+                closed = self._closed
+            if batch:
+                try:
+                    self._write(batch)
+                except OSError:
+                    logger.exception("Failed to write journal")
+            if closed:
+                return
+
+    def _write(self, batch):
+        """按房间合并一批记录，每个房间只写一次并 fsync 一次"""
+        lines = {}
+        for room, kind, payload in batch:
+            if kind == 'event':
+                lines.setdefault(room, []).append(payload)
+                continue
+            # 快照已包含之前的所有事件，删除房间时事件也不再需要
+            lines.pop(room, None)
+            if kind == 'snapshot':
+                self._write_snapshot(room, payload)
+            else:
+                self._drop_file(room)
+                for ext in ('.log', '.snap'):
+                    try:
+                        os.remove(self._path(room, ext))
+                    except FileNotFoundError:
+                        pass
+        created = False
+        for room, chunk in lines.items():
+            f, new = self._file(room)
+            f.write('\n'.join(chunk) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+            created |= new
+            self.events_written += len(chunk)
+            self.fsyncs += 1
+        if created:
+            # 新建的日志文件需要同步目录项才能在断电后保留
+            fd = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _write_snapshot(self, room, data):
+        tmp = self._path(room, '.snap.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(room, '.snap'))
+        # 快照已覆盖之前的所有事件，截断日志
+        self._drop_file(room)
+        open(self._path(room, '.log'), 'w').close()
+
+    def _file(self, room):
+        """返回 (日志文件, 是否新建)；打开的文件数超过上限时关闭最久未写入的文件"""
+        f = self._files.get(room)
+        if f is not None:
+            self._files.move_to_end(room)
+            return f, False
+        if len(self._files) >= self.max_open_files:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()  # 写入后已经 fsync
+        path = self._path(room, '.log')
+        new = not os.path.exists(path)
+        f = self._files[room] = open(path, 'a', encoding='utf-8')
+        return f, new
+
+    def _drop_file(self, room):
+        f = self._files.pop(room, None)
+        if f is not None:
+            f.close()
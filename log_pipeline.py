@@ -0,0 +1,185 @@
+"""日志管道：调用方只创建日志记录并放入队列，格式化和写出在后台线程中完成
+
+- 记录保持 logger.debug("... %s", value) 的参数形式，只有真正写出时才格式化
+  （参数应是不会再被修改的值）
+- 带 extra={'room': 房间ID} 的记录额外保存在该房间的环形缓冲区中；低于输出级别的
+  调试记录平时不写出，房间出现 ERROR 级别的记录时先把缓冲区中的记录一起写出
+- 调试记录可以按比例采样写出，环形缓冲区不受采样影响
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from collections import OrderedDict, deque
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """不在调用方线程中格式化消息的 QueueHandler"""
+
+    def prepare(self, record):
+        if record.exc_info and not record.exc_text:
+            # 异常的 traceback 在调用方线程中展开，避免引用的帧在写出前发生变化
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """按 rate 的比例保留调试记录，其他级别全部保留"""
+
+    def __init__(self, rate: float, rng=random.random):
+        super().__init__()
+        self.rate = rate
+        self._rng = rng
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or self._rng() < self.rate
+
+
+class RoomRingHandler(logging.Handler):
+    """按房间保存最近的记录，房间出错时把缓冲的记录交给 target 写出"""
+
+    def __init__(self, target: logging.Handler, size: int = 64, max_rooms: int = 10000):
+        super().__init__(logging.DEBUG)
+        self.target = target
+        self.size = size
+        self.max_rooms = max_rooms
+        self._rings = OrderedDict()  # room -> deque[LogRecord]
+        self.dumps = 0
+
+    def emit(self, record):
+        room = getattr(record, 'room', None)
+        if room is None:
+            return
+        if record.levelno >= logging.ERROR:
+            self.dump(room)
+            return
+        ring = self._rings.get(room)
+        if ring is None:
+            ring = self._rings[room] = deque(maxlen=self.size)
+            if len(self._rings) > self.max_rooms:
+                self._rings.popitem(last=False)
+        ring.append(record)
+
+    def dump(self, room):
+        """写出房间缓冲的全部记录（已按输出级别写出过的记录除外）并清空"""
+        ring = self._rings.pop(room, None)
+        if not ring:
+            return
+        self.dumps += 1
+        for record in ring:
+            if not getattr(record, 'emitted', False):
+                self.target.handle(record)
+
+
+class OutputHandler(logging.StreamHandler):
+    """按级别和采样写出，并在记录上标记已写出，环形缓冲区转储时不再重复"""
+
+    def __init__(self, stream, level, sample_rate):
+        super().__init__(stream)
+        self.output_level = level
+        self.sampler = SamplingFilter(sample_rate)
+
+    # 没有指定 stream 时每次使用当前的 sys.stderr（与 logging.lastResort 相同）
+    @property
+    def stream(self):
+        return self._stream or sys.stderr
+
+    @stream.setter
+    def stream(self, value):
+        self._stream = value if value is not sys.stderr else None
+
+    def handle_live(self, record):
+        if record.levelno >= self.output_level and self.sampler.filter(record):
+            record.emitted = True
+            self.handle(record)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s%(room_field)s: %(message)s')
+
+    def format(self, record):
+        room = getattr(record, 'room', None)
+        record.room_field = f" room={room}" if room is not None else ''
+        return super().format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        room = getattr(record, 'room', None)
+        if room is not None:
+            entry['room'] = room
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _Dispatch(logging.Handler):
+    """后台线程中的分发：实时输出和房间环形缓冲区"""
+
+    def __init__(self, output: OutputHandler, ring: RoomRingHandler):
+        super().__init__(logging.DEBUG)
+        self.output = output
+        self.ring = ring
+
+    def handle(self, record):
+        # 先转储房间的缓冲记录，错误记录写在它的上下文之后
+        if self.ring is not None:
+            self.ring.handle(record)
+        self.output.handle_live(record)
+
+
+class LogPipeline:
+    """安装在根 logger 上的日志管道"""
+
+    def __init__(self, level=logging.INFO, sample_rate: float = 1.0, ring_size: int = 64,
+                 fmt: str = 'text', stream=None):
+        if isinstance(level, str):
+            level = logging.getLevelName(level.upper())
+        self.output = OutputHandler(stream, level, sample_rate)
+        self.output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+        self.ring = RoomRingHandler(self.output, ring_size) if ring_size else None
+        self.queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(self.queue, _Dispatch(self.output, self.ring))
+        self.level = level
+        self._running = False
+        self.handler = LazyQueueHandler(self.queue)
+
+    def install(self, root: logging.Logger = None):
+        """替换根 logger（或指定的 logger）的处理器，其级别为输出级别"""
+        root = root or logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        self.listener.start()
+        self._running = True
+        return self
+
+    def capture(self, logger: logging.Logger):
+        """有环形缓冲区时让 logger 创建调试记录以便出错时转储；
+        否则低于输出级别的调用在 isEnabledFor 处直接返回"""
+        logger.setLevel(logging.DEBUG if self.ring is not None else self.level)
+
+    def flush(self):
+        """等待队列中的记录全部写出"""
+        if self._running:
+            self.listener.stop()
+            self.listener.start()
+
+    def stop(self):
+        if self._running:
+            self._running = False
+            self.listener.stop()
+            self.output.flush()
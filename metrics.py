@@ -0,0 +1,148 @@
+"""进程内的指标：计数器、直方图和按需计算的仪表，以 Prometheus 文本格式输出
+
+指标最多有一个标签（例如事件名），记录时只做一次字典查找和一次二分查找，
+不加锁（gevent 下处理函数在同一个线程中运行）。
+"""
+import bisect
+import functools
+import json
+import time
+from collections import defaultdict
+
+# 处理函数耗时的默认分桶（秒）
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _labels(label_name, label):
+    if label_name is None:
+        return ''
+    value = str(label).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'{label_name}="{value}"'
+
+
+def _series(name, labels, extra=''):
+    parts = ','.join(p for p in (labels, extra) if p)
+    return f"{name}{{{parts}}}" if parts else name
+
+
+def _number(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
+
+
+class Counter:
+    def __init__(self, name, help, label_name=None):
+        self.name, self.help, self.label_name = name, help, label_name
+        self.values = defaultdict(int)
+
+    def inc(self, label=None, amount=1):
+        self.values[label] += amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for label, value in sorted(self.values.items(), key=lambda item: str(item[0])):
+            yield f"{_series(self.name, _labels(self.label_name, label))} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name, help, label_name=None, buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_name = name, help, label_name
+        self.buckets = tuple(buckets)
+        self.series = {}  # label -> [各分桶计数..., +Inf 计数, 总和]
+
+    def observe(self, value, label=None):
+        series = self.series.get(label)
+        if series is None:
+            series = self.series[label] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, label=None):
+        """装饰器：记录函数的执行时间"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, label)
+            return timed
+        return decorator
+
+    def count(self, label=None):
+        series = self.series.get(label)
+        return sum(series[:-1]) if series else 0
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label, series in sorted(self.series.items(), key=lambda item: str(item[0])):
+            labels = _labels(self.label_name, label)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = 'le="%s"' % _number(float(bound))
+                yield f"{_series(self.name + '_bucket', labels, le)} {cumulative}"
+            yield f"{_series(self.name + '_sum', labels)} {_number(series[-1])}"
+            yield f"{_series(self.name + '_count', labels)} {cumulative}"
+
+
+class Gauge:
+    """抓取时调用 fn 计算当前值"""
+
+    def __init__(self, name, help, fn):
+        self.name, self.help, self.fn = name, help, fn
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {_number(self.fn())}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, label_name=None) -> Counter:
+        return self._add(Counter(name, help, label_name))
+
+    def histogram(self, name, help, label_name=None, buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, label_name, buckets))
+
+    def gauge(self, name, help, fn) -> Gauge:
+        return self._add(Gauge(name, help, fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class CountingJSON:
+    """统计编码字节数的 json 模块替代品（传给 SocketIO(json=...)）
+
+    Socket.IO 对一次广播只编码一次，调用前后 encoded_bytes 的差就是这次广播的
+    负载大小，不需要为统计而再编码一次。
+    """
+
+    def __init__(self):
+        self.encoded_bytes = 0
+
+    def dumps(self, *args, **kwargs):
+        data = json.dumps(*args, **kwargs)
+        self.encoded_bytes += len(data)
+        return data
+
+    @staticmethod
+    def loads(*args, **kwargs):
+        return json.loads(*args, **kwargs)
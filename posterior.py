@@ -0,0 +1,263 @@
+"""公开记录上的角色后验概率：每个座位是邪恶方或梅林的概率
+
+公开记录是 AvalonGame.history：每次提名的队长和队伍、每名玩家的表决、任务的
+失败票数。推断在"世界"上进行，一个世界是 (邪恶方座位位掩码, 梅林的座位,
+梅林能看到的邪恶方座位位掩码)。固定一个世界后，其余角色在其余座位上的排列数
+对所有世界都相同，所以均匀的世界先验就是均匀的完整角色分配先验，按世界枚举
+给出的后验是精确的（10人局共 210×6×6 = 7560 个世界）。
+
+每个事件到来时只乘上这一个事件的似然，去掉概率为 0 的世界并重新归一化；
+似然中只依赖邪恶方位掩码的部分对每个位掩码只计算一次。行为的似然由
+BehaviourModel 给出，失败票数多于队伍中邪恶方人数的世界总是被排除。
+
+用法: python posterior.py 状态.json（AvalonGame.to_state() 的结果或房间记录）
+"""
+import functools
+import itertools
+import json
+import sys
+from math import comb
+from typing import List, Optional
+
+from avalon import AvalonGame
+
+
+def _popcount(mask: int) -> int:
+    return bin(mask).count('1')
+
+
+class BehaviourModel:
+    """公开行为的似然模型
+
+    - fail_prob: 邪恶方队员在任务中出失败票的概率
+    - evil_approve: 邪恶方玩家赞成（队伍中有邪恶方, 队伍中没有邪恶方）的概率
+    - merlin_approve: 梅林赞成（队伍中有他能看到的邪恶方, 没有）的概率
+    - good_approve: 其他正义方玩家赞成的概率（他们不知道队伍的阵营）
+    - evil_leader_bias: 邪恶方队长提名的队伍包含邪恶方的概率；
+      正义方队长在同样人数的所有队伍中均匀选择
+    """
+    __slots__ = ('fail_prob', 'evil_approve', 'merlin_approve', 'good_approve', 'evil_leader_bias')
+
+    def __init__(self, fail_prob: float = 0.9, evil_approve=(0.85, 0.35), merlin_approve=(0.2, 0.8),
+                 good_approve: float = 0.6, evil_leader_bias: float = 0.9):
+        for p in (fail_prob, *evil_approve, *merlin_approve, good_approve, evil_leader_bias):
+            if not 0 <= p <= 1:
+                raise ValueError("概率必须在0到1之间")
+        if not 0 < good_approve < 1:
+            raise ValueError("good_approve 必须在0和1之间（不含端点）")
+        self.fail_prob = fail_prob
+        self.evil_approve = tuple(evil_approve)
+        self.merlin_approve = tuple(merlin_approve)
+        self.good_approve = good_approve
+        self.evil_leader_bias = evil_leader_bias
+
+
+@functools.lru_cache(maxsize=None)
+def worlds(player_count: int) -> tuple:
+    """枚举 player_count 人局的所有世界 (evil_mask, merlin, visible_mask)"""
+    codes = [AvalonGame.ROLE_CODES[role] for role in AvalonGame.roles[player_count]]
+    evil_codes = [code for code in codes if AvalonGame.EVIL_ROLES >> code & 1]
+    seen = AvalonGame.VISIBLE_ROLES[AvalonGame.MERLIN]
+    hidden_count = sum(1 for code in evil_codes if not seen >> code & 1)
+    result = []
+    for evil in itertools.combinations(range(player_count), len(evil_codes)):
+        evil_mask = sum(1 << i for i in evil)
+        for hidden in itertools.combinations(evil, hidden_count):
+            visible_mask = evil_mask & ~sum(1 << i for i in hidden)
+            for merlin in range(player_count):
+                if not evil_mask >> merlin & 1:
+                    result.append((evil_mask, merlin, visible_mask))
+    return tuple(result)
+
+
+class RolePosterior:
+    """按事件增量更新的角色后验
+
+    可以直接调用 observe_*，也可以反复用 sync(game.history) 跟上游戏的公开记录
+    （只处理上次之后新增的部分）。
+    """
+
+    def __init__(self, player_count: int, model: BehaviourModel = None):
+        if player_count not in AvalonGame.roles:
+            raise ValueError("游戏人数必须在5-10人之间")
+        self.player_count = player_count
+        self.model = model or BehaviourModel()
+        self.evil_count = sum(1 for role in AvalonGame.roles[player_count]
+                              if AvalonGame.ROLE_CAMPS[role] == "邪恶方")
+        self._worlds = list(worlds(player_count))
+        self._weights = [1.0 / len(self._worlds)] * len(self._worlds)
+        self._cursor = (0, 0)  # (history 中的下标, 该项已处理的部分数)
+        self._marginals = None
+        self.events = 0
+
+    @classmethod
+    def from_game(cls, game: AvalonGame, model: BehaviourModel = None) -> 'RolePosterior':
+        return cls(game.player_count, model).sync(game.history)
+
+    @property
+    def world_count(self) -> int:
+        """仍与公开记录相容的世界数"""
+        return len(self._worlds)
+
+    def _update(self, evil_factor, merlin_factor=None):
+        """乘上似然：evil_factor(evil_mask) 对每个位掩码只调用一次，
+        merlin_factor(merlin, visible_mask) 是依赖梅林的部分"""
+        memo = {}
+        worlds_, weights = [], []
+        total = 0.0
+        for world, weight in zip(self._worlds, self._weights):
+            evil_mask = world[0]
+            factor = memo.get(evil_mask)
+            if factor is None:
+                factor = memo[evil_mask] = evil_factor(evil_mask)
+            if factor and merlin_factor is not None:
+                factor *= merlin_factor(world[1], world[2])
+            if factor:
+                weight *= factor
+                worlds_.append(world)
+                weights.append(weight)
+                total += weight
+        if not total:
+            raise ValueError("公开记录与角色配置矛盾")
+        self._worlds = worlds_
+        self._weights = [w / total for w in weights]
+        self._marginals = None
+        self.events += 1
+
+    def observe_proposal(self, leader: int, team: List[int]):
+        """队长 leader 提名了 team"""
+        n, k = self.player_count, len(team)
+        team_mask = sum(1 << i for i in team)
+        all_teams = comb(n, k)
+        clean_teams = comb(n - self.evil_count, k)
+        bias = self.model.evil_leader_bias if clean_teams else 1.0
+        leader_bit = 1 << leader
+
+        def evil_factor(evil_mask):
+            if not evil_mask & leader_bit:
+                return 1.0 / all_teams
+            if evil_mask & team_mask:
+                return bias / (all_teams - clean_teams)
+            return (1.0 - bias) / clean_teams
+
+        self._update(evil_factor)
+
+    def observe_team_vote(self, team: List[int], yes_mask: int):
+        """对 team 的表决结果，yes_mask 是投赞成票的座位位掩码"""
+        model = self.model
+        team_mask = sum(1 << i for i in team)
+        all_mask = (1 << self.player_count) - 1
+        g = model.good_approve
+
+        def evil_factor(evil_mask):
+            ea = model.evil_approve[0 if evil_mask & team_mask else 1]
+            good_mask = all_mask & ~evil_mask
+            evil_yes = _popcount(evil_mask & yes_mask)
+            good_yes = _popcount(good_mask & yes_mask)
+            return (ea ** evil_yes * (1 - ea) ** (self.evil_count - evil_yes)
+                    * g ** good_yes * (1 - g) ** (self.player_count - self.evil_count - good_yes))
+
+        # 梅林的票已按普通正义方计入，这里换成梅林的概率
+        ratios = {}
+        for sees_evil in (True, False):
+            m = model.merlin_approve[0 if sees_evil else 1]
+            ratios[True, sees_evil] = m / g
+            ratios[False, sees_evil] = (1 - m) / (1 - g)
+
+        def merlin_factor(merlin, visible_mask):
+            return ratios[bool(yes_mask >> merlin & 1), bool(visible_mask & team_mask)]
+
+        self._update(evil_factor, merlin_factor)
+
+    def observe_quest(self, team: List[int], fails: int):
+        """team 执行的任务中有 fails 张失败票"""
+        p = self.model.fail_prob
+        team_mask = sum(1 << i for i in team)
+
+        def evil_factor(evil_mask):
+            k = _popcount(evil_mask & team_mask)
+            if fails > k:
+                return 0.0
+            return comb(k, fails) * p ** fails * (1 - p) ** (k - fails)
+
+        self._update(evil_factor)
+
+    def sync(self, history: list) -> 'RolePosterior':
+        """处理 history（AvalonGame.history）中上次之后新增的记录"""
+        index, done = self._cursor
+        while index < len(history):
+            leader, team, yes_mask, fails = history[index]
+            # 每处理完一部分就记下位置：某一部分与记录矛盾时，之前的部分不会重复计入
+            if done < 1:
+                self.observe_proposal(leader, team)
+                done = 1
+                self._cursor = (index, done)
+            if done < 2 and yes_mask is not None:
+                self.observe_team_vote(team, yes_mask)
+                done = 2
+                self._cursor = (index, done)
+            if done < 3 and fails is not None:
+                self.observe_quest(team, fails)
+                done = 3
+                self._cursor = (index, done)
+            if index + 1 == len(history):
+                break
+            index, done = index + 1, 0
+            self._cursor = (index, done)
+        return self
+
+    def _compute_marginals(self):
+        if self._marginals is None:
+            n = self.player_count
+            by_evil = {}
+            merlin = [0.0] * n
+            for (evil_mask, seat, _), weight in zip(self._worlds, self._weights):
+                by_evil[evil_mask] = by_evil.get(evil_mask, 0.0) + weight
+                merlin[seat] += weight
+            evil = [0.0] * n
+            for evil_mask, weight in by_evil.items():
+                for i in range(n):
+                    if evil_mask >> i & 1:
+                        evil[i] += weight
+            self._marginals = (evil, merlin)
+        return self._marginals
+
+    def evil_probabilities(self) -> List[float]:
+        """按座位顺序返回是邪恶方的概率"""
+        return list(self._compute_marginals()[0])
+
+    def merlin_probabilities(self) -> List[float]:
+        """按座位顺序返回是梅林的概率"""
+        return list(self._compute_marginals()[1])
+
+    def summary(self, digits: Optional[int] = 3) -> List[dict]:
+        """每个座位一项 {'player_id', 'evil', 'merlin'}（player_id 从1开始）"""
+        evil, merlin = self._compute_marginals()
+        rnd = (lambda x: round(x, digits)) if digits is not None else (lambda x: x)
+        return [{'player_id': i + 1, 'evil': rnd(e), 'merlin': rnd(m)}
+                for i, (e, m) in enumerate(zip(evil, merlin))]
+
+
+def format_table(posterior: RolePosterior) -> str:
+    lines = []
+    for row in posterior.summary():
+        lines.append(f"玩家{row['player_id']:<3} 邪恶方 {row['evil']:>6.1%}  梅林 {row['merlin']:>6.1%}")
+    lines.append(f"相容的世界: {posterior.world_count}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print(__doc__.strip().splitlines()[-1])
+        return 2
+    with open(argv[0], encoding='utf-8') as f:
+        state = json.load(f)
+    state = state.get('game', state)
+    game = AvalonGame.from_state(state)
+    print(format_table(RolePosterior.from_game(game)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import time
+
+
+class RateLimiter:
+    """按键（sid 或房间ID）的令牌桶：平均每秒 rate 个事件，最多连续 burst 个
+
+    每个键只保存 [剩余令牌, 上次更新时间]，检查时按经过的时间补充令牌，
+    不需要定时任务。rate 不大于 0 时不限制。
+    """
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._buckets = {}  # key -> [剩余令牌, 上次更新时间]
+
+    def allow(self, key, cost: float = 1.0) -> bool:
+        """消耗 cost 个令牌；令牌不足时返回 False（不消耗）"""
+        if self.rate <= 0:
+            return True
+        now = self._clock()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = [self.burst - cost, now]
+            return cost <= self.burst
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < cost:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - cost
+        return True
+
+    def forget(self, key):
+        """连接断开或房间关闭后不再跟踪"""
+        self._buckets.pop(key, None)
+
+    def __len__(self):
+        return len(self._buckets)
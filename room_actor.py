@@ -0,0 +1,129 @@
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class MailboxFull(Exception):
+    """房间邮箱已满，事件被拒绝"""
+
+    def __init__(self, room):
+        super().__init__(f"房间 {room} 的邮箱已满")
+        self.room = room
+
+
+class _Envelope:
+    """投递到房间邮箱中的一条消息"""
+    __slots__ = ('fn', 'args', 'kwargs', 'done', 'result', 'error')
+
+    def __init__(self, fn, args, kwargs, done):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.done = done
+        self.result = None
+        self.error = None
+
+
+class RoomActor:
+    """单个房间的 actor：一个后台任务按顺序处理邮箱中的事件"""
+
+    def __init__(self, room, server, mailbox_size: int):
+        self.room = room
+        self._server = server
+        self.mailbox = server.create_queue(maxsize=mailbox_size)
+        self.processed = 0
+        self._stopped = False
+        self._task = server.start_background_task(self._run)
+
+    def submit(self, fn, *args, **kwargs) -> _Envelope:
+        """投递事件，不等待执行结果；邮箱已满或 actor 已停止时抛出 MailboxFull"""
+        if self._stopped:
+            raise MailboxFull(self.room)
+        envelope = _Envelope(fn, args, kwargs, self._server.create_event())
+        try:
+            self.mailbox.put(envelope, block=False)
+        except queue.Full:
+            raise MailboxFull(self.room)
+        return envelope
+
+    def call(self, fn, *args, **kwargs):
+        """投递事件并等待其在 actor 中执行完毕，返回处理结果"""
+        if self._in_actor():
+            # actor 内部的嵌套调用直接执行，避免自己等待自己
+            return fn(*args, **kwargs)
+        envelope = self.submit(fn, *args, **kwargs)
+        envelope.done.wait()
+        if envelope.error is not None:
+            raise envelope.error
+        return envelope.result
+
+    def stop(self):
+        """停止 actor，可以在 actor 内部调用；尚未处理的事件以 MailboxFull 失败"""
+        self._stopped = True
+        try:
+            self.mailbox.put(None, block=False)
+        except queue.Full:
+            pass
+
+    def _in_actor(self) -> bool:
+        try:
+            from greenlet import getcurrent
+        except ImportError:  # pragma: no cover
+            getcurrent = None
+        if getcurrent is not None and getcurrent() is self._task:
+            return True
+        return threading.current_thread() is self._task
+
+    def _run(self):
+        while not self._stopped:
+            envelope = self.mailbox.get()
+            if envelope is None:
+                break
+            try:
+                envelope.result = envelope.fn(*envelope.args, **envelope.kwargs)
+            except Exception as e:
+                envelope.error = e
+            finally:
+                self.processed += 1
+                envelope.done.set()
+        # 房间已关闭，通知仍在等待的调用方
+        while not self.mailbox.empty():
+            envelope = self.mailbox.get()
+            if envelope is not None:
+                envelope.error = MailboxFull(self.room)
+                envelope.done.set()
+        logger.debug("Room actor stopped", extra={'room': self.room})
+
+
+class RoomScheduler:
+    """为每个房间维护一个 actor，同一房间的事件串行执行，不同房间互不阻塞"""
+
+    def __init__(self, server, mailbox_size: int = 64):
+        self._server = server
+        self.mailbox_size = mailbox_size
+        self.actors = {}
+
+    def actor(self, room) -> RoomActor:
+        room = str(room)
+        actor = self.actors.get(room)
+        if actor is None:
+            actor = RoomActor(room, self._server, self.mailbox_size)
+            self.actors[room] = actor
+        return actor
+
+    def submit(self, room, fn, *args, **kwargs) -> _Envelope:
+        return self.actor(room).submit(fn, *args, **kwargs)
+
+    def call(self, room, fn, *args, **kwargs):
+        return self.actor(room).call(fn, *args, **kwargs)
+
+    def close(self, room):
+        """停止并移除房间的 actor（房间关闭时调用）"""
+        actor = self.actors.pop(str(room), None)
+        if actor is not None:
+            actor.stop()
+
+    def __len__(self):
+        return len(self.actors)
@@ -0,0 +1,92 @@
+import heapq
+import time
+from collections import OrderedDict
+
+
+class RoomReaper:
+    """基于最小堆的房间回收器
+
+    每个房间在堆中只保留一个有效的截止时间。记录活动（touch）只更新时间戳，
+    不操作堆；清理时弹出到期的条目，如果房间在此期间有过活动，就按新的截止
+    时间重新入堆。因此清理的开销只与到期的房间数有关，与房间总数无关。
+    """
+
+    def __init__(self, idle_ttl: float, finished_ttl: float, max_rooms: int,
+                 clock=time.monotonic):
+        self.idle_ttl = idle_ttl
+        self.finished_ttl = finished_ttl
+        self.max_rooms = max_rooms
+        self._clock = clock
+        self._last_activity = OrderedDict()  # room -> 最近活动时间，按 LRU 顺序排列
+        self._finished = OrderedDict()  # 已结束或无人的房间，同样按 LRU 顺序排列
+        self._heap = []  # (截止时间, room)
+        self._scheduled = {}  # room -> 堆中有效条目的截止时间
+
+    def touch(self, room):
+        """记录房间活动"""
+        self._last_activity[room] = self._clock()
+        self._last_activity.move_to_end(room)
+        if room in self._finished:
+            self._finished.move_to_end(room)
+        if room not in self._scheduled:
+            self._schedule(room, self._deadline(room))
+
+    def mark_finished(self, room):
+        """游戏已结束或房间已无人，改用较短的 finished_ttl"""
+        if room not in self._last_activity:
+            return
+        self._finished[room] = None
+        deadline = self._deadline(room)
+        if deadline < self._scheduled[room]:
+            self._schedule(room, deadline)
+
+    def reopen(self, room):
+        """房间重新有人或开始新的游戏，恢复使用 idle_ttl（堆中较早的条目到期时按新的截止时间重新入堆）"""
+        self._finished.pop(room, None)
+
+    def forget(self, room):
+        """房间已被关闭，停止跟踪（堆中的旧条目在清理时跳过）"""
+        self._last_activity.pop(room, None)
+        self._scheduled.pop(room, None)
+        self._finished.pop(room, None)
+
+    def expired(self, now=None) -> list:
+        """弹出所有已到期的房间，返回 [(room, reason)]"""
+        if now is None:
+            now = self._clock()
+        result = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            deadline, room = heapq.heappop(heap)
+            if self._scheduled.get(room) != deadline:
+                continue  # 过期条目：房间已关闭或已重新调度
+            actual = self._deadline(room)
+            if actual > now:
+                self._schedule(room, actual)
+                continue
+            result.append((room, 'finished' if room in self._finished else 'idle'))
+            self.forget(room)
+        return result
+
+    def over_capacity(self) -> list:
+        """房间数超过上限时，按最近最少活动的顺序返回需要回收的已结束（或无人）的房间
+
+        进行中的游戏不会因为容量被回收；只剩进行中的房间时即使超过上限也不再回收。
+        """
+        result = []
+        while len(self._last_activity) > self.max_rooms and self._finished:
+            room = next(iter(self._finished))
+            result.append((room, 'capacity'))
+            self.forget(room)
+        return result
+
+    def _deadline(self, room) -> float:
+        ttl = self.finished_ttl if room in self._finished else self.idle_ttl
+        return self._last_activity[room] + ttl
+
+    def _schedule(self, room, deadline):
+        self._scheduled[room] = deadline
+        heapq.heappush(self._heap, (deadline, room))
+
+    def __len__(self):
+        return len(self._last_activity)
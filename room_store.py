@@ -0,0 +1,414 @@
+"""房间状态的共享存储
+
+每个房间保存为一条紧凑的记录（app.room_snapshot 的结果加上版本号，其中的游戏
+状态来自 AvalonGame.to_state），编码为一行 JSON，版本号另外单独保存，可以不读取
+记录只读取版本号。CachedStore 在任意后端之前缓存最近读写的记录：读取时先批量
+查询版本号（versions），版本号没有变化的房间直接使用缓存，其余房间再批量读取
+（load_many）；SQLite 中各是一条查询，Redis 中各是一次 MGET。
+
+多个进程处理同一个房间时用版本号做乐观并发控制：处理事件前读取最新的记录，处理后
+用 save_if 写入，只有存储中的版本号仍是读取时的版本号才写入（SQLite 中为
+UPDATE ... WHERE version = ?，Redis 中为 WATCH/MULTI/EXEC）。
+
+open_store() 按地址选择后端：
+  memory://                 进程内（测试、单进程）
+  sqlite:///path/rooms.db   SQLite（WAL 模式），同一台机器上的多个进程共享
+  redis://host:6379/0       任何实现 RESP 协议的服务
+"""
+import json
+import socket
+import sqlite3
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+
+class StoreError(Exception):
+    """存储后端返回错误或无法连接"""
+
+
+def encode(record: dict) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def decode(data: bytes) -> dict:
+    return json.loads(data)
+
+
+class RoomStore:
+    """房间存储接口；记录中的 'version' 字段（缺省为 0）是房间的版本号"""
+
+    def load(self, room):
+        """读取一个房间，不存在时返回 None"""
+        return self.load_many([room]).get(room)
+
+    def load_many(self, rooms) -> dict:
+        """一次读取多个房间，返回 {room: record}（不包含不存在的房间）"""
+        raise NotImplementedError
+
+    def versions(self, rooms) -> dict:
+        """一次读取多个房间的版本号，返回 {room: version}（不包含不存在的房间）"""
+        raise NotImplementedError
+
+    def save(self, room, record: dict):
+        """无条件写入一个房间"""
+        raise NotImplementedError
+
+    def save_if(self, room, record: dict, expected_version: int) -> bool:
+        """存储中房间的版本号等于 expected_version 时写入（不存在的房间视为版本 0），
+        否则不写入并返回 False"""
+        raise NotImplementedError
+
+    def create(self, room, record: dict) -> bool:
+        """仅在房间不存在时写入，用于在多个进程之间占用游戏ID"""
+        raise NotImplementedError
+
+    def delete(self, room):
+        raise NotImplementedError
+
+    def room_ids(self) -> list:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryStore(RoomStore):
+    """进程内存储；记录同样以编码后的形式保存，与其他后端语义一致"""
+
+    def __init__(self):
+        self._data = {}  # room -> (版本号, 编码后的记录)
+
+    def load_many(self, rooms) -> dict:
+        return {room: decode(self._data[room][1]) for room in rooms if room in self._data}
+
+    def versions(self, rooms) -> dict:
+        return {room: self._data[room][0] for room in rooms if room in self._data}
+
+    def save(self, room, record: dict):
+        self._data[room] = (record.get('version', 0), encode(record))
+
+    def save_if(self, room, record: dict, expected_version: int) -> bool:
+        current = self._data[room][0] if room in self._data else 0
+        if current != expected_version:
+            return False
+        self.save(room, record)
+        return True
+
+    def create(self, room, record: dict) -> bool:
+        if room in self._data:
+            return False
+        self.save(room, record)
+        return True
+
+    def delete(self, room):
+        self._data.pop(room, None)
+
+    def room_ids(self) -> list:
+        return list(self._data)
+
+
+class SQLiteStore(RoomStore):
+    """SQLite 存储：WAL 模式允许其他进程读取时写入，synchronous=NORMAL 减少 fsync"""
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS rooms ('
+                         ' id TEXT PRIMARY KEY, data BLOB NOT NULL, version INTEGER NOT NULL DEFAULT 0)')
+        columns = [name for _, name, *_ in self._db.execute('PRAGMA table_info(rooms)')]
+        if 'version' not in columns:
+            # 早期的表没有版本号列
+            self._db.execute('ALTER TABLE rooms ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+    def _select(self, columns, rooms):
+        rooms = list(rooms)
+        if not rooms:
+            return []
+        placeholders = ','.join('?' * len(rooms))
+        return self._db.execute(f'SELECT id, {columns} FROM rooms WHERE id IN ({placeholders})', rooms)
+
+    def load_many(self, rooms) -> dict:
+        return {room: decode(data) for room, data in self._select('data', rooms)}
+
+    def versions(self, rooms) -> dict:
+        return dict(self._select('version', rooms))
+
+    def save(self, room, record: dict):
+        self._db.execute('INSERT INTO rooms (id, data, version) VALUES (?, ?, ?) '
+                         'ON CONFLICT(id) DO UPDATE SET data = excluded.data, version = excluded.version',
+                         (room, encode(record), record.get('version', 0)))
+
+    def save_if(self, room, record: dict, expected_version: int) -> bool:
+        data, version = encode(record), record.get('version', 0)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = db.execute('UPDATE rooms SET data = ?, version = ? WHERE id = ? AND version = ?',
+                                (data, version, room, expected_version))
+            if cursor.rowcount == 0 and expected_version == 0:
+                cursor = db.execute('INSERT OR IGNORE INTO rooms (id, data, version) VALUES (?, ?, ?)',
+                                    (room, data, version))
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return cursor.rowcount == 1
+
+    def create(self, room, record: dict) -> bool:
+        cursor = self._db.execute('INSERT OR IGNORE INTO rooms (id, data, version) VALUES (?, ?, ?)',
+                                  (room, encode(record), record.get('version', 0)))
+        return cursor.rowcount == 1
+
+    def delete(self, room):
+        self._db.execute('DELETE FROM rooms WHERE id = ?', (room,))
+
+    def room_ids(self) -> list:
+        return [room for room, in self._db.execute('SELECT id FROM rooms')]
+
+    def close(self):
+        self._db.close()
+
+
+class RespConnection:
+    """最小的 RESP 客户端：execute() 把多条命令一起发送，再依次读取回复（流水线）
+
+    一个连接可以由多个线程或 greenlet 共用：每次往返持有 lock，需要连续多次往返的
+    操作（WATCH ... EXEC）由调用方在整个过程中持有 lock（可重入）。
+    """
+
+    def __init__(self, host: str, port: int, db: int = 0, timeout: float = 2.0):
+        self.host, self.port, self.db, self.timeout = host, port, db, timeout
+        self._sock = None
+        self._buffer = b''
+        self.lock = threading.RLock()
+        self.round_trips = 0
+
+    def _connect(self):
+        try:
+            self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise StoreError(f"无法连接 {self.host}:{self.port}: {e}") from e
+        self._buffer = b''
+        if self.db:
+            self._roundtrip([('SELECT', self.db)])
+
+    def execute(self, *commands) -> list:
+        """发送命令并返回回复列表；错误回复作为 StoreError 抛出"""
+        with self.lock:
+            if self._sock is None:
+                self._connect()
+            try:
+                replies = self._roundtrip(commands)
+            except OSError as e:
+                self.close()
+                raise StoreError(f"连接 {self.host}:{self.port} 失败: {e}") from e
+        for reply in replies:
+            if isinstance(reply, StoreError):
+                raise reply
+        return replies
+
+    def _roundtrip(self, commands):
+        out = []
+        for command in commands:
+            out.append(b'*%d\r\n' % len(command))
+            for arg in command:
+                if not isinstance(arg, bytes):
+                    arg = str(arg).encode('utf-8')
+                out.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        self._sock.sendall(b''.join(out))
+        self.round_trips += 1
+        return [self._read_reply() for _ in commands]
+
+    def _read_line(self) -> bytes:
+        while b'\r\n' not in self._buffer:
+            chunk = self._sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("连接已关闭")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b'\r\n', 1)
+        return line
+
+    def _read_exact(self, size: int) -> bytes:
+        while len(self._buffer) < size + 2:
+            chunk = self._sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("连接已关闭")
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size + 2:]
+        return data
+
+    def _read_reply(self):
+        line = self._read_line()
+        kind, rest = line[:1], line[1:]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            return StoreError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            size = int(rest)
+            return None if size < 0 else self._read_exact(size)
+        if kind == b'*':
+            count = int(rest)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise StoreError(f"无法解析的回复: {line!r}")
+
+    def close(self):
+        with self.lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+
+class RedisStore(RoomStore):
+    """Redis（RESP 协议）存储：每个房间一个记录键和一个版本号键，另有一个集合记录所有房间"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6379, db: int = 0, prefix: str = 'awalong:'):
+        self.conn = RespConnection(host, port, db)
+        self.prefix = prefix
+        self.index = f"{prefix}rooms"
+
+    def _key(self, room):
+        return f"{self.prefix}room:{room}"
+
+    def _version_key(self, room):
+        return f"{self.prefix}version:{room}"
+
+    def load_many(self, rooms) -> dict:
+        rooms = list(rooms)
+        if not rooms:
+            return {}
+        values, = self.conn.execute(('MGET', *[self._key(room) for room in rooms]))
+        return {room: decode(value) for room, value in zip(rooms, values) if value is not None}
+
+    def versions(self, rooms) -> dict:
+        rooms = list(rooms)
+        if not rooms:
+            return {}
+        values, = self.conn.execute(('MGET', *[self._version_key(room) for room in rooms]))
+        return {room: int(value) for room, value in zip(rooms, values) if value is not None}
+
+    def _write(self, room, record, *flags):
+        """MULTI 中写入记录和版本号的命令"""
+        return (('SET', self._key(room), encode(record), *flags),
+                ('SET', self._version_key(room), record.get('version', 0), *flags),
+                ('SADD', self.index, room))
+
+    def save(self, room, record: dict):
+        self.conn.execute(('MULTI',), *self._write(room, record), ('EXEC',))
+
+    def save_if(self, room, record: dict, expected_version: int) -> bool:
+        version_key = self._version_key(room)
+        with self.conn.lock:
+            _, current = self.conn.execute(('WATCH', version_key), ('GET', version_key))
+            if int(current or 0) != expected_version:
+                self.conn.execute(('UNWATCH',))
+                return False
+            # 其他客户端在 WATCH 之后修改了版本号时 EXEC 返回空回复，事务不执行
+            *_, committed = self.conn.execute(('MULTI',), *self._write(room, record), ('EXEC',))
+        return committed is not None
+
+    def create(self, room, record: dict) -> bool:
+        *_, (created, _, _) = self.conn.execute(('MULTI',), *self._write(room, record, 'NX'), ('EXEC',))
+        return created == 'OK'
+
+    def delete(self, room):
+        self.conn.execute(('DEL', self._key(room), self._version_key(room)), ('SREM', self.index, room))
+
+    def room_ids(self) -> list:
+        members, = self.conn.execute(('SMEMBERS', self.index))
+        return [member.decode('utf-8') for member in members]
+
+    def close(self):
+        self.conn.close()
+
+
+class CachedStore(RoomStore):
+    """缓存最近读写的记录；每次读取都先向后端查询版本号，只有版本号变化的房间才重新
+    读取整条记录，因此总能读到其他进程写入的最新记录，同时省去传输和解码未变化的记录
+
+    缓存的记录是共享的字典，调用方不能修改。
+    """
+
+    def __init__(self, backend: RoomStore, max_entries: int = 10000):
+        self.backend = backend
+        self.max_entries = max_entries
+        self._cache = OrderedDict()  # room -> record
+        self.hits = 0
+        self.misses = 0
+
+    def load_many(self, rooms) -> dict:
+        rooms = list(rooms)
+        versions = self.backend.versions(rooms)
+        result = {}
+        missing = []
+        for room in rooms:
+            if room not in versions:
+                self._cache.pop(room, None)
+                continue
+            record = self._cache.get(room)
+            if record is not None and record.get('version', 0) == versions[room]:
+                result[room] = record
+                self._cache.move_to_end(room)
+                self.hits += 1
+            else:
+                missing.append(room)
+        if missing:
+            self.misses += len(missing)
+            fetched = self.backend.load_many(missing)
+            for room, record in fetched.items():
+                self._put(room, record)
+            result.update(fetched)
+        return result
+
+    def versions(self, rooms) -> dict:
+        return self.backend.versions(rooms)
+
+    def save(self, room, record: dict):
+        self.backend.save(room, record)
+        self._put(room, record)
+
+    def save_if(self, room, record: dict, expected_version: int) -> bool:
+        if not self.backend.save_if(room, record, expected_version):
+            self._cache.pop(room, None)
+            return False
+        self._put(room, record)
+        return True
+
+    def create(self, room, record: dict) -> bool:
+        if not self.backend.create(room, record):
+            return False
+        self._put(room, record)
+        return True
+
+    def delete(self, room):
+        self.backend.delete(room)
+        self._cache.pop(room, None)
+
+    def room_ids(self) -> list:
+        return self.backend.room_ids()
+
+    def _put(self, room, record):
+        self._cache[room] = record
+        self._cache.move_to_end(room)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def close(self):
+        self.backend.close()
+
+
+def open_store(url: str) -> RoomStore:
+    """按地址创建存储后端"""
+    parts = urlsplit(url)
+    if parts.scheme == 'memory':
+        return MemoryStore()
+    if parts.scheme == 'sqlite':
+        return SQLiteStore(parts.path if parts.netloc == '' else parts.netloc + parts.path)
+    if parts.scheme == 'redis':
+        db = int(parts.path.strip('/') or 0)
+        return RedisStore(parts.hostname or '127.0.0.1', parts.port or 6379, db)
+    raise ValueError(f"不支持的存储地址: {url}")
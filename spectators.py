@@ -0,0 +1,117 @@
+"""观战频道：收集房间的公开广播，定期合并成一帧发给房间的所有观众
+
+玩家的广播照常立即发送；同一时刻发布到观战频道只是追加到房间的待发列表
+（没有观众的房间直接忽略）。后台任务每隔一段时间把有新内容的房间各合并成一帧，
+一帧只编码一次就发给该房间的全部观众，所以观众数量不影响玩家收到结果的时间。
+
+待发内容超过上限时丢弃，改为发送完整快照；发送端积压过多的观众跳过当前帧并
+标记为过期，恢复后单独补发一次快照。
+"""
+from collections import defaultdict
+
+# 会转发给观众的房间广播
+SPECTATOR_EVENTS = frozenset({
+    'player_joined', 'player_left', 'game_started', 'game_state', 'team_proposed',
+    'team_vote_result', 'quest_vote_result', 'assassination_result'
+})
+# 广播数据中不能给观众看到的字段
+PRIVATE_FIELDS = frozenset({
+    'camps', 'camp', 'role', 'roles', 'role_info', 'evil_players', 'evil_roles',
+    'merlin_morgana', 'merlin_morgana_roles', 'resume_token'
+})
+
+
+def sanitize(data):
+    """去掉私有字段；没有私有字段时原样返回（不复制）"""
+    if isinstance(data, dict) and not PRIVATE_FIELDS.isdisjoint(data):
+        return {k: v for k, v in data.items() if k not in PRIVATE_FIELDS}
+    return data
+
+
+class SpectatorHub:
+    """所有房间的观众和待发的公开事件"""
+
+    def __init__(self, max_pending: int = 64, max_watchers: int = 1000):
+        self.max_pending = max_pending
+        self.max_watchers = max_watchers
+        self._watchers = defaultdict(set)  # room -> {sid}
+        self._rooms = {}  # sid -> room
+        self._pending = {}  # room -> [[事件名, 数据]]，None 表示需要发送快照
+        self._stale = defaultdict(set)  # room -> 跳过了帧、需要补发快照的 sid
+        self._seq = defaultdict(int)
+
+    def watch(self, room, sid) -> bool:
+        """sid 开始观看 room（之前观看的房间自动退出）；观众已满时返回 False"""
+        if self._rooms.get(sid) == room:
+            return True
+        if len(self._watchers.get(room, ())) >= self.max_watchers:
+            return False
+        self.unwatch(sid)
+        self._watchers[room].add(sid)
+        self._rooms[sid] = room
+        return True
+
+    def unwatch(self, sid):
+        """sid 停止观看，返回它原来观看的房间"""
+        room = self._rooms.pop(sid, None)
+        if room is not None:
+            watchers = self._watchers.get(room)
+            watchers.discard(sid)
+            self._stale[room].discard(sid)
+            if not watchers:
+                self._drop(room)
+        return room
+
+    def room_of(self, sid):
+        return self._rooms.get(sid)
+
+    def watchers(self, room) -> set:
+        return self._watchers.get(room, set())
+
+    def close(self, room) -> set:
+        """关闭房间的频道，返回其中的观众"""
+        watchers = self._watchers.get(room, set())
+        for sid in watchers:
+            del self._rooms[sid]
+        self._drop(room)
+        return watchers
+
+    def _drop(self, room):
+        self._watchers.pop(room, None)
+        self._pending.pop(room, None)
+        self._stale.pop(room, None)
+        self._seq.pop(room, None)
+
+    def publish(self, room, event, data):
+        """房间广播了一条消息：有观众时加入待发列表"""
+        if room not in self._watchers or event not in SPECTATOR_EVENTS:
+            return
+        pending = self._pending.get(room, [])
+        if pending is None:
+            return  # 已经决定发送快照
+        if len(pending) >= self.max_pending:
+            self._pending[room] = None
+            return
+        pending.append([event, sanitize(data)])
+        self._pending[room] = pending
+
+    def take(self) -> list:
+        """取出所有有新内容的房间 [(room, seq, events)]，events 为 None 时应发送快照"""
+        ready = []
+        for room, events in self._pending.items():
+            self._seq[room] += 1
+            ready.append((room, self._seq[room], events))
+        self._pending = {}
+        return ready
+
+    def mark_stale(self, room, sid):
+        self._stale[room].add(sid)
+
+    def is_stale(self, room, sid) -> bool:
+        return sid in self._stale.get(room, ())
+
+    def clear_stale(self, room, sid):
+        self._stale[room].discard(sid)
+
+    def __len__(self):
+        return len(self._rooms)
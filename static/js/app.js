@@ -0,0 +1,1004 @@
+// 声明支持合并帧：服务器会把同一条消息产生的多个广播合并为一个 'batch' 事件。
+// 只使用 websocket：多进程部署时调度器按连接转发，长轮询的多个请求可能落在不同进程
+var socket = io({ auth: { batch: true }, transports: ['websocket'] });
+var playerName = '';
+var playerRole = '';
+var playerCamp = '';
+var myPlayerId = '';
+var gameId = '';
+var currentRoom = '';
+var isHost = true; // 添加房主标志
+
+// 清除之前的事件监听器
+socket.off('connect');
+socket.off('role_info');
+socket.off('join_room');
+
+// 断线重连：加入房间时保存恢复凭证（只在当前标签页中保存），重新连接后用它回到原来的座位
+var SESSION_KEY = 'awalong.session';
+
+function saveSession(gameId, token) {
+    sessionStorage.setItem(SESSION_KEY, JSON.stringify({ game_id: gameId, token: token }));
+}
+
+function loadSession() {
+    try {
+        return JSON.parse(sessionStorage.getItem(SESSION_KEY));
+    } catch (e) {
+        return null;
+    }
+}
+
+function clearSession() {
+    sessionStorage.removeItem(SESSION_KEY);
+}
+
+// 幂等操作：每个操作带上递增的序号和看到的提名轮次，收到 action_ack 前保留，
+// 重新连接并回到座位后原样重发（服务器对重复的序号只返回当时的回执）
+var SEQ_KEY = 'awalong.seq';
+var currentRound = 0;
+var pendingActions = {};
+
+function sendAction(name, data) {
+    const seq = parseInt(sessionStorage.getItem(SEQ_KEY) || '0') + 1;
+    sessionStorage.setItem(SEQ_KEY, String(seq));
+    data.seq = seq;
+    data.round = currentRound;
+    pendingActions[seq] = [name, data];
+    socket.emit(name, data);
+}
+
+socket.on('action_ack', function(ack) {
+    delete pendingActions[ack.seq];
+    if (!ack.ok && ack.message) {
+        console.log(`操作 ${ack.event} 未执行: ${ack.message}`);
+    }
+});
+
+// 把一条消息交给本地已注册的处理函数，与服务器发来的消息相同
+function dispatchLocal(name, data) {
+    socket.listeners(name).forEach(function(handler) {
+        handler(data);
+    });
+}
+
+// 房间在另一个工作进程中：带上游戏ID重新连接，由调度器转发到房间所在的进程后重新加入
+// （恢复会话时 connect 处理函数会自动发送 resume_session）
+socket.on('switch_worker', function(data) {
+    socket.io.opts.query = { game_id: data.game_id };
+    const saved = loadSession();
+    if (!saved || saved.game_id !== data.game_id) {
+        socket.once('connect', function() {
+            socket.emit('join_game', { game_id: data.game_id });
+        });
+    }
+    socket.disconnect().connect();
+});
+
+socket.on('session_resumed', function(data) {
+    console.log('Session resumed:', data);
+    gameId = data.game_id;
+    window.gameId = data.game_id;
+    myPlayerId = data.player_id;
+    gameState = null;
+    currentRound = data.round || 0;
+
+    document.getElementById('setup-screen').classList.add('hidden');
+    document.getElementById('role-screen').classList.remove('hidden');
+    document.getElementById('game-id').textContent = gameId;
+    document.getElementById('your-player-number').textContent = data.player_id;
+    document.getElementById('game-player-number').textContent = data.player_id;
+    document.getElementById('player-count-display').textContent = data.player_count;
+    updateConnectedPlayers(data.connected_players);
+
+    if (data.role_info) {
+        dispatchLocal('role_info', data.role_info);
+    }
+    if (data.state) {
+        dispatchLocal('game_state', data.state);
+    }
+    if (data.team) {
+        dispatchLocal('team_proposed', { team: data.team, player_count: data.player_count });
+        // 已经投过票时不再显示表决按钮
+        if (data.team_vote !== null) {
+            document.getElementById('team-vote').classList.add('hidden');
+        }
+    }
+    if (data.quest_team && data.quest_team.includes(data.player_id) && data.quest_vote === null) {
+        document.getElementById('quest-vote').classList.remove('hidden');
+    }
+    Object.keys(pendingActions).forEach(function(seq) {
+        socket.emit(pendingActions[seq][0], pendingActions[seq][1]);
+    });
+});
+
+// 房间已被回收，恢复凭证随之失效
+socket.on('room_closed', function(data) {
+    const saved = loadSession();
+    if (saved && saved.game_id === data.game_id) {
+        clearSession();
+    }
+});
+
+// 阶段超时：服务器已代替未行动的玩家执行默认操作，随后的结果事件照常处理
+socket.on('phase_timeout', function(data) {
+    console.log('Phase timed out:', data.phase, 'players:', data.players);
+});
+
+// 服务器更新：旧进程已交接房间，连接断开后自动重连到新进程，并用恢复凭证回到座位，
+// 未确认的操作随后重发
+socket.on('server_restarting', function(data) {
+    console.log('Server restarting:', data.message);
+    showErrorMessage(data.message);
+});
+
+socket.on('resume_failed', function(data) {
+    console.log('Cannot resume session:', data.message);
+    clearSession();
+});
+
+// 合并帧按顺序分发给各事件已注册的处理函数
+socket.on('batch', function(frames) {
+    frames.forEach(function(frame) {
+        dispatchLocal(frame[0], frame[1]);
+    });
+});
+
+// 加入房间时显示游戏ID
+socket.on('join_room', function(room) {
+    console.log('Joined game:', room);
+    gameId = room;
+
+    // 显示游戏ID和等待消息
+    const gameInfoDiv = document.querySelector('.game-info');
+    const gameIdSpan = document.getElementById('game-id');
+
+    if (gameIdSpan && gameInfoDiv) {
+        gameIdSpan.textContent = gameId;
+        gameInfoDiv.style.display = 'block';
+        addFadeInAnimation(gameInfoDiv);
+    }
+});
+
+// 当游戏开始时，切换到游戏界面
+socket.on('game_started', function(data) {
+    console.log('Game started event received:', data);
+    currentRound = 0;
+
+    // 隐藏等待消息
+    const waitingMessage = document.getElementById('waiting-message');
+    if (waitingMessage) {
+        waitingMessage.style.display = 'none';
+    }
+
+    // 隐藏角色等待界面，显示游戏主界面
+    document.getElementById('role-screen').classList.add('hidden');
+    document.getElementById('game-screen').classList.remove('hidden');
+
+    // 显示队长信息
+    const leaderInfo = document.createElement('div');
+    leaderInfo.className = 'alert-message';
+    leaderInfo.innerHTML = `<i class="fas fa-crown"></i> 游戏已开始！玩家${data.leader}是第一位队长`;
+    leaderInfo.style.position = 'fixed';
+    leaderInfo.style.top = '20px';
+    leaderInfo.style.left = '50%';
+    leaderInfo.style.transform = 'translateX(-50%)';
+    leaderInfo.style.backgroundColor = 'rgba(52, 152, 219, 0.9)';
+    leaderInfo.style.color = 'white';
+    leaderInfo.style.padding = '15px 25px';
+    leaderInfo.style.borderRadius = '5px';
+    leaderInfo.style.boxShadow = '0 4px 8px rgba(0,0,0,0.2)';
+    leaderInfo.style.zIndex = '9999';
+    leaderInfo.style.maxWidth = '80%';
+    leaderInfo.style.textAlign = 'center';
+    leaderInfo.style.fontWeight = 'bold';
+    document.body.appendChild(leaderInfo);
+
+    // 3秒后自动关闭
+    setTimeout(() => {
+        leaderInfo.style.animation = 'fadeOut 0.3s forwards';
+        setTimeout(() => {
+            if (leaderInfo.parentNode) {
+                leaderInfo.parentNode.removeChild(leaderInfo);
+            }
+        }, 300);
+    }, 5000);
+
+    // 如果当前玩家是队长，显示队员选择界面
+    if (myPlayerId == data.leader) {
+        document.getElementById('team-selection').classList.remove('hidden');
+
+        // 生成队员选择按钮
+        const teamSelectionButtons = document.getElementById('team-selection-buttons');
+        teamSelectionButtons.innerHTML = '';
+        for (let i = 1; i <= data.player_count; i++) {
+            const label = document.createElement('label');
+            const checkbox = document.createElement('input');
+            checkbox.type = 'checkbox';
+            checkbox.value = i;
+
+            label.appendChild(checkbox);
+            label.appendChild(document.createTextNode(`玩家${i}`));
+            teamSelectionButtons.appendChild(label);
+        }
+    }
+});
+
+// 添加淡入动画的辅助函数
+function addFadeInAnimation(element) {
+    element.classList.add('fade-in');
+    // 动画结束后移除类
+    setTimeout(() => {
+        element.classList.remove('fade-in');
+    }, 500);
+}
+
+// 在连接时保存玩家ID
+socket.on('connect', function() {
+    console.log('Connected to server');
+    // 不再在这里设置myPlayerId，等待服务器分配
+    console.log('Socket connected with ID:', socket.id);
+
+    // 之前已经加入过房间（刷新页面或网络中断后重连）：回到原来的座位
+    const saved = loadSession();
+    if (saved) {
+        socket.emit('resume_session', saved);
+    }
+
+    // 初始化开始游戏按钮
+    setTimeout(updateStartGameButton, 500);
+});
+
+// 监听错误事件
+socket.on('error', function(data) {
+    console.error('Received error:', data);
+
+    // 清除任何超时处理器
+    if (window.joinTimeoutId) {
+        console.log('Clearing join timeout on error');
+        clearTimeout(window.joinTimeoutId);
+        window.joinTimeoutId = null;
+    }
+
+    // 重置按钮状态
+    const joinButton = document.getElementById('join-button');
+    if (joinButton.disabled) {
+        joinButton.disabled = false;
+        joinButton.textContent = '加入游戏';
+    }
+
+    // 显示错误消息
+    showErrorMessage(data.message || '发生未知错误');
+
+    // 对于特定错误，清空游戏ID输入
+    const gameIdErrors = ['游戏ID不存在', '游戏已经开始', '游戏房间已满'];
+    if (data.message && gameIdErrors.includes(data.message)) {
+        document.getElementById('game-id-input').value = '';
+    }
+});
+
+socket.on('game_created', (data) => {
+    console.log('Game created:', data);
+    gameId = data.game_id;
+    gameState = null;  // 新房间的状态版本号从1开始
+    saveSession(data.game_id, data.resume_token);
+
+    // 设置玩家编号
+    myPlayerId = data.player_id;
+    console.log(`设置玩家编号: ${myPlayerId}`);
+
+    // 确保游戏主界面中的编号也被更新
+    const gamePlayerNumber = document.getElementById('game-player-number');
+    if (gamePlayerNumber) {
+        gamePlayerNumber.textContent = myPlayerId;
+    }
+
+    // 标记当前用户为房主
+    isHost = true;
+    console.log('You are the host of this game.');
+
+    document.getElementById('setup-screen').classList.add('hidden');
+    document.getElementById('role-screen').classList.remove('hidden');
+
+    // 更新游戏ID和复制按钮
+    const gameIdDisplay = document.getElementById('game-id');
+    gameIdDisplay.textContent = gameId;
+
+    // 显示游戏ID区域
+    const gameInfoDiv = document.querySelector('.game-info');
+    if (gameInfoDiv) {
+        addFadeInAnimation(gameInfoDiv);
+    }
+
+    // 显示玩家信息
+    document.getElementById('your-player-number').textContent = data.player_id;
+
+    // 初始玩家计数
+    document.getElementById('player-count-display').textContent = data.player_count || 1;
+    updateConnectedPlayers(data.connected_players || [data.player_id]);
+
+    // 更新开始游戏按钮状态
+    setTimeout(updateStartGameButton, 500);
+});
+
+// 监听加入游戏成功事件
+socket.on('joined_game', (data) => {
+    console.log('Successfully joined game:', data);
+
+    // 清除超时处理
+    if (window.joinTimeoutId) {
+        console.log('Clearing join timeout on success');
+        clearTimeout(window.joinTimeoutId);
+        window.joinTimeoutId = null;
+    }
+
+    // 保存游戏信息
+    gameId = data.game_id;
+    myPlayerId = data.player_id;
+    gameState = null;  // 新房间的状态版本号从1开始
+    saveSession(data.game_id, data.resume_token);
+    console.log(`设置玩家编号: ${myPlayerId}`);
+
+    // 确保游戏主界面中的编号也被更新
+    const gamePlayerNumber = document.getElementById('game-player-number');
+    if (gamePlayerNumber) {
+        gamePlayerNumber.textContent = myPlayerId;
+    }
+
+    // 设置为非房主
+    isHost = false;
+    console.log('You joined a game as a regular player.');
+
+    // 重置按钮状态
+    const joinButton = document.getElementById('join-button');
+    joinButton.disabled = false;
+    joinButton.textContent = '加入游戏';
+
+    // 切换到角色界面
+    document.getElementById('setup-screen').classList.add('hidden');
+    document.getElementById('role-screen').classList.remove('hidden');
+
+    // 显示玩家信息
+    document.getElementById('your-player-number').textContent = data.player_id;
+
+    // 更新游戏ID显示
+    const gameIdDisplay = document.getElementById('game-id');
+    gameIdDisplay.textContent = gameId;
+
+    // 显示游戏ID区域
+    const gameInfoDiv = document.querySelector('.game-info');
+    if (gameInfoDiv) {
+        addFadeInAnimation(gameInfoDiv);
+    }
+
+    // 更新房间人数显示 - 确保即使在加入游戏成功后也能正确显示
+    document.getElementById('player-count-display').textContent = data.player_count;
+    console.log(`Setting player count display to: ${data.player_count}`);
+
+    // 更新已连接玩家显示
+    updateConnectedPlayers(data.connected_players);
+
+    // 更新开始游戏按钮状态
+    updateStartGameButton();
+});
+
+// 更新角色信息的处理
+socket.on('role_info', (data) => {
+    console.log('Role info received:', data);
+    document.getElementById('role-info').classList.remove('hidden');
+
+    // 显示角色信息
+    playerRole = data.role;
+    playerCamp = data.camp;
+
+    // 更新角色信息显示
+    const roleName = document.getElementById('role-name');
+    roleName.innerHTML = `<span class="role-name role-${data.camp === '正义方' ? 'good' : 'evil'}">
+        <i class="fas fa-${data.camp === '正义方' ? 'shield-alt' : 'skull'}"></i> 
+        角色: ${data.role} (${data.camp})
+    </span>`;
+
+    // 显示特殊信息（例如梅林可以看到的邪恶方）
+    const roleSpecialInfo = document.getElementById('role-special-info');
+    if (data.evil_players) {
+        let specialInfo = '你可以看到的邪恶方玩家：<ul>';
+        for (let i = 0; i < data.evil_players.length; i++) {
+            const evilPlayer = data.evil_players[i];
+            const evilRole = data.evil_roles ? data.evil_roles[i] : '未知';
+            specialInfo += `<li>玩家${evilPlayer} - ${evilRole}</li>`;
+        }
+        specialInfo += '</ul>';
+        roleSpecialInfo.innerHTML = specialInfo;
+
+        // 也更新页面上的邪恶方信息显示
+        const evilInfoTitle = document.getElementById('evil-info-title');
+        const evilPlayersList = document.getElementById('evil-players-list');
+        const evilPlayersInfo = document.querySelector('.evil-players-info');
+
+        if (evilInfoTitle && evilPlayersList && evilPlayersInfo) {
+            evilInfoTitle.textContent = data.role === '梅林' ? 
+                '梅林看到的邪恶方玩家' : '你的邪恶同伴';
+
+            evilPlayersList.innerHTML = '';
+            for (let i = 0; i < data.evil_players.length; i++) {
+                if (data.evil_players[i] !== myPlayerId) {  // 不显示自己
+                    const li = document.createElement('li');
+                    li.innerHTML = `玩家${data.evil_players[i]} - ${data.evil_roles ? data.evil_roles[i] : '未知'}`;
+                    evilPlayersList.appendChild(li);
+                }
+            }
+
+            // 使用classList切换hidden类
+            evilPlayersInfo.classList.remove('hidden');
+            addFadeInAnimation(evilPlayersInfo);
+        }
+    } else if (data.merlin_morgana) {
+        // 派西维尔特殊信息
+        let specialInfo = '你看到的梅林和莫甘娜（无法区分）：<ul>';
+        for (let i = 0; i < data.merlin_morgana.length; i++) {
+            const player = data.merlin_morgana[i];
+            specialInfo += `<li>玩家${player} - 梅林或莫甘娜</li>`;
+        }
+        specialInfo += '</ul>';
+        roleSpecialInfo.innerHTML = specialInfo;
+
+        // 也更新页面上的特殊信息显示
+        const evilInfoTitle = document.getElementById('evil-info-title');
+        const evilPlayersList = document.getElementById('evil-players-list');
+        const evilPlayersInfo = document.querySelector('.evil-players-info');
+
+        if (evilInfoTitle && evilPlayersList && evilPlayersInfo) {
+            evilInfoTitle.textContent = '派西维尔看到的梅林和莫甘娜';
+
+            evilPlayersList.innerHTML = '';
+            for (let i = 0; i < data.merlin_morgana.length; i++) {
+                const li = document.createElement('li');
+                li.innerHTML = `玩家${data.merlin_morgana[i]} - 梅林或莫甘娜`;
+                evilPlayersList.appendChild(li);
+            }
+
+            // 使用classList切换hidden类
+            evilPlayersInfo.classList.remove('hidden');
+            addFadeInAnimation(evilPlayersInfo);
+        }
+    } else {
+        roleSpecialInfo.textContent = '没有特殊信息。';
+    }
+
+    // 设置玩家编号（如果服务器提供）
+    if (data.player_number) {
+        myPlayerId = data.player_number;
+        console.log(`从角色信息中设置玩家编号: ${myPlayerId}`);
+
+        // 确保游戏主界面中的编号也被更新
+        const gamePlayerNumber = document.getElementById('game-player-number');
+        if (gamePlayerNumber) {
+            gamePlayerNumber.textContent = myPlayerId;
+        }
+    }
+});
+
+// 本地缓存的完整游戏状态，服务器只发送变化的字段；进入新房间时清空
+var gameState = null;
+
+socket.on('game_state', (data) => {
+    console.log('Game state:', data);
+
+    if (data.delta) {
+        // 版本号不连续说明漏掉了更新，请求完整快照
+        if (!gameState || data.version !== gameState.version + 1) {
+            socket.emit('request_game_state', { game_id: window.gameId || gameId });
+            return;
+        }
+        data = Object.assign({}, gameState, data);
+    } else if (gameState && data.version < gameState.version) {
+        return;  // 过期的快照
+    }
+    gameState = data;
+
+    // 当收到游戏状态时，确保切换到游戏界面
+    document.getElementById('role-screen').classList.add('hidden');
+    document.getElementById('game-screen').classList.remove('hidden');
+
+    document.getElementById('game-player-number').textContent = myPlayerId;
+    document.getElementById('game-player-role').textContent = playerRole;
+    document.getElementById('current-quest').textContent = data.current_quest;
+    document.getElementById('required-players').textContent = data.required_players;
+    document.getElementById('current-leader').textContent = data.leader;
+
+    // 更新任务结果显示
+    const questResultsContainer = document.getElementById('quest-results');
+    questResultsContainer.innerHTML = '';
+    data.quest_results.forEach(result => {
+        const span = document.createElement('span');
+        span.className = `quest-result ${result === '成功' ? 'success' : 'fail'}`;
+        span.title = result;
+        questResultsContainer.appendChild(span);
+        // 添加淡入动画
+        addFadeInAnimation(span);
+    });
+
+    // 更新投票追踪显示
+    const voteTrackContainer = document.getElementById('vote-track');
+    voteTrackContainer.innerHTML = '';
+    for (let i = 0; i < 5; i++) {
+        const span = document.createElement('span');
+        span.className = `vote-track ${i < data.vote_track ? 'active' : ''}`;
+        voteTrackContainer.appendChild(span);
+        // 为新激活的投票追踪添加动画
+        if (i < data.vote_track) {
+            addFadeInAnimation(span);
+        }
+    }
+
+    // 隐藏选择队员的UI，除非当前玩家是队长
+    const isLeader = myPlayerId == data.leader;
+    document.getElementById('team-selection').className = isLeader ? '' : 'hidden';
+
+    // 生成队员选择按钮
+    if (isLeader) {
+        const teamSelectionButtons = document.getElementById('team-selection-buttons');
+        teamSelectionButtons.innerHTML = '';
+        for (let i = 1; i <= data.player_count; i++) {
+            const label = document.createElement('label');
+            const checkbox = document.createElement('input');
+            checkbox.type = 'checkbox';
+            checkbox.value = i;
+
+            label.appendChild(checkbox);
+            label.appendChild(document.createTextNode(`玩家${i}`));
+            teamSelectionButtons.appendChild(label);
+        }
+        addFadeInAnimation(document.getElementById('team-selection'));
+    }
+});
+
+socket.on('team_proposed', (data) => {
+    if (data.round !== undefined) {
+        currentRound = data.round;
+    }
+    document.getElementById('team-selection').classList.add('hidden');
+    document.getElementById('team-vote').classList.remove('hidden');
+    // 清除之前的队员信息
+    const oldTeamInfo = document.querySelector('#team-vote p');
+    if (oldTeamInfo) {
+        oldTeamInfo.remove();
+    }
+    // 显示被提名的队员
+    const selectedTeam = data.team.map(id => `玩家${id}`).join(', ');
+    document.getElementById('team-vote').insertAdjacentHTML('afterbegin', 
+        `<p>提名队员：${selectedTeam}</p>`);
+});
+
+socket.on('team_vote_result', (data) => {
+    console.log('收到团队投票结果:', data);
+    try {
+        document.getElementById('team-vote').classList.add('hidden');
+
+        // 显示投票结果
+        const voteResults = Object.entries(data.votes)
+            .sort((a, b) => parseInt(a[0]) - parseInt(b[0]))  // 按玩家编号排序
+            .map(([pid, vote]) => `玩家${parseInt(pid)+1}: ${vote ? '同意' : '反对'}`)
+            .join(', ');
+
+        console.log('投票结果字符串:', voteResults);
+        alert(`投票结果：${voteResults}`);
+
+        if (data.success) {
+            // 详细记录调试信息
+            console.log("当前玩家ID(原始值):", myPlayerId, "类型:", typeof myPlayerId);
+            const playerIdNumber = parseInt(myPlayerId);
+            console.log("当前玩家ID(转换后):", playerIdNumber, "类型:", typeof playerIdNumber);
+            console.log("任务队员:", data.team, "类型:", typeof data.team[0]);
+
+            // 直接比较数字，不使用includes
+            let isInTeam = false;
+            for (let i = 0; i < data.team.length; i++) {
+                console.log(`比较: ${playerIdNumber} vs ${data.team[i]}`);
+                if (playerIdNumber === data.team[i]) {
+                    isInTeam = true;
+                    break;
+                }
+            }
+
+            console.log("玩家是否在团队中:", isInTeam);
+
+            if (isInTeam) {
+                console.log("显示任务投票按钮");
+                document.getElementById('quest-vote').classList.remove('hidden');
+            } else {
+                console.log("玩家不在任务队员中，不显示投票按钮");
+            }
+
+            // 显示被选中的队员
+            const questInfo = document.createElement('p');
+            questInfo.textContent = `执行任务的队员：${data.team.map(id => `玩家${id}`).join(', ')}`;
+            document.getElementById('game-info').appendChild(questInfo);
+            // 清除之前的队员信息
+            const oldTeamInfo = document.querySelector('#team-vote p');
+            if (oldTeamInfo) {
+                oldTeamInfo.remove();
+            }
+        }
+    } catch (error) {
+        console.error('处理投票结果时出错:', error);
+    }
+});
+
+socket.on('quest_vote_result', (data) => {
+    document.getElementById('quest-vote').classList.add('hidden');
+    // 移除之前显示的队员信息
+    const questInfo = document.getElementById('game-info').lastElementChild;
+    if (questInfo && questInfo.textContent.includes('执行任务的队员')) {
+        questInfo.remove();
+    }
+    // 显示任务投票结果
+    const voteCount = data.vote_count;
+    alert(`任务结果：成功${voteCount.success}票，失败${voteCount.fail}票`);
+
+    if (data.game_over && playerRole === '刺客') {
+        document.getElementById('assassin-phase').classList.remove('hidden');
+        // 创建刺杀目标选择按钮
+        const assassinTargets = document.getElementById('assassin-targets');
+        assassinTargets.innerHTML = '';
+        for (let i = 1; i <= parseInt(document.getElementById('player-count-display').textContent); i++) {
+            if (i !== myPlayerId) {  // 不能刺杀自己
+                const button = document.createElement('button');
+                button.textContent = `刺杀玩家${i}`;
+                button.onclick = () => {
+                    if (confirm(`确定要刺杀玩家${i}吗？`)) {
+                        assassinate(i);
+                        document.getElementById('assassin-phase').classList.add('hidden');
+                    }
+                };
+                assassinTargets.appendChild(button);
+            }
+        }
+    }
+    if (data.game_over) {
+        alert(data.message);
+    }
+});
+
+socket.on('assassination_result', (data) => {
+    alert(data.message);
+    // 可以添加重新开始游戏的选项
+});
+
+socket.on('game_validated', (data) => {
+    console.log('Game validated response:', data);
+
+    if (data.valid) {
+        // 保存游戏ID到全局变量（从验证请求中获取）
+        const gameIdInput = document.getElementById('game-id-input');
+        const validatedGameId = gameIdInput.value.trim();
+        window.gameId = validatedGameId;
+        console.log(`游戏验证成功，设置window.gameId = ${validatedGameId}`);
+
+        document.getElementById('setup-screen').classList.add('hidden');
+        document.getElementById('role-screen').classList.remove('hidden');
+
+        // 显示房间人数
+        document.getElementById('player-count-display').textContent = data.player_count;
+
+        // 显示已连接的玩家
+        updateConnectedPlayers(data.connected_players || []);
+    }
+});
+
+// 添加玩家加入事件处理
+socket.on('player_joined', (data) => {
+    console.log('Player joined event received:', data);
+
+    // 如果是当前玩家加入，保存玩家ID
+    if (myPlayerId === null) {
+        myPlayerId = data.player_id;
+        console.log(`Setting my player ID to ${myPlayerId}`);
+        document.getElementById('your-player-number').textContent = data.player_id;
+    }
+
+    // 更新已连接玩家显示
+    updateConnectedPlayers(data.connected_players);
+    console.log(`Updated connected players: ${data.connected_players}`);
+
+    // 更新房间人数显示
+    if (data.player_count !== undefined) {
+        console.log(`Updating room player count to ${data.player_count}`);
+        document.getElementById('player-count-display').textContent = data.player_count;
+    } else if (data.connected_players) {
+        // 如果没有提供player_count，则使用连接玩家数量
+        const count = data.connected_players.length;
+        console.log(`Setting room player count based on connected players: ${count}`);
+        document.getElementById('player-count-display').textContent = count;
+    }
+
+    // 更新开始游戏按钮状态
+    updateStartGameButton();
+
+    // 只有当所有玩家都加入后才开始游戏
+    if (data.all_players_joined) {
+        console.log('All players joined, switching to game screen');
+        document.getElementById('role-screen').classList.add('hidden');
+        document.getElementById('game-screen').classList.remove('hidden');
+    }
+});
+
+// 添加玩家离开事件处理
+socket.on('player_left', (data) => {
+    updateConnectedPlayers(data.connected_players);
+});
+
+// 更新已连接玩家显示
+function updateConnectedPlayers(players) {
+    const container = document.getElementById('connected-players');
+    container.innerHTML = '';
+
+    // 显示已连接玩家 - 无需增加+1
+    players.sort((a, b) => a - b).forEach(pid => {
+        const span = document.createElement('span');
+        span.className = 'connected-player';
+        span.textContent = `玩家${pid}`;
+        container.appendChild(span);
+    });
+
+    // 更新开始游戏按钮状态
+    updateStartGameButton();
+}
+
+// 用户操作函数
+function createGame() {
+    console.log("Creating new game...");
+    socket.emit('create_game');
+}
+
+function submitTeam() {
+    const checkboxes = document.querySelectorAll('#team-selection-buttons input:checked');
+    const requiredPlayers = parseInt(document.getElementById('required-players').textContent);
+
+    if (checkboxes.length !== requiredPlayers) {
+        alert(`请选择${requiredPlayers}名队员`);
+        return;
+    }
+
+    // 使用正确的gameId变量（从window对象中获取，或使用全局变量）
+    const currentGameId = window.gameId || gameId;
+
+    const team = Array.from(checkboxes).map(cb => parseInt(cb.value));
+    console.log(`提交队伍: ${team.join(', ')} 到游戏 ${currentGameId}`);
+    sendAction('propose_team', { game_id: currentGameId, team: team });
+}
+
+function submitTeamVote(approve) {
+    // 使用正确的gameId变量
+    const currentGameId = window.gameId || gameId;
+    console.log(`正在提交团队投票, window.gameId = ${window.gameId}, gameId = ${gameId}, 使用: ${currentGameId}`);
+
+    // 确保玩家ID是整数
+    const playerId = parseInt(myPlayerId);
+    console.log(`提交团队投票: ${approve ? '同意' : '反对'}, 玩家ID: ${playerId}`);
+
+    sendAction('team_vote', {
+        game_id: currentGameId,
+        player_id: playerId,
+        vote: approve
+    });
+    document.getElementById('team-vote').classList.add('hidden');
+}
+
+function submitQuestVote(success) {
+    // 使用正确的gameId变量
+    const currentGameId = window.gameId || gameId;
+
+    // 确保玩家ID是整数
+    const playerId = parseInt(myPlayerId);
+    console.log(`提交任务投票: 玩家ID=${playerId}, 投票=${success ? '成功' : '失败'}`);
+    console.log(`原始myPlayerId=${myPlayerId}, 类型=${typeof myPlayerId}`);
+
+    sendAction('quest_vote', {
+        game_id: currentGameId,
+        player_id: playerId,
+        vote: success
+    });
+    // 隐藏投票按钮，防止重复投票
+    document.getElementById('quest-vote').classList.add('hidden');
+}
+
+function assassinate(target) {
+    // 使用正确的gameId变量
+    const currentGameId = window.gameId || gameId;
+
+    // 确保目标ID是整数
+    const targetId = parseInt(target);
+    console.log(`执行刺杀: 目标玩家${targetId}`);
+
+    sendAction('assassinate', {
+        game_id: currentGameId,
+        target: targetId
+    });
+}
+
+function joinExistingGame() {
+    const gameIdInput = document.getElementById('game-id-input');
+    const gameId = gameIdInput.value.trim();
+    const joinButton = document.getElementById('join-button');
+
+    // 清空任何存在的错误消息
+    clearErrorMessages();
+
+    if (!gameId) {
+        showErrorMessage('游戏ID不能为空');
+        return;
+    }
+
+    // 禁用按钮，显示加载状态
+    joinButton.disabled = true;
+    joinButton.textContent = '加入中...';
+
+    // 清除任何现有的超时处理器
+    if (window.joinTimeoutId) {
+        console.log('Clearing existing timeout', window.joinTimeoutId);
+        clearTimeout(window.joinTimeoutId);
+    }
+
+    // 设置超时处理 - 增加至20秒
+    window.joinTimeoutId = setTimeout(() => {
+        console.log('Join game timeout triggered after 20 seconds');
+        // 重置按钮状态
+        joinButton.disabled = false;
+        joinButton.textContent = '加入游戏';
+        // 显示超时错误信息
+        showErrorMessage('加入游戏超时，请检查网络连接并重试。如果问题持续存在，请尝试刷新页面。');
+        // 清除超时ID
+        window.joinTimeoutId = null;
+    }, 20000); // 20秒超时
+
+    console.log(`Attempting to join game with ID: ${gameId}`);
+
+    // 直接发送加入游戏请求
+    socket.emit('join_game', { game_id: gameId });
+    console.log(`Sent join_game request for game: ${gameId}`);
+}
+
+function copyGameId(id) {
+    navigator.clipboard.writeText(id).then(() => {
+        const copyButton = document.querySelector('.copy-button');
+        const originalText = copyButton.textContent;
+        copyButton.textContent = '已复制！';
+        setTimeout(() => {
+            copyButton.textContent = originalText;
+        }, 2000);
+    }).catch(err => {
+        console.error('复制失败:', err);
+        alert('复制失败，请手动复制游戏ID');
+    });
+}
+
+// 显示错误消息的函数
+function showErrorMessage(message) {
+    // 创建错误消息元素
+    const errorMsg = document.createElement('div');
+    errorMsg.className = 'error-message';
+    errorMsg.textContent = message;
+    errorMsg.style.backgroundColor = 'rgba(231, 76, 60, 0.9)';
+    errorMsg.style.color = 'white';
+    errorMsg.style.padding = '10px 20px';
+    errorMsg.style.borderRadius = '5px';
+    errorMsg.style.marginTop = '10px';
+    errorMsg.style.fontWeight = 'bold';
+    errorMsg.style.textAlign = 'center';
+    errorMsg.style.animation = 'fadeIn 0.3s';
+
+    // 添加到适当的容器
+    const container = document.querySelector('.container');
+    // 检查是否已有错误消息
+    const existingError = document.querySelector('.error-message');
+    if (existingError) {
+        existingError.remove();
+    }
+    container.insertBefore(errorMsg, container.firstChild);
+
+    // 自动关闭
+    setTimeout(() => {
+        errorMsg.style.animation = 'fadeOut 0.3s forwards';
+        setTimeout(() => {
+            if (errorMsg.parentNode) {
+                errorMsg.parentNode.removeChild(errorMsg);
+            }
+        }, 300);
+    }, 5000);
+}
+
+// 清除错误消息
+function clearErrorMessages() {
+    const errorMsgs = document.querySelectorAll('.error-message');
+    errorMsgs.forEach(msg => {
+        msg.style.animation = 'fadeOut 0.3s forwards';
+        setTimeout(() => {
+            if (msg.parentNode) {
+                msg.parentNode.removeChild(msg);
+            }
+        }, 300);
+    });
+}
+
+// 更新开始游戏按钮状态
+function updateStartGameButton() {
+    const connectedPlayers = document.querySelectorAll('.connected-player');
+    const startButton = document.getElementById('start-game-btn');
+    const minPlayersMsg = document.getElementById('min-players-msg');
+    const hostInfo = document.getElementById('host-info');
+
+    // 首先根据房主状态决定是否显示按钮和房主提示
+    if (!isHost) {
+        startButton.style.display = 'none';
+        minPlayersMsg.style.display = 'none';
+        hostInfo.classList.add('hidden');
+        return;
+    } else {
+        startButton.style.display = 'inline-block';
+        hostInfo.classList.remove('hidden');
+    }
+
+    // 然后根据玩家数量决定按钮是否可用
+    if (connectedPlayers.length < 5) {
+        startButton.disabled = true;
+        startButton.classList.add('disabled');
+        minPlayersMsg.style.display = 'block';
+    } else {
+        startButton.disabled = false;
+        startButton.classList.remove('disabled');
+        minPlayersMsg.style.display = 'none';
+    }
+}
+
+// 开始游戏
+function startGame() {
+    console.log("Starting game...");
+    const currentGameId = window.gameId || gameId;
+    socket.emit('start_game_manual', { game_id: currentGameId });
+}
+
+// 确保window加载完成后初始化操作
+window.onload = function() {
+    // 初始化UI组件
+    updateStartGameButton();
+
+    // 初始化游戏规则模态框
+    initRulesModal();
+};
+
+// 游戏规则模态框控制
+function initRulesModal() {
+    const rulesLink = document.getElementById('rules-link');
+    const rulesModal = document.getElementById('rules-modal');
+    const closeModal = document.querySelector('.close-modal');
+
+    // 点击游戏规则链接打开模态框
+    rulesLink.addEventListener('click', function(e) {
+        e.preventDefault();
+        rulesModal.classList.add('show');
+        document.body.style.overflow = 'hidden'; // 防止背景滚动
+    });
+
+    // 点击关闭按钮关闭模态框
+    closeModal.addEventListener('click', function() {
+        rulesModal.classList.remove('show');
+        document.body.style.overflow = ''; // 恢复背景滚动
+    });
+
+    // 点击模态框背景关闭模态框
+    rulesModal.addEventListener('click', function(e) {
+        if (e.target === rulesModal) {
+            rulesModal.classList.remove('show');
+            document.body.style.overflow = '';
+        }
+    });
+
+    // 按ESC键关闭模态框
+    document.addEventListener('keydown', function(e) {
+        if (e.key === 'Escape' && rulesModal.classList.contains('show')) {
+            rulesModal.classList.remove('show');
+            document.body.style.overflow = '';
+        }
+    });
+}
@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # 可选依赖：没有安装时只提供 gzip
+    brotli = None
+
+
+class Asset:
+    """一个预先压缩好的资源：按内容编码保存响应体，每种编码有自己的 ETag"""
+
+    __slots__ = ('mimetype', 'bodies', 'etags')
+
+    def __init__(self, body: bytes, mimetype: str):
+        self.mimetype = mimetype  # 完整的 Content-Type
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        self.bodies = {'identity': body}
+        self.etags = {'identity': digest}
+        candidates = [('gzip', gzip.compress(body, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            candidates.insert(0, ('br', brotli.compress(body, quality=11)))
+        for encoding, compressed in candidates:
+            # 压缩后没有变小的资源（例如很小的文件）直接发送原文
+            if len(compressed) < len(body):
+                self.bodies[encoding] = compressed
+                self.etags[encoding] = f"{digest}-{encoding}"
+
+    @property
+    def digest(self) -> str:
+        return self.etags['identity']
+
+
+class StaticAssets:
+    """启动时加载静态资源，计算内容哈希并预先压缩
+
+    资源通过带哈希的地址（/assets/js/app.<哈希>.js）访问，内容变化后地址也会变化，
+    因此可以让浏览器永久缓存。页面本身也可以用 add() 预先渲染后注册，按 ETag
+    重新验证。
+    """
+
+    def __init__(self, root: str, url_prefix: str = '/assets/'):
+        self.url_prefix = url_prefix
+        self._urls = {}  # 资源相对路径 -> 带哈希的地址
+        self._assets = {}  # 带哈希的地址中 url_prefix 之后的部分 -> Asset
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    self._register(name, f.read())
+
+    def _register(self, name, body):
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if mimetype.startswith('text/') or mimetype == 'application/javascript':
+            mimetype += '; charset=utf-8'
+        asset = Asset(body, mimetype)
+        stem, ext = os.path.splitext(name)
+        hashed = f"{stem}.{asset.digest[:12]}{ext}"
+        self._urls[name] = self.url_prefix + hashed
+        self._assets[hashed] = asset
+        return asset
+
+    def url(self, name: str) -> str:
+        """资源的带哈希地址，在模板中作为 asset() 使用"""
+        return self._urls[name]
+
+    def get(self, hashed_name: str):
+        return self._assets.get(hashed_name)
+
+    def __len__(self):
+        return len(self._assets)
+
+
+def negotiate(asset: Asset) -> str:
+    """按 Accept-Encoding 选择编码：br 优先，其次 gzip"""
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.bodies and accepted[encoding]:
+            return encoding
+    return 'identity'
+
+
+def asset_response(asset: Asset, cache_control: str) -> Response:
+    """发送资源，客户端缓存仍然有效（If-None-Match 匹配）时返回 304"""
+    encoding = negotiate(asset)
+    etag = asset.etags[encoding]
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(asset.bodies[encoding], content_type=asset.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,31 @@
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, socketio
+
+
+def start_five_player_game(host=None, batch_players=(), drain=True):
+    """创建房间、加入5名玩家并开始游戏，返回 (game_id, clients)
+
+    host 为房主的连接（默认新建）；batch_players 中的玩家编号（2-5）以支持合并帧的方式连接；
+    drain 为 False 时保留开始游戏后收到的消息（角色信息、第一份 game_state 等）。
+    """
+    host = host or socketio.test_client(app)
+    host.emit('create_game')
+    game_id = host.get_received()[0]['args'][0]['game_id']
+    clients = [host]
+    for number in range(2, 6):
+        auth = {'batch': True} if number in batch_players else None
+        client = socketio.test_client(app, auth=auth)
+        client.emit('join_game', {'game_id': game_id})
+        clients.append(client)
+    for client in clients:
+        client.get_received()
+    host.emit('start_game_manual', {'game_id': game_id})
+    if drain:
+        for client in clients:
+            client.get_received()
+    return game_id, clients
@@ -0,0 +1,147 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from avalon import AvalonGame, Ballot
+
+class TestAvalonGame(unittest.TestCase):
+    def test_players_before_roles_assigned(self):
+        """测试分配角色前的玩家列表"""
+        game = AvalonGame(5)
+        self.assertFalse(game.roles_assigned)
+        self.assertEqual(game.players, [(f"玩家{i+1}", None) for i in range(5)])
+
+    def test_assign_roles(self):
+        """测试角色分配以及缓存的阵营和关键角色座位"""
+        for player_count in range(5, 11):
+            game = AvalonGame(player_count)
+            game.assign_roles()
+            self.assertTrue(game.roles_assigned)
+            roles = [role for _, role in game.players]
+            self.assertEqual(sorted(roles), sorted(AvalonGame.roles[player_count]))
+            self.assertEqual(roles[game.merlin_index], "梅林")
+            self.assertEqual(roles[game.assassin_index], "刺客")
+            for i, role in enumerate(roles):
+                self.assertEqual(game.role_of(i), role)
+                self.assertEqual(game.camp_of(i), AvalonGame.ROLE_CAMPS[role])
+
+    def test_assign_explicit_roles(self):
+        """测试按指定顺序分配角色"""
+        roles = ["刺客", "梅林", "忠臣", "派西维尔", "莫甘娜"]
+        game = AvalonGame(5)
+        game.assign_roles(roles)
+        self.assertEqual([role for _, role in game.players], roles)
+        self.assertEqual(game.evil_mask, 0b10001)
+        with self.assertRaises(ValueError):
+            AvalonGame(5).assign_roles(["梅林"] * 5)
+
+    def test_rule_tables_are_shared_and_read_only(self):
+        """测试规则表由所有实例共享且不可修改"""
+        a, b = AvalonGame(5), AvalonGame(6)
+        self.assertIs(a.quest_requirements, b.quest_requirements)
+        with self.assertRaises(TypeError):
+            a.quest_requirements[5] = (1, 1, 1, 1, 1)
+        self.assertFalse(hasattr(a, '__dict__'))
+
+    def test_fourth_quest_needs_two_fails(self):
+        """测试7人及以上第4轮任务需要2张失败票"""
+        game = AvalonGame(7)
+        game.current_quest = 3
+        game.propose_team(0, [0, 1, 2, 3])
+        self.assertTrue(game.quest_vote([True, True, True, False]))
+
+    def test_ballot_revote_and_early_outcome(self):
+        """测试改票、重复投票和提前确定的结果"""
+        ballot = Ballot(0b11111, 3)
+        self.assertTrue(ballot.cast(0, True))
+        self.assertTrue(ballot.cast(0, True))  # 重复投票不计数
+        self.assertEqual((ballot.yes, ballot.no), (1, 0))
+        ballot.cast(0, False)  # 改票
+        self.assertEqual((ballot.yes, ballot.no), (0, 1))
+        self.assertIsNone(ballot.outcome)
+        ballot.cast(1, False)
+        ballot.cast(2, False)
+        self.assertFalse(ballot.outcome)  # 已有3票反对，不必等其余玩家
+        self.assertFalse(ballot.complete)
+        self.assertFalse(ballot.cast(5, True))
+        self.assertEqual(ballot.votes(), {0: False, 1: False, 2: False})
+
+    def test_cast_votes(self):
+        """测试逐票提交的表决和任务投票"""
+        game = AvalonGame(5)
+        with self.assertRaises(ValueError):
+            game.cast_team_vote(0, True)
+        self.assertTrue(game.propose_team(0, [1, 3]))
+        for i in range(4):
+            self.assertIsNone(game.cast_team_vote(i, i % 2 == 0))
+        self.assertIsNone(game.cast_team_vote(1, True))  # 改票
+        self.assertTrue(game.cast_team_vote(4, False))
+        with self.assertRaises(ValueError):
+            game.cast_quest_vote(0, True)  # 不是任务队员
+        self.assertIsNone(game.cast_quest_vote(1, False))
+        self.assertFalse(game.cast_quest_vote(3, True))
+        self.assertEqual(game.quest_results, [False])
+        self.assertEqual((game.current_quest, game.leader_index), (1, 1))
+        self.assertIsNone(game.quest_ballot)
+        self.assertFalse(game.propose_team(1, [2, 2, 3]))
+
+    def test_propose_only_by_leader_between_ballots(self):
+        """测试只有当前队长可以提名，表决或任务投票进行中时不能重新提名"""
+        game = AvalonGame(5)
+        self.assertFalse(game.propose_team(1, [0, 1]))
+        self.assertTrue(game.propose_team(0, [0, 1]))
+        self.assertFalse(game.propose_team(0, [2, 3]))  # 表决进行中
+        game.team_vote([True] * 5)
+        self.assertFalse(game.propose_team(0, [2, 3]))  # 任务投票进行中
+        self.assertEqual(game.quest_team, [0, 1])
+        self.assertEqual(len(game.history), 1)
+
+    def test_state_round_trip(self):
+        """测试紧凑状态可以完整恢复游戏"""
+        game = AvalonGame(7)
+        game.assign_roles()
+        game.propose_team(0, [0, 1])
+        game.quest_vote([True, False])
+        game.propose_team(1, [2, 3, 4])
+        game.team_vote([False] * 7)
+        game.propose_team(2, [2, 3, 4])
+        game.cast_team_vote(0, True)
+        game.cast_team_vote(1, False)
+        restored = AvalonGame.from_state(game.to_state())
+        self.assertEqual(restored.to_state(), game.to_state())
+        self.assertEqual(restored.team_ballot.votes(), {0: True, 1: False})
+        for attr in AvalonGame.__slots__:
+            if not attr.endswith('_ballot'):
+                self.assertEqual(getattr(restored, attr), getattr(game, attr))
+        self.assertFalse(AvalonGame.from_state(AvalonGame(5).to_state()).roles_assigned)
+
+    def test_role_infos_match_visibility_rules(self):
+        """测试预编译的可见性表与逐个比较角色名称的结果一致"""
+        evil = ["刺客", "爪牙", "莫甘娜", "莫德雷德"]
+        for player_count in range(5, 11):
+            for _ in range(20):
+                game = AvalonGame(player_count)
+                game.assign_roles()
+                players = game.players
+                for i, info in enumerate(game.role_infos()):
+                    role = players[i][1]
+                    self.assertEqual(info['role'], role)
+                    if role == '梅林':
+                        expected = [j + 1 for j, (_, r) in enumerate(players) if r in evil and r != "莫德雷德"]
+                        self.assertEqual(info['evil_players'], expected)
+                    elif role == '派西维尔':
+                        expected = [j + 1 for j, (_, r) in enumerate(players) if r in ['梅林', '莫甘娜']]
+                        self.assertEqual(info['merlin_morgana'], expected)
+                    elif role in evil:
+                        expected = [j + 1 for j, (_, r) in enumerate(players) if r in evil and j != i]
+                        self.assertEqual(info['evil_players'], expected)
+                        self.assertEqual(info['evil_roles'], [players[j - 1][1] for j in expected])
+                    else:
+                        self.assertNotIn('evil_players', info)
+                        self.assertNotIn('merlin_morgana', info)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖
+    np = None
+
+if np is not None:
+    import batch_sim
+    from batch_sim import BatchSimulation, RandomPolicy, HeuristicPolicy, cross_check
+
+@unittest.skipIf(np is None, "需要安装 numpy")
+class TestBatchSimulation(unittest.TestCase):
+    def test_cross_check_matches_avalon_game(self):
+        """测试批量模拟与 AvalonGame 的回放结果一致"""
+        for player_count in range(5, 11):
+            for policy in (HeuristicPolicy(), RandomPolicy(approve_prob=0.6, fail_prob=0.5)):
+                mismatches = cross_check(player_count, 2000, samples=200, policy=policy, seed=player_count)
+                self.assertEqual(mismatches, [])
+
+    def test_rejection_track(self):
+        """测试连续5次否决邪恶方获胜"""
+        sim = BatchSimulation(5, 100, RandomPolicy(approve_prob=0.0), seed=1)
+        result = sim.run()
+        self.assertTrue((result.winner == batch_sim.EVIL_WINS).all())
+        self.assertTrue((result.reason == batch_sim.REASON_REJECTIONS).all())
+        self.assertTrue((result.rounds == 5).all())
+        self.assertTrue((sim.leader == 4).all())
+
+    def test_fourth_quest_needs_two_fails(self):
+        """测试7人及以上第4轮任务需要2张失败票"""
+        class OneFailOnFourthQuest(RandomPolicy):
+            def quest_vote(self, sim, idx, team):
+                votes = np.ones(team.shape, dtype=bool)
+                fourth = sim.current_quest[idx] == 3
+                first_member = team.argmax(axis=1)
+                votes[np.nonzero(fourth)[0], first_member[fourth]] = False
+                return votes
+
+        for player_count, expected in ((6, [1, 1, 1, 0, -1]), (7, [1, 1, 1, 1, -1])):
+            sim = BatchSimulation(player_count, 50, OneFailOnFourthQuest(approve_prob=1.0), seed=1)
+            sim.success_count[:] = -1  # 让对局继续到第4轮
+            result = sim.run()
+            self.assertEqual(result.quest_results[0].tolist()[:4], expected[:4])
+
+    def test_merlin_cannot_see_oberon(self):
+        """测试梅林只反对包含可见邪恶方的队伍，看不到奥伯伦和莫德雷德"""
+        sim = BatchSimulation(10, 1, seed=1)
+        sim.roles[0] = [batch_sim.ROLE_CODES[r] for r in
+                        ["梅林", "奥伯伦", "莫德雷德", "刺客", "派西维尔", "忠臣", "忠臣", "忠臣", "忠臣", "莫甘娜"]]
+        sim.evil = batch_sim.IS_EVIL[sim.roles]
+        idx = np.zeros(3, dtype=np.intp)
+        team = np.zeros((3, 10), dtype=bool)
+        team[0, [1, 5]] = True  # 奥伯伦
+        team[1, [2, 5]] = True  # 莫德雷德
+        team[2, [3, 5]] = True  # 刺客
+        votes = HeuristicPolicy().team_vote(sim, idx, team)
+        self.assertEqual(votes[:, 0].tolist(), [True, True, False])
+
+    def test_summary(self):
+        """测试结果汇总"""
+        summary = BatchSimulation(5, 1000, seed=1).run().summary()
+        self.assertEqual(summary['games'], 1000)
+        self.assertAlmostEqual(summary['good_win_rate'] + summary['evil_win_rate'], 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+from collections import Counter
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import app, socketio, rooms, games, handle_bus_message, hub_handler
+from cluster import HashRing, LocalBus, UnixSocketBus, BusError, Dispatcher
+from game_id import GameIdAllocator
+
+class TestHashRing(unittest.TestCase):
+    def test_balanced_and_stable(self):
+        """测试游戏ID在节点间大致均匀分布，增加节点时只迁移少部分ID"""
+        ids = [str(i) for i in range(1000, 10000)]
+        ring3, ring4 = HashRing(3), HashRing(4)
+        counts = Counter(ring3.owner(game_id) for game_id in ids)
+        self.assertEqual(sorted(counts), [0, 1, 2])
+        self.assertGreater(min(counts.values()), len(ids) / 3 * 0.7)
+        moved = sum(1 for game_id in ids if ring3.owner(game_id) != ring4.owner(game_id))
+        self.assertLess(moved, len(ids) * 0.4)
+        self.assertEqual({HashRing(1).owner(game_id) for game_id in ids}, {0})
+
+    def test_allocator_only_uses_owned_ids(self):
+        """测试分配器只分配属于当前节点的ID"""
+        ring = HashRing(3)
+        allocator = GameIdAllocator(owns=lambda game_id: ring.owner(game_id) == 1)
+        for _ in range(200):
+            self.assertEqual(ring.owner(allocator.allocate()), 1)
+
+    def test_dispatcher_routes_by_game_id(self):
+        """测试调度器按 game_id 查询参数选择工作进程，没有时轮流分配"""
+        ring = HashRing(3)
+        dispatcher = Dispatcher(ring, [('127.0.0.1', 1), ('127.0.0.1', 2), ('127.0.0.1', 3)])
+        head = b'GET /socket.io/?EIO=4&transport=websocket&game_id=4321 HTTP/1.1\r\nHost: x\r\n\r\n'
+        self.assertEqual(dispatcher.route(head), ring.owner('4321'))
+        plain = b'GET / HTTP/1.1\r\nHost: x\r\n\r\n'
+        self.assertEqual([dispatcher.route(plain) for _ in range(4)], [0, 1, 2, 0])
+
+class TestBus(unittest.TestCase):
+    def test_unix_socket_bus(self):
+        """测试 Unix 域套接字总线的请求和回复"""
+        with tempfile.TemporaryDirectory() as tmp:
+            server, client = UnixSocketBus(tmp), UnixSocketBus(tmp)
+            server.serve(1, lambda message: {'echo': message['game_id']})
+            try:
+                self.assertEqual(client.request(1, {'game_id': '游戏1234'}), {'echo': '游戏1234'})
+                with self.assertRaises(BusError):
+                    client.request(2, {})
+            finally:
+                server.close()
+
+    def test_handler_runs_on_event_loop(self):
+        """测试总线线程收到的请求交给主线程的事件循环处理；发出请求时事件循环不被阻塞，
+        即使请求发给本进程自己（两个进程互相查询）也不会等到超时"""
+        seen = []
+
+        def handler(message):
+            seen.append(threading.get_ident())
+            return {'echo': message['game_id']}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            server, client = UnixSocketBus(tmp), UnixSocketBus(tmp, timeout=1.0)
+            server.serve(1, hub_handler(handler))
+            self.addCleanup(setattr, app_module, 'cluster_bus', app_module.cluster_bus)
+            app_module.cluster_bus = client
+            try:
+                reply = app_module.ask_owner(1, {'game_id': '1234'})
+            finally:
+                server.close()
+        self.assertEqual(reply, {'echo': '1234'})
+        self.assertEqual(seen, [threading.get_ident()])
+
+class TestRemoteLobby(unittest.TestCase):
+    """两个节点的大厅：本进程是节点 0，另一个节点通过 LocalBus 回答"""
+
+    class FixedRing:
+        def owner(self, game_id):
+            return 1 if game_id.startswith('9') else 0
+
+    def setUp(self):
+        """测试前的设置"""
+        app.config['TESTING'] = True
+        rooms.clear()
+        games.clear()
+        self.bus = LocalBus()
+        self.remote_rooms = {'9001': {'players': [{'sid': None, 'number': 1}], 'started': False, 'game_id': '9001'}}
+        self.bus.serve(1, self.remote_node)
+        self.saved = app_module.cluster_bus, app_module.hash_ring
+        app_module.cluster_bus, app_module.hash_ring = self.bus, self.FixedRing()
+        self.client = socketio.test_client(app)
+
+    def tearDown(self):
+        """测试后的清理"""
+        app_module.cluster_bus, app_module.hash_ring = self.saved
+        rooms.clear()
+        games.clear()
+
+    def remote_node(self, message):
+        # 用本进程的处理函数模拟另一个节点的房间表
+        local = dict(rooms)
+        rooms.clear()
+        rooms.update(self.remote_rooms)
+        try:
+            return handle_bus_message(message)
+        finally:
+            rooms.clear()
+            rooms.update(local)
+
+    def test_validate_remote_room(self):
+        """测试验证其他节点的房间"""
+        self.client.emit('validate_game', {'game_id': '9001'})
+        reply = self.client.get_received()[0]
+        self.assertEqual(reply['name'], 'game_validated')
+        self.assertEqual(reply['args'][0], {'valid': True, 'player_count': 1, 'connected_players': []})
+        self.client.emit('validate_game', {'game_id': '9002'})
+        self.assertFalse(self.client.get_received()[0]['args'][0]['valid'])
+
+    def test_join_remote_room(self):
+        """测试加入其他节点的房间时让客户端重新连接，不能加入时直接报错"""
+        self.client.emit('join_game', {'game_id': '9001'})
+        reply = self.client.get_received()[0]
+        self.assertEqual(reply['name'], 'switch_worker')
+        self.assertEqual(reply['args'][0], {'game_id': '9001'})
+        self.assertNotIn('9001', app_module.room_scheduler.actors)
+        
+        self.remote_rooms['9001']['started'] = True
+        self.client.emit('join_game', {'game_id': '9001'})
+        reply = self.client.get_received()[0]
+        self.assertEqual(reply['name'], 'error')
+        self.assertEqual(reply['args'][0]['message'], '游戏已经开始')
+
+if __name__ == '__main__':
+    unittest.main()
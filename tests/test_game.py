@@ -2,11 +2,14 @@ import unittest
 from unittest.mock import MagicMock, patch
 import sys
 import os
+import time
 
 # 添加项目根目录到 Python 路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import app, socketio, rooms
+import app as app_module
+from app import app, socketio, rooms, games, game_states, sid_index, sweep_rooms, ROOM_IDLE_TTL, resume_token
+from helpers import start_five_player_game
 
 class TestGame(unittest.TestCase):
     def setUp(self):
@@ -16,10 +19,12 @@ class TestGame(unittest.TestCase):
         self.socketio_test_client = socketio.test_client(app)
         # 清空房间数据
         rooms.clear()
+        games.clear()
 
     def tearDown(self):
         """测试后的清理"""
         rooms.clear()
+        games.clear()
 
     def test_create_game(self):
         """测试创建游戏"""
@@ -82,5 +87,267 @@ class TestGame(unittest.TestCase):
         self.assertEqual(error_response[0]['name'], 'error')
         self.assertEqual(error_response[0]['args'][0]['message'], '游戏ID不存在')
 
+    def test_disconnect_in_lobby(self):
+        """测试未开始游戏的房间中玩家断开连接"""
+        self.socketio_test_client.emit('create_game')
+        game_id = self.socketio_test_client.get_received()[0]['args'][0]['game_id']
+        
+        client2 = socketio.test_client(app)
+        client2.emit('join_game', {'game_id': game_id})
+        client2.get_received()
+        self.socketio_test_client.get_received()
+        self.assertEqual(len([s for s in sid_index.values() if s[0] == game_id]), 2)
+        
+        # 第二名玩家断开连接，房主收到离开通知
+        client2.disconnect()
+        messages = self.socketio_test_client.get_received()
+        self.assertEqual(messages[-1]['name'], 'player_left')
+        self.assertEqual(messages[-1]['args'][0]['player_id'], 2)
+        self.assertEqual(messages[-1]['args'][0]['connected_players'], [1])
+        self.assertEqual(game_states[game_id]['connected_players'], {0})
+        self.assertEqual(len([s for s in sid_index.values() if s[0] == game_id]), 1)
+
+    def test_join_same_game_twice(self):
+        """测试重复加入同一游戏"""
+        self.socketio_test_client.emit('create_game')
+        game_id = self.socketio_test_client.get_received()[0]['args'][0]['game_id']
+        
+        self.socketio_test_client.emit('join_game', {'game_id': game_id})
+        response = self.socketio_test_client.get_received()
+        self.assertEqual(response[0]['name'], 'error')
+        self.assertEqual(response[0]['args'][0]['message'], '你已经在该游戏中')
+
+    def test_one_seat_per_connection(self):
+        """测试已经有座位的连接不能再创建或加入其他游戏，断开时释放原来的座位"""
+        self.socketio_test_client.emit('create_game')
+        first = self.socketio_test_client.get_received()[0]['args'][0]['game_id']
+        other = socketio.test_client(app)
+        other.emit('create_game')
+        second = other.get_received()[0]['args'][0]['game_id']
+
+        self.socketio_test_client.emit('create_game')
+        self.socketio_test_client.emit('join_game', {'game_id': second})
+        errors = [m['args'][0]['message'] for m in self.socketio_test_client.get_received()]
+        self.assertEqual(errors, ['你已经在其他游戏中', '你已经在其他游戏中'])
+        self.assertEqual(len(rooms), 2)
+        self.assertEqual(len(rooms[second]['players']), 1)
+
+        self.socketio_test_client.disconnect()
+        self.assertEqual(game_states[first]['connected_players'], set())
+        other.disconnect()
+
+    def test_idle_room_eviction(self):
+        """测试空闲超时的房间被回收并通知客户端"""
+        self.socketio_test_client.emit('create_game')
+        game_id = self.socketio_test_client.get_received()[0]['args'][0]['game_id']
+        
+        evicted = sweep_rooms(now=time.monotonic() + ROOM_IDLE_TTL + 1)
+        self.assertIn((game_id, 'idle'), evicted)
+        socketio.sleep(0.01)  # 等待房间 actor 执行回收
+        
+        messages = self.socketio_test_client.get_received()
+        self.assertEqual(messages[-1]['name'], 'room_closed')
+        self.assertEqual(messages[-1]['args'][0]['game_id'], game_id)
+        self.assertNotIn(game_id, rooms)
+        self.assertNotIn(game_id, game_states)
+        self.assertEqual([s for s in sid_index.values() if s[0] == game_id], [])
+
+    def start_five_player_game(self, batch_players=()):
+        """以 socketio_test_client 为房主开始5人游戏，保留开始游戏后收到的消息，返回 (game_id, clients)"""
+        return start_five_player_game(self.socketio_test_client, batch_players, drain=False)
+
+    def test_start_game_sends_role_info(self):
+        """测试开始游戏后每名玩家收到自己的角色信息"""
+        game_id, clients = self.start_five_player_game()
+        game = games[game_id]
+        messages = self.socketio_test_client.get_received()
+        role_infos = {m['args'][0]['player_number']: m['args'][0]
+                      for m in messages if m['name'] == 'role_info'}
+        self.assertEqual(sorted(role_infos), [1, 2, 3, 4, 5])
+        for number, info in role_infos.items():
+            self.assertEqual(info['role'], game.role_of(number - 1))
+        self.assertEqual(messages[-1]['name'], 'game_started')
+
+    def test_game_state_deltas(self):
+        """测试游戏状态以带版本号的增量形式广播"""
+        game_id, clients = self.start_five_player_game()
+        states = [m['args'][0] for m in clients[1].get_received() if m['name'] == 'game_state']
+        self.assertEqual(len(states), 1)
+        self.assertFalse(states[0]['delta'])
+        self.assertEqual(states[0]['version'], 1)
+        self.assertEqual(states[0]['player_count'], 5)
+        self.assertNotIn('camps', states[0])
+        
+        # 全部反对：只有队长和否决计数发生变化
+        self.socketio_test_client.emit('propose_team', {'game_id': game_id, 'team': [1, 2]})
+        for i, client in enumerate(clients):
+            client.emit('team_vote', {'game_id': game_id, 'player_id': i + 1, 'vote': False})
+        states = [m['args'][0] for m in clients[1].get_received() if m['name'] == 'game_state']
+        self.assertEqual(states, [{'version': 2, 'delta': True, 'leader': 2, 'vote_track': 1}])
+        
+        # 请求完整快照
+        clients[1].emit('request_game_state', {'game_id': game_id})
+        snapshot = clients[1].get_received()[-1]
+        self.assertEqual(snapshot['name'], 'game_state')
+        self.assertEqual(snapshot['args'][0]['version'], 2)
+        self.assertFalse(snapshot['args'][0]['delta'])
+        self.assertEqual(snapshot['args'][0]['leader'], 2)
+        self.assertEqual(snapshot['args'][0]['required_players'], 2)
+
+    def test_propose_team_checks_leader_and_phase(self):
+        """测试非队长不能提名，表决进行中不能重新提名"""
+        game_id, clients = self.start_five_player_game()
+        for client in clients:
+            client.get_received()
+        clients[1].emit('propose_team', {'game_id': game_id, 'team': [2, 3]})
+        self.assertEqual(clients[1].get_received()[-1]['args'][0]['message'], '只有队长可以提名队伍')
+        self.assertIsNone(games[game_id].team_ballot)
+        
+        self.socketio_test_client.emit('propose_team', {'game_id': game_id, 'team': [1, 2]})
+        self.socketio_test_client.emit('propose_team', {'game_id': game_id, 'team': [3, 4]})
+        errors = [m['args'][0]['message'] for m in self.socketio_test_client.get_received() if m['name'] == 'error']
+        self.assertEqual(errors, ['现在不是提名队伍的阶段'])
+        self.assertEqual(games[game_id].quest_team, [0, 1])
+
+    def test_votes_only_for_own_seat(self):
+        """测试观众不能投票，玩家不能替其他座位投票"""
+        game_id, clients = self.start_five_player_game()
+        self.socketio_test_client.emit('propose_team', {'game_id': game_id, 'team': [1, 2]})
+        spectator = socketio.test_client(app)
+        spectator.emit('spectate_game', {'game_id': game_id})
+        for number in range(1, 6):
+            spectator.emit('team_vote', {'game_id': game_id, 'player_id': number, 'vote': False})
+        errors = [m['args'][0]['message'] for m in spectator.get_received() if m['name'] == 'error']
+        self.assertEqual(errors, ['你不在该游戏中'] * 5)
+        
+        clients[1].emit('team_vote', {'game_id': game_id, 'player_id': 3, 'vote': False})
+        errors = [m['args'][0]['message'] for m in clients[1].get_received() if m['name'] == 'error']
+        self.assertEqual(errors, ['不能替其他玩家投票'])
+        self.assertEqual(games[game_id].team_ballot.votes(), {})
+        self.assertEqual(games[game_id].vote_track, 0)
+        
+        for i, client in enumerate(clients):
+            client.emit('team_vote', {'game_id': game_id, 'player_id': i + 1, 'vote': True})
+        spectator.emit('quest_vote', {'game_id': game_id, 'player_id': 1, 'vote': False})
+        clients[0].emit('quest_vote', {'game_id': game_id, 'player_id': 2, 'vote': False})
+        self.assertEqual(games[game_id].quest_ballot.votes(), {})
+        spectator.disconnect()
+
+    def test_batched_frames(self):
+        """测试同一条消息产生的多个广播对支持的客户端合并为一帧"""
+        game_id, clients = self.start_five_player_game(batch_players=(2,))
+        names = [m['name'] for m in clients[1].get_received() if m['name'] != 'role_info']
+        self.assertEqual(names, ['batch'])
+        legacy = [m['name'] for m in clients[2].get_received() if m['name'] != 'role_info']
+        self.assertEqual(legacy, ['game_state', 'game_started'])
+        
+        self.socketio_test_client.emit('propose_team', {'game_id': game_id, 'team': [1, 2]})
+        self.assertEqual([m['name'] for m in clients[1].get_received()], ['team_proposed'])
+        for i, client in enumerate(clients):
+            client.emit('team_vote', {'game_id': game_id, 'player_id': i + 1, 'vote': True})
+        frames = clients[1].get_received()
+        self.assertEqual(len(frames), 1)
+        self.assertEqual([name for name, _ in frames[0]['args'][0]], ['team_vote_result', 'game_state'])
+        self.assertEqual(frames[0]['args'][0][0][1]['team'], [1, 2])
+        legacy = [m['name'] for m in clients[2].get_received()]
+        self.assertEqual(legacy[-2:], ['team_vote_result', 'game_state'])
+
+    @staticmethod
+    def sid_of(client):
+        return socketio.server.manager.sid_from_eio_sid(client.eio_sid, '/')
+
+    def token_of(self, game_id, number):
+        player = rooms[game_id]['players'][number - 1]
+        return resume_token(number - 1, player['token'])
+
+    def test_resume_token_issued(self):
+        """测试创建和加入房间时返回各自座位的恢复凭证"""
+        self.socketio_test_client.emit('create_game')
+        created = self.socketio_test_client.get_received()[0]['args'][0]
+        guest = socketio.test_client(app)
+        guest.emit('join_game', {'game_id': created['game_id']})
+        joined = [m['args'][0] for m in guest.get_received() if m['name'] == 'joined_game'][0]
+        self.assertEqual(created['resume_token'], self.token_of(created['game_id'], 1))
+        self.assertEqual(joined['resume_token'], self.token_of(created['game_id'], 2))
+        self.assertTrue(joined['resume_token'].startswith('2.'))
+
+    def test_resume_after_disconnect(self):
+        """测试断线后用恢复凭证回到已开始游戏中的座位，并收到完整快照"""
+        game_id, clients = self.start_five_player_game()
+        game = games[game_id]
+        self.socketio_test_client.emit('propose_team', {'game_id': game_id, 'team': [1, 3]})
+        clients[2].emit('team_vote', {'game_id': game_id, 'player_id': 3, 'vote': False})
+        token = self.token_of(game_id, 3)
+        clients[2].disconnect()
+        self.assertNotIn(2, game_states[game_id]['connected_players'])
+        for client in clients:
+            if client is not clients[2]:
+                client.get_received()
+        
+        phone = socketio.test_client(app)
+        phone.emit('resume_session', {'game_id': game_id, 'token': token})
+        resumed = [m['args'][0] for m in phone.get_received() if m['name'] == 'session_resumed'][0]
+        self.assertEqual(resumed['player_id'], 3)
+        self.assertTrue(resumed['started'])
+        self.assertEqual(resumed['role_info']['role'], game.role_of(2))
+        self.assertEqual(resumed['role_info']['player_number'], 3)
+        self.assertEqual(resumed['state']['version'], game_states[game_id]['state_version'])
+        self.assertFalse(resumed['state']['delta'])
+        self.assertEqual(resumed['team'], [1, 3])
+        self.assertIs(resumed['team_vote'], False)
+        self.assertIsNone(resumed['quest_team'])
+        self.assertEqual(resumed['connected_players'], [1, 2, 3, 4, 5])
+        joined = [m['args'][0] for m in clients[1].get_received() if m['name'] == 'player_joined']
+        self.assertEqual(joined[0]['player_id'], 3)
+        
+        # 新连接可以继续投票并收到房间广播
+        phone.emit('team_vote', {'game_id': game_id, 'player_id': 3, 'vote': True})
+        self.assertIs(game.team_ballot.vote_of(2), True)
+        self.assertEqual(sid_index[self.sid_of(phone)], (game_id, 2))
+
+    def test_resume_reopens_empty_room(self):
+        """测试所有玩家断开后房间按结束状态计时，有玩家回来后恢复空闲超时"""
+        game_id, clients = self.start_five_player_game()
+        tokens = [self.token_of(game_id, number) for number in range(1, 6)]
+        for client in clients:
+            client.disconnect()
+        self.assertIn(game_id, app_module.room_reaper._finished)
+        phone = socketio.test_client(app)
+        phone.emit('resume_session', {'game_id': game_id, 'token': tokens[0]})
+        self.assertNotIn(game_id, app_module.room_reaper._finished)
+        evicted = sweep_rooms(now=time.monotonic() + app_module.ROOM_FINISHED_TTL + 1)
+        self.assertNotIn(game_id, [room for room, _ in evicted])
+        phone.disconnect()
+
+    def test_resume_takes_over_live_connection(self):
+        """测试旧连接尚未断开时恢复会话：旧连接不再绑定座位、不再收到广播"""
+        game_id, clients = self.start_five_player_game()
+        old = clients[3]
+        phone = socketio.test_client(app)
+        phone.emit('resume_session', {'game_id': game_id, 'token': self.token_of(game_id, 4)})
+        self.assertEqual(phone.get_received()[0]['name'], 'session_resumed')
+        old_sid = self.sid_of(old)
+        self.assertEqual(game_states[game_id]['player_sids'][3], self.sid_of(phone))
+        self.assertNotIn(old_sid, sid_index)
+        old.get_received()
+        self.socketio_test_client.emit('propose_team', {'game_id': game_id, 'team': [1, 2]})
+        self.assertEqual(old.get_received(), [])
+        self.assertEqual([m['name'] for m in phone.get_received()], ['team_proposed'])
+        # 旧连接之后断开不影响座位
+        old.disconnect()
+        self.assertIn(3, game_states[game_id]['connected_players'])
+
+    def test_resume_rejects_bad_token(self):
+        """测试错误的恢复凭证和不存在的房间"""
+        game_id, clients = self.start_five_player_game()
+        stranger = socketio.test_client(app)
+        for token in ('2.wrong', 'x.y', '9.' + rooms[game_id]['players'][0]['token'], ''):
+            stranger.emit('resume_session', {'game_id': game_id, 'token': token})
+            reply = stranger.get_received()[-1]
+            self.assertEqual(reply['name'], 'resume_failed')
+            self.assertEqual(reply['args'][0]['message'], '无效的恢复凭证')
+        stranger.emit('resume_session', {'game_id': '0000', 'token': self.token_of(game_id, 1)})
+        self.assertEqual(stranger.get_received()[-1]['args'][0]['message'], '游戏ID不存在')
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
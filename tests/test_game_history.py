@@ -0,0 +1,170 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import app, rooms, games, game_stats
+from helpers import start_five_player_game
+from avalon import AvalonGame
+from game_history import GameHistory, REJECTIONS, QUESTS_FAILED, MERLIN_KILLED, MERLIN_SURVIVED
+
+ROLES_5 = ["梅林", "派西维尔", "忠臣", "莫甘娜", "刺客"]
+
+
+def finished_game(player_count=5, roles=ROLES_5):
+    game = AvalonGame(player_count)
+    game.assign_roles(roles)
+    return game
+
+
+class TestGameHistory(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置"""
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'history.db')
+        self.history = GameHistory(self.path, flush_interval=60, cache_ttl=0)
+
+    def tearDown(self):
+        """测试后的清理"""
+        self.history.close()
+        self.dir.cleanup()
+
+    def test_aggregates(self):
+        """测试按角色和人数累加胜率、刺客命中率和否决失败次数"""
+        self.history.record('1001', finished_game(), MERLIN_KILLED, 0)
+        self.history.record('1002', finished_game(), MERLIN_SURVIVED, 1)
+        self.history.record('1003', finished_game(), REJECTIONS)
+        self.history.record('1004', finished_game(), MERLIN_SURVIVED)
+        self.history.flush()
+        stats = self.history.stats()
+        self.assertEqual(stats['games'], 4)
+        self.assertEqual(stats['good_win_rate'], 0.5)
+        self.assertEqual(stats['rejection_losses'], 1)
+        self.assertEqual(stats['assassin_hit_rate'], 0.5)
+        self.assertEqual(stats['roles']['忠臣'], {'games': 4, 'win_rate': 0.5})
+        self.assertEqual(stats['by_player_count'][5]['roles']['刺客'], {'games': 4, 'win_rate': 0.5})
+        self.assertEqual(self.history.batches, 1)
+
+    def test_persisted_across_reopen(self):
+        """测试聚合结果保存在数据库中，重新打开后继续累加"""
+        self.history.record('1001', finished_game(), QUESTS_FAILED)
+        self.history.close()
+        self.history = GameHistory(self.path, flush_interval=60, cache_ttl=0)
+        roles = ["梅林", "派西维尔", "忠臣", "忠臣", "莫甘娜", "刺客"]
+        self.history.record('1002', finished_game(6, roles), MERLIN_SURVIVED)
+        self.history.flush()
+        stats = self.history.stats()
+        self.assertEqual(stats['games'], 2)
+        self.assertEqual(stats['by_player_count'][5]['good_win_rate'], 0.0)
+        self.assertEqual(stats['by_player_count'][6]['good_win_rate'], 1.0)
+        self.assertIsNone(stats['assassin_hit_rate'])
+        self.assertEqual(stats['roles']['梅林'], {'games': 2, 'win_rate': 0.5})
+
+
+class TestStatsEndpoint(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置：使用临时的历史数据库"""
+        app.config['TESTING'] = True
+        rooms.clear()
+        games.clear()
+        self.dir = tempfile.TemporaryDirectory()
+        self.history = GameHistory(os.path.join(self.dir.name, 'history.db'), flush_interval=60, cache_ttl=0)
+        self.addCleanup(setattr, app_module, 'game_history', app_module.game_history)
+        app_module.game_history = self.history
+        self.clients = []
+
+    def tearDown(self):
+        """测试后的清理"""
+        for client in self.clients:
+            client.disconnect()
+        rooms.clear()
+        games.clear()
+        self.history.close()
+        self.dir.cleanup()
+
+    def test_rejection_loss_recorded(self):
+        """测试连续5次否决结束的游戏写入历史，并出现在统计中"""
+        game_id, game = self.start_game()
+        for _ in range(5):
+            self.clients[game.leader_index].emit('propose_team', {'game_id': game_id, 'team': [1, 2]})
+            for i, client in enumerate(self.clients):
+                client.emit('team_vote', {'game_id': game_id, 'player_id': i + 1, 'vote': False})
+        self.assertEqual(game.vote_track, 5)
+        self.history.flush()
+
+        with app.test_request_context('/stats/games'):
+            stats = game_stats().get_json()
+        self.assertEqual(stats['games'], 1)
+        self.assertEqual(stats['rejection_losses'], 1)
+        self.assertEqual(stats['good_win_rate'], 0.0)
+
+
+    def start_game(self):
+        game_id, self.clients = start_five_player_game()
+        return game_id, games[game_id]
+
+    def errors(self, client):
+        return [m['args'][0]['message'] for m in client.get_received() if m['name'] == 'error']
+
+    def test_assassination_checked_and_recorded_once(self):
+        """测试提前刺杀、非刺客刺杀和重复刺杀都被拒绝，对局只记录一次"""
+        game_id, game = self.start_game()
+        assassin = self.clients[game.assassin_index]
+        other = self.clients[(game.assassin_index + 1) % 5]
+        assassin.emit('assassinate', {'game_id': game_id, 'target': game.merlin_index + 1})
+        self.assertEqual(self.errors(assassin), ['现在不是刺杀阶段'])
+
+        game.quest_results = [True, True, True]
+        game.current_quest = 3
+        other.emit('assassinate', {'game_id': game_id, 'target': game.merlin_index + 1})
+        self.assertEqual(self.errors(other), ['只有刺客可以刺杀'])
+        target = next(i for i in range(5) if i not in (game.merlin_index, game.assassin_index))
+        assassin.emit('assassinate', {'game_id': game_id, 'target': target + 1})
+        self.assertEqual(self.errors(assassin), [])
+        assassin.emit('assassinate', {'game_id': game_id, 'target': game.merlin_index + 1})
+        self.assertEqual(self.errors(assassin), ['刺杀已经结束'])
+
+        self.history.flush()
+        stats = self.history.stats()
+        self.assertEqual(stats['games'], 1)
+        self.assertEqual(stats['good_win_rate'], 1.0)
+        self.assertEqual(stats['assassin_hit_rate'], 0.0)
+
+    def test_no_assassination_after_evil_wins(self):
+        """测试邪恶方破坏3次任务获胜后不能再刺杀，对局只记录一次"""
+        game_id, game = self.start_game()
+        for _ in range(3):
+            size = game.get_quest_requirement()
+            team = [game.assassin_index] + [i for i in range(5) if i != game.assassin_index][:size - 1]
+            self.clients[game.leader_index].emit('propose_team', {'game_id': game_id, 'team': [i + 1 for i in team]})
+            for i, client in enumerate(self.clients):
+                client.emit('team_vote', {'game_id': game_id, 'player_id': i + 1, 'vote': True})
+            for i in team:
+                self.clients[i].emit('quest_vote', {'game_id': game_id, 'player_id': i + 1,
+                                                    'vote': i != game.assassin_index})
+        self.assertEqual(game.quest_results, [False, False, False])
+        assassin = self.clients[game.assassin_index]
+        assassin.get_received()
+        assassin.emit('assassinate', {'game_id': game_id, 'target': game.merlin_index + 1})
+        self.assertEqual(self.errors(assassin), ['现在不是刺杀阶段'])
+
+        self.history.flush()
+        stats = self.history.stats()
+        self.assertEqual(stats['games'], 1)
+        self.assertEqual(stats['good_win_rate'], 0.0)
+        self.assertIsNone(stats['assassin_hit_rate'])
+
+    def test_finish_game_records_once(self):
+        """测试同一局重复结算只写入一次历史"""
+        game_id, game = self.start_game()
+        app_module.finish_game(game_id, REJECTIONS)
+        app_module.finish_game(game_id, REJECTIONS)
+        self.history.flush()
+        self.assertEqual(self.history.games_written, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_id import GameIdAllocator, GameIdSpaceExhausted
+
+class TestGameIdAllocator(unittest.TestCase):
+    def test_ids_are_unique(self):
+        """测试占满整个4位ID空间也不会重复"""
+        allocator = GameIdAllocator(digits=4, max_digits=4, seed=1)
+        ids = [allocator.allocate() for _ in range(9000)]
+        self.assertEqual(len(set(ids)), 9000)
+        self.assertTrue(all(len(i) == 4 for i in ids))
+        with self.assertRaises(GameIdSpaceExhausted):
+            allocator.allocate()
+
+    def test_release_recycles_ids(self):
+        """测试关闭房间后ID可以被复用"""
+        allocator = GameIdAllocator(digits=1, max_digits=1, seed=1)
+        ids = [allocator.allocate() for _ in range(9)]
+        self.assertTrue(allocator.release(ids[3]))
+        self.assertFalse(allocator.release(ids[3]))
+        self.assertEqual(allocator.allocate(), ids[3])
+
+    def test_widen_under_pressure(self):
+        """测试占用率超过阈值后使用更长的ID"""
+        allocator = GameIdAllocator(digits=1, max_digits=2, widen_threshold=0.5, seed=1)
+        ids = [allocator.allocate() for _ in range(10)]
+        self.assertEqual(sum(1 for i in ids if len(i) == 1), 5)
+        self.assertEqual(sum(1 for i in ids if len(i) == 2), 5)
+        self.assertEqual(allocator.stats()['digits'], [1, 2])
+
+    def test_reserve(self):
+        """测试恢复房间时占用指定ID"""
+        allocator = GameIdAllocator(digits=1, max_digits=1, seed=1)
+        self.assertTrue(allocator.reserve('5'))
+        self.assertFalse(allocator.reserve('5'))
+        ids = [allocator.allocate() for _ in range(8)]
+        self.assertNotIn('5', ids)
+        self.assertIn('5', allocator)
+
+    def test_stats(self):
+        """测试占用率和吞吐量指标"""
+        allocator = GameIdAllocator(digits=2, max_digits=2, seed=1)
+        for _ in range(45):
+            allocator.allocate()
+        stats = allocator.stats()
+        self.assertEqual(stats['in_use'], 45)
+        self.assertEqual(stats['capacity'], 90)
+        self.assertAlmostEqual(stats['occupancy'], 0.5)
+        self.assertEqual(stats['allocated_total'], 45)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import app, socketio, rooms, games, game_states, sid_index, resume_token
+from helpers import start_five_player_game
+from handoff import write_handoff, read_handoff, HandoffError
+
+
+class TestHandoffFile(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置"""
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'rooms.bin')
+
+    def tearDown(self):
+        """测试后的清理"""
+        self.dir.cleanup()
+
+    def test_round_trip(self):
+        """测试写入后读回相同的记录，不留下临时文件"""
+        records = {'1234': {'players': [1, 2], 'started': False, 'game': None}}
+        size = write_handoff(self.path, records)
+        self.assertEqual(size, os.path.getsize(self.path))
+        self.assertEqual(read_handoff(self.path), records)
+        self.assertEqual(os.listdir(self.dir.name), ['rooms.bin'])
+
+    def test_missing_and_corrupt(self):
+        """测试文件不存在时返回 None，损坏时抛出 HandoffError"""
+        self.assertIsNone(read_handoff(self.path))
+        write_handoff(self.path, {})
+        with open(self.path, 'r+b') as f:
+            f.seek(-2, os.SEEK_END)
+            f.write(b'\0\0')
+        with self.assertRaises(HandoffError):
+            read_handoff(self.path)
+
+
+class TestDrainAndRestore(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置：5名玩家开始游戏，队长提名，第2名玩家带序号投票"""
+        app.config['TESTING'] = True
+        rooms.clear()
+        games.clear()
+        self.dir = tempfile.TemporaryDirectory()
+        self.patch('HANDOFF_FILE', os.path.join(self.dir.name, 'rooms.bin'))
+        self.patch('draining', False)
+        self.game_id, self.clients = start_five_player_game()
+        game = games[self.game_id]
+        self.clients[game.leader_index].emit('propose_team', {'game_id': self.game_id, 'team': [1, 2]})
+        self.vote = {'game_id': self.game_id, 'player_id': 2, 'vote': True, 'seq': 7, 'round': 1}
+        self.clients[1].emit('team_vote', dict(self.vote))
+        for client in self.clients:
+            client.get_received()
+
+    def tearDown(self):
+        """测试后的清理"""
+        for client in self.clients:
+            client.disconnect()
+        rooms.clear()
+        games.clear()
+        self.dir.cleanup()
+
+    def patch(self, name, value):
+        self.addCleanup(setattr, app_module, name, getattr(app_module, name))
+        setattr(app_module, name, value)
+
+    def test_drain_rejects_new_work(self):
+        """测试排空后不再创建房间，也不再接受房间事件"""
+        self.assertEqual(app_module.drain(), 1)
+        self.clients[0].emit('create_game')
+        self.clients[2].emit('team_vote', {'game_id': self.game_id, 'player_id': 3, 'vote': True})
+        for client in (self.clients[0], self.clients[2]):
+            errors = [m for m in client.get_received() if m['name'] == 'error']
+            self.assertEqual(len(errors), 1)
+        self.assertEqual(list(rooms), [self.game_id])
+        self.assertIsNone(games[self.game_id].team_ballot.vote_of(2))
+
+    def test_new_process_resumes_seats(self):
+        """测试新进程从交接文件恢复房间，玩家重连后回到座位，重试的操作命中原来的回执"""
+        before = games[self.game_id].to_state()
+        tokens = [resume_token(i, p['token']) for i, p in enumerate(rooms[self.game_id]['players'])]
+        app_module.drain()
+        for client in self.clients:
+            client.disconnect()
+
+        # 模拟新进程：内存中的房间全部丢失，只剩交接文件
+        rooms.clear()
+        games.clear()
+        game_states.clear()
+        sid_index.clear()
+        app_module.draining = False
+        self.assertEqual(app_module.restore_handoff(), 1)
+        self.assertFalse(os.path.exists(app_module.HANDOFF_FILE))
+        self.assertEqual(games[self.game_id].to_state(), before)
+
+        self.clients = [socketio.test_client(app) for _ in range(5)]
+        for client, token in zip(self.clients, tokens):
+            client.emit('resume_session', {'game_id': self.game_id, 'token': token})
+        self.assertEqual(game_states[self.game_id]['connected_players'], set(range(5)))
+        resumed, = [m['args'][0] for m in self.clients[1].get_received() if m['name'] == 'session_resumed']
+        self.assertEqual((resumed['player_id'], resumed['team_vote']), (2, True))
+
+        self.clients[1].emit('team_vote', dict(self.vote))
+        acks = [m['args'][0] for m in self.clients[1].get_received() if m['name'] == 'action_ack']
+        self.assertEqual(acks, [{'seq': 7, 'event': 'team_vote', 'ok': True}])
+
+
+    def test_entry_point_restores_in_serving_process(self):
+        """测试服务入口在开始服务之前恢复交接文件、安装 SIGTERM 处理，并且不启用自动重载"""
+        app_module.drain()
+        rooms.clear()
+        games.clear()
+        game_states.clear()
+        sid_index.clear()
+        app_module.draining = False
+        calls = []
+        self.patch('install_drain_handler', lambda: calls.append('drain_handler'))
+        self.patch('restore_rooms', lambda: calls.append('restore_rooms'))
+        self.addCleanup(setattr, socketio, 'start_background_task', socketio.start_background_task)
+        socketio.start_background_task = lambda task: calls.append(task.__name__)
+
+        def run(app_, **kwargs):
+            calls.append('run')
+            self.assertIn(self.game_id, rooms)
+            self.assertFalse(os.path.exists(app_module.HANDOFF_FILE))
+            self.assertIs(kwargs['use_reloader'], False)
+
+        self.addCleanup(setattr, socketio, 'run', socketio.run)
+        socketio.run = run
+        app_module.main()
+        self.assertEqual(calls, ['restore_rooms', 'drain_handler', 'reap_rooms', 'spectator_loop',
+                                 'deadline_loop', 'run'])
+
+if __name__ == '__main__':
+    unittest.main()
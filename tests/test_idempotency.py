@@ -0,0 +1,114 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, socketio, rooms, games, game_states, resume_token
+from helpers import start_five_player_game
+from idempotency import AckWindow
+
+
+class TestAckWindow(unittest.TestCase):
+    def test_duplicates_and_stale(self):
+        """测试窗口内的序号返回回执，窗口外的旧序号视为过期"""
+        window = AckWindow(size=2)
+        self.assertFalse(window.is_stale(1))
+        window.put(1, 'a')
+        window.put(2, 'b')
+        window.put(3, 'c')
+        self.assertIsNone(window.get(1))
+        self.assertTrue(window.is_stale(1))
+        self.assertEqual(window.get(3), 'c')
+        self.assertFalse(window.is_stale(3))
+        self.assertFalse(window.is_stale(4))
+
+
+class TestIdempotentActions(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置：5名玩家开始游戏"""
+        app.config['TESTING'] = True
+        rooms.clear()
+        games.clear()
+        self.game_id, self.clients = start_five_player_game()
+
+    def tearDown(self):
+        """测试后的清理"""
+        for client in self.clients:
+            client.disconnect()
+        rooms.clear()
+        games.clear()
+
+    def leader(self):
+        return self.clients[games[self.game_id].leader_index]
+
+    def acks(self, client):
+        return [m['args'][0] for m in client.get_received() if m['name'] == 'action_ack']
+
+    def test_duplicate_returns_cached_ack(self):
+        """测试重复的序号不再执行，只返回当时的回执，也不再广播"""
+        leader = self.leader()
+        other = next(client for client in self.clients if client is not leader)
+        data = {'game_id': self.game_id, 'team': [1, 2], 'seq': 1, 'round': 0}
+        leader.emit('propose_team', dict(data))
+        first = self.acks(leader)
+        self.assertEqual(first, [{'seq': 1, 'event': 'propose_team', 'ok': True}])
+        other.get_received()
+
+        leader.emit('propose_team', dict(data))
+        self.assertEqual(self.acks(leader), first)
+        self.assertEqual(len(games[self.game_id].history), 1)
+        self.assertEqual(other.get_received(), [])
+
+    def test_old_sequence_rejected(self):
+        """测试比窗口中所有序号都旧的序号被拒绝"""
+        client = self.clients[0]
+        self.leader().emit('propose_team', {'game_id': self.game_id, 'team': [1, 2]})
+        client.get_received()
+        client.emit('team_vote', {'game_id': self.game_id, 'player_id': 1, 'vote': True, 'seq': 5, 'round': 1})
+        client.emit('team_vote', {'game_id': self.game_id, 'player_id': 1, 'vote': False, 'seq': 4, 'round': 1})
+        acks = self.acks(client)
+        self.assertEqual([ack['ok'] for ack in acks], [True, False])
+        self.assertTrue(games[self.game_id].team_ballot.vote_of(0))
+
+    def test_vote_for_old_round_rejected(self):
+        """测试任务结束后迟到的任务投票（旧轮次）不会计入下一轮"""
+        self.leader().emit('propose_team', {'game_id': self.game_id, 'team': [1, 2]})
+        for i, client in enumerate(self.clients):
+            client.emit('team_vote', {'game_id': self.game_id, 'player_id': i + 1, 'vote': True})
+        for number in (1, 2):
+            self.clients[number - 1].emit('quest_vote', {
+                'game_id': self.game_id, 'player_id': number, 'vote': True, 'seq': 10, 'round': 1})
+        self.assertEqual(games[self.game_id].current_quest, 1)
+
+        # 下一轮提名了同样的队员；上一轮的重试（新序号，旧轮次）被拒绝
+        self.leader().emit('propose_team', {'game_id': self.game_id, 'team': [1, 2, 3]})
+        for i, client in enumerate(self.clients):
+            client.emit('team_vote', {'game_id': self.game_id, 'player_id': i + 1, 'vote': True})
+        client = self.clients[0]
+        client.get_received()
+        client.emit('quest_vote', {'game_id': self.game_id, 'player_id': 1, 'vote': False, 'seq': 11, 'round': 1})
+        ack, = self.acks(client)
+        self.assertFalse(ack['ok'])
+        self.assertEqual(games[self.game_id].quest_ballot.votes(), {})
+
+    def test_retry_after_resume(self):
+        """测试断线后用新连接回到座位重试，命中原来的回执"""
+        self.leader().emit('propose_team', {'game_id': self.game_id, 'team': [1, 2]})
+        data = {'game_id': self.game_id, 'player_id': 2, 'vote': True, 'seq': 3, 'round': 1}
+        self.clients[1].emit('team_vote', dict(data))
+        token = resume_token(1, rooms[self.game_id]['players'][1]['token'])
+        self.clients[1].disconnect()
+
+        self.clients[1] = socketio.test_client(app)
+        self.clients[1].emit('resume_session', {'game_id': self.game_id, 'token': token})
+        resumed, = [m['args'][0] for m in self.clients[1].get_received() if m['name'] == 'session_resumed']
+        self.assertEqual(resumed['round'], 1)
+        self.clients[1].emit('team_vote', dict(data))
+        self.assertEqual(self.acks(self.clients[1]), [{'seq': 3, 'event': 'team_vote', 'ok': True}])
+        self.assertEqual(len(game_states[self.game_id]['acks'][1].acks), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
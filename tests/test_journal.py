@@ -0,0 +1,141 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import app, socketio, rooms, games, game_states, restore_rooms
+from journal import Journal
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = Journal(self.tmp.name, fsync_interval=60)
+
+    def tearDown(self):
+        """测试后的清理"""
+        self.journal.close()
+        self.tmp.cleanup()
+
+    def test_append_and_load(self):
+        """测试事件按顺序写入并读回"""
+        self.journal.append('1000', {'e': 'create'})
+        self.journal.append('1000', {'e': 'join', 'p': 1})
+        self.journal.append('2000', {'e': 'create'})
+        self.journal.flush()
+        loaded = self.journal.load_all()
+        self.assertEqual(loaded['1000'], (None, [{'e': 'create'}, {'e': 'join', 'p': 1}]))
+        self.assertEqual(loaded['2000'], (None, [{'e': 'create'}]))
+        self.assertEqual(self.journal.fsyncs, 2)
+
+    def test_snapshot_truncates_log(self):
+        """测试快照之后只保留新的事件"""
+        self.journal.append('1000', {'e': 'create'})
+        self.journal.snapshot('1000', {'players': [1]})
+        self.journal.append('1000', {'e': 'join', 'p': 1})
+        self.journal.flush()
+        self.assertEqual(self.journal.load_all()['1000'], ({'players': [1]}, [{'e': 'join', 'p': 1}]))
+
+    def test_torn_record_ignored(self):
+        """测试崩溃时写了一半的最后一条记录被忽略"""
+        self.journal.append('1000', {'e': 'create'})
+        self.journal.flush()
+        with open(os.path.join(self.tmp.name, '1000.log'), 'a') as f:
+            f.write('{"e":"jo')
+        self.assertEqual(self.journal.load_all()['1000'], (None, [{'e': 'create'}]))
+
+    def test_remove(self):
+        """测试关闭房间后删除日志"""
+        self.journal.append('1000', {'e': 'create'})
+        self.journal.snapshot('1000', {})
+        self.journal.remove('1000')
+        self.journal.flush()
+        self.assertEqual(self.journal.load_all(), {})
+
+class TestRestoreRooms(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置"""
+        app.config['TESTING'] = True
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = Journal(self.tmp.name, fsync_interval=60)
+        app_module.journal = self.journal
+        rooms.clear()
+        games.clear()
+
+    def tearDown(self):
+        """测试后的清理"""
+        app_module.journal = None
+        self.journal.close()
+        self.tmp.cleanup()
+        rooms.clear()
+        games.clear()
+
+    def play_until_first_quest(self):
+        host = socketio.test_client(app)
+        host.emit('create_game')
+        game_id = host.get_received()[0]['args'][0]['game_id']
+        clients = [host] + [socketio.test_client(app) for _ in range(4)]
+        for client in clients[1:]:
+            client.emit('join_game', {'game_id': game_id})
+        host.emit('start_game_manual', {'game_id': game_id})
+        host.emit('propose_team', {'game_id': game_id, 'team': [1, 2]})
+        for i, client in enumerate(clients):
+            client.emit('team_vote', {'game_id': game_id, 'player_id': i + 1, 'vote': True})
+        host.emit('quest_vote', {'game_id': game_id, 'player_id': 1, 'vote': True})
+        return game_id, clients
+
+    def assert_restored(self, game_id):
+        expected = games[game_id].to_state()
+        expected_players = [p['number'] for p in rooms[game_id]['players']]
+        self.journal.flush()
+        rooms.clear()
+        games.clear()
+        game_states.pop(game_id)
+        
+        self.assertGreaterEqual(restore_rooms(), 1)
+        self.assertEqual(games[game_id].to_state(), expected)
+        self.assertEqual([p['number'] for p in rooms[game_id]['players']], expected_players)
+        self.assertTrue(rooms[game_id]['started'])
+        self.assertEqual(games[game_id].quest_ballot.votes(), {0: True})
+        self.assertEqual(game_states[game_id]['connected_players'], set())
+
+    def test_restore_from_events(self):
+        """测试只用日志记录回放恢复房间"""
+        game_id, _ = self.play_until_first_quest()
+        self.assertEqual(games[game_id].quest_ballot.votes(), {0: True})
+        self.assert_restored(game_id)
+
+    def test_restore_from_snapshot(self):
+        """测试快照加上之后的日志记录恢复房间"""
+        app_module.JOURNAL_SNAPSHOT_EVERY = 7
+        try:
+            game_id, _ = self.play_until_first_quest()
+        finally:
+            app_module.JOURNAL_SNAPSHOT_EVERY = 50
+        self.journal.flush()
+        snapshot, events = self.journal.load_all()[game_id]
+        self.assertIsNotNone(snapshot)
+        self.assertEqual(len(events), 13 % 7)  # 创建、4次加入、开始、提议、5次投票、1次任务投票
+        self.assert_restored(game_id)
+
+    def test_resume_after_restore(self):
+        """测试恢复后的房间中玩家用原来的凭证回到座位，看到进行中的任务和自己的投票"""
+        game_id, _ = self.play_until_first_quest()
+        token = app_module.resume_token(0, rooms[game_id]['players'][0]['token'])
+        self.assert_restored(game_id)
+        
+        phone = socketio.test_client(app)
+        phone.emit('resume_session', {'game_id': game_id, 'token': token})
+        resumed = phone.get_received()[0]
+        self.assertEqual(resumed['name'], 'session_resumed')
+        self.assertEqual(resumed['args'][0]['quest_team'], [1, 2])
+        self.assertIs(resumed['args'][0]['quest_vote'], True)
+        self.assertEqual(resumed['args'][0]['connected_players'], [1])
+        self.assertEqual(resumed['args'][0]['state']['version'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
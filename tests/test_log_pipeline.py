@@ -0,0 +1,100 @@
+import unittest
+import sys
+import os
+import io
+import json
+import logging
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_pipeline import LogPipeline, SamplingFilter
+
+
+class Unprintable:
+    """格式化时计数，用于检查是否延迟格式化"""
+    formatted = 0
+
+    def __str__(self):
+        Unprintable.formatted += 1
+        return 'value'
+
+
+class TestLogPipeline(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置"""
+        self.stream = io.StringIO()
+        self.logger = logging.getLogger(f"test.pipeline.{self._testMethodName}")
+        self.logger.propagate = False
+        Unprintable.formatted = 0
+
+    def tearDown(self):
+        """测试后的清理"""
+        self.pipeline.stop()
+        self.logger.handlers.clear()
+
+    def start(self, **kwargs):
+        self.pipeline = LogPipeline(stream=self.stream, **kwargs).install(self.logger)
+        self.pipeline.capture(self.logger)
+
+    def lines(self):
+        self.pipeline.flush()
+        return self.stream.getvalue().splitlines()
+
+    def test_lazy_formatting(self):
+        """测试低于输出级别的记录不会被格式化"""
+        self.start(level='INFO')
+        for _ in range(10):
+            self.logger.debug("state %s", Unprintable(), extra={'room': '1000'})
+        self.logger.info("state %s", Unprintable())
+        lines = self.lines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].endswith('state value'))
+        self.assertEqual(Unprintable.formatted, 1)
+
+    def test_ring_dumped_on_error(self):
+        """测试房间出错时先写出该房间缓冲的调试记录"""
+        self.start(level='INFO', ring_size=3)
+        for i in range(5):
+            self.logger.debug("step %d", i, extra={'room': '1000'})
+        self.logger.debug("other room", extra={'room': '2000'})
+        self.logger.info("visible", extra={'room': '1000'})
+        self.logger.error("failed", extra={'room': '1000'})
+        lines = self.lines()
+        self.assertEqual([line.split(': ', 1)[1] for line in lines],
+                         ['visible', 'step 3', 'step 4', 'failed'])
+        self.assertIn('room=1000', lines[-1])
+        self.assertEqual(self.pipeline.ring.dumps, 1)
+
+    def test_without_ring(self):
+        """测试关闭环形缓冲区后调试调用在 isEnabledFor 处返回"""
+        self.start(level='INFO', ring_size=0)
+        self.assertFalse(self.logger.isEnabledFor(logging.DEBUG))
+        self.logger.error("failed", extra={'room': '1000'})
+        self.assertEqual(len(self.lines()), 1)
+
+    def test_json_format(self):
+        """测试 JSON 格式的输出，异常信息在调用方线程中展开"""
+        self.start(level='DEBUG', fmt='json')
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            self.logger.exception("failed %s", 'here', extra={'room': '1000'})
+        entry = json.loads(self.lines()[0])
+        self.assertEqual(entry['msg'], 'failed here')
+        self.assertEqual(entry['room'], '1000')
+        self.assertIn('RuntimeError: boom', entry['exc'])
+
+    def test_sampling(self):
+        """测试调试记录按比例采样，其他级别不受影响"""
+        values = iter([0.1, 0.9, 0.1, 0.9])
+        sampler = SamplingFilter(0.5, rng=lambda: next(values))
+        debug = logging.LogRecord('x', logging.DEBUG, '', 0, 'm', (), None)
+        info = logging.LogRecord('x', logging.INFO, '', 0, 'm', (), None)
+        self.assertEqual([sampler.filter(debug) for _ in range(4)], [True, False, True, False])
+        self.assertTrue(sampler.filter(info))
+        self.pipeline = LogPipeline(stream=self.stream)
+
+
+if __name__ == '__main__':
+    unittest.main()
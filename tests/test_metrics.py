@@ -0,0 +1,115 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, socketio, rooms, games, metrics_endpoint
+from metrics import Registry, CountingJSON
+
+
+def sample(text, series):
+    """从 Prometheus 文本中取出某个序列的值"""
+    for line in text.splitlines():
+        if line.startswith(series + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+class TestRegistry(unittest.TestCase):
+    def test_render(self):
+        """测试计数器、直方图和仪表的文本格式"""
+        registry = Registry()
+        counter = registry.counter('c_total', 'A counter', 'event')
+        histogram = registry.histogram('h_seconds', 'A histogram', 'event', buckets=(0.1, 1.0))
+        registry.gauge('g', 'A gauge', lambda: 7)
+        counter.inc('a')
+        counter.inc('a', 2)
+        counter.inc('say "hi"')
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, 'x')
+        text = registry.render()
+        self.assertIn('# TYPE c_total counter', text)
+        self.assertEqual(sample(text, 'c_total{event="a"}'), 3)
+        self.assertEqual(sample(text, 'c_total{event="say \\"hi\\""}'), 1)
+        self.assertEqual(sample(text, 'h_seconds_bucket{event="x",le="0.1"}'), 2)
+        self.assertEqual(sample(text, 'h_seconds_bucket{event="x",le="1.0"}'), 3)
+        self.assertEqual(sample(text, 'h_seconds_bucket{event="x",le="+Inf"}'), 4)
+        self.assertEqual(sample(text, 'h_seconds_count{event="x"}'), 4)
+        self.assertAlmostEqual(sample(text, 'h_seconds_sum{event="x"}'), 3.65)
+        self.assertEqual(sample(text, 'g'), 7)
+
+    def test_timed(self):
+        """测试装饰器记录耗时，异常时同样记录"""
+        histogram = Registry().histogram('h', 'h', 'function')
+
+        @histogram.time('fail')
+        def fail():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            fail()
+        self.assertEqual(histogram.count('fail'), 1)
+
+    def test_counting_json(self):
+        """测试编码字节数的统计"""
+        counting = CountingJSON()
+        data = counting.dumps({'a': 1}, separators=(',', ':'))
+        self.assertEqual(counting.encoded_bytes, len(data))
+        self.assertEqual(counting.loads(data), {'a': 1})
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置"""
+        app.config['TESTING'] = True
+        rooms.clear()
+        games.clear()
+
+    def scrape(self):
+        with app.test_request_context('/metrics'):
+            response = metrics_endpoint()
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        return response.get_data(as_text=True)
+
+    def test_handlers_and_fanout(self):
+        """测试处理函数耗时、房间仪表和广播扇出"""
+        before = self.scrape()
+        host = socketio.test_client(app)
+        host.emit('create_game')
+        game_id = host.get_received()[0]['args'][0]['game_id']
+        guests = [socketio.test_client(app) for _ in range(4)]
+        for guest in guests:
+            guest.emit('join_game', {'game_id': game_id})
+        host.emit('start_game_manual', {'game_id': game_id})
+        text = self.scrape()
+
+        def delta(series):
+            return (sample(text, series) or 0) - (sample(before, series) or 0)
+
+        self.assertEqual(delta('awalong_handler_seconds_count{event="join_game"}'), 4)
+        self.assertEqual(delta('awalong_handler_seconds_count{event="create_game"}'), 1)
+        self.assertEqual(delta('awalong_function_seconds_count{function="start_game"}'), 1)
+        self.assertEqual(sample(text, 'awalong_rooms'), 1)
+        self.assertEqual(sample(text, 'awalong_games_started'), 1)
+        self.assertEqual(sample(text, 'awalong_seats'), 5)
+        # 第4个加入的玩家广播给房间中的5个人
+        self.assertEqual(delta('awalong_emit_total{event="player_joined"}'), 4)
+        self.assertEqual(delta('awalong_emit_recipients_total{event="player_joined"}'), 2 + 3 + 4 + 5)
+        self.assertGreater(delta('awalong_emit_payload_bytes_total{event="player_joined"}'), 0)
+        self.assertGreater(delta('awalong_emit_sent_bytes_total{event="player_joined"}'),
+                           delta('awalong_emit_payload_bytes_total{event="player_joined"}'))
+
+    def test_error_counted(self):
+        """测试处理函数抛出的异常按事件计数"""
+        before = sample(self.scrape(), 'awalong_handler_errors_total{event="team_vote"}') or 0
+        client = socketio.test_client(app)
+        client.emit('team_vote', {'game_id': '1234'})  # 缺少 vote 字段
+        self.assertEqual(client.get_received()[-1]['args'][0]['message'], '发生错误，请重试')
+        after = sample(self.scrape(), 'awalong_handler_errors_total{event="team_vote"}')
+        self.assertEqual(after, before + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
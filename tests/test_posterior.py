@@ -0,0 +1,183 @@
+import unittest
+import sys
+import os
+import itertools
+import random
+from math import comb
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, games
+from helpers import start_five_player_game
+from avalon import AvalonGame
+from posterior import BehaviourModel, RolePosterior, worlds
+
+
+def brute_force(player_count, history, model):
+    """逐个完整角色分配直接计算似然，作为对照"""
+    roles = AvalonGame.roles[player_count]
+    seen = AvalonGame.VISIBLE_ROLES[AvalonGame.MERLIN]
+    evil_total = [0.0] * player_count
+    merlin_total = [0.0] * player_count
+    for assignment in set(itertools.permutations(roles)):
+        codes = [AvalonGame.ROLE_CODES[r] for r in assignment]
+        evil = {i for i, c in enumerate(codes) if AvalonGame.EVIL_ROLES >> c & 1}
+        visible = {i for i, c in enumerate(codes) if seen >> c & 1}
+        merlin = codes.index(AvalonGame.MERLIN)
+        weight = 1.0
+        for leader, team, yes_mask, fails in history:
+            k = len(team)
+            if leader in evil:
+                clean = comb(player_count - len(evil), k)
+                weight *= (model.evil_leader_bias / (comb(player_count, k) - clean)
+                           if evil & set(team) else (1 - model.evil_leader_bias) / clean)
+            else:
+                weight /= comb(player_count, k)
+            if yes_mask is not None:
+                for seat in range(player_count):
+                    if seat in evil:
+                        p = model.evil_approve[0 if evil & set(team) else 1]
+                    elif seat == merlin:
+                        p = model.merlin_approve[0 if visible & set(team) else 1]
+                    else:
+                        p = model.good_approve
+                    weight *= p if yes_mask >> seat & 1 else 1 - p
+            if fails is not None:
+                on_team = len(evil & set(team))
+                if fails > on_team:
+                    weight = 0.0
+                else:
+                    weight *= (comb(on_team, fails) * model.fail_prob ** fails
+                               * (1 - model.fail_prob) ** (on_team - fails))
+        for i in evil:
+            evil_total[i] += weight
+        merlin_total[merlin] += weight
+    total = sum(merlin_total)
+    return [w / total for w in evil_total], [w / total for w in merlin_total]
+
+
+def random_history(player_count, rounds, seed):
+    rng = random.Random(seed)
+    game = AvalonGame(player_count)
+    game.assign_roles()
+    for _ in range(rounds):
+        if game.check_game_state()[0] or game.vote_track >= 5:
+            break
+        game.propose_team(game.leader_index, rng.sample(range(player_count), game.get_quest_requirement()))
+        if game.team_vote([rng.random() < 0.6 for _ in range(player_count)]):
+            game.quest_vote([not game.evil_mask >> i & 1 or rng.random() < 0.2 for i in game.quest_team])
+    return game
+
+
+class TestRolePosterior(unittest.TestCase):
+    def test_world_counts(self):
+        """测试世界数：邪恶方座位 × 梅林座位 × 梅林看不到的邪恶方座位"""
+        self.assertEqual(len(worlds(5)), comb(5, 2) * 3)
+        self.assertEqual(len(worlds(7)), comb(7, 3) * 4 * 3)
+        self.assertEqual(len(worlds(10)), comb(10, 4) * 6 * comb(4, 2))
+
+    def test_prior(self):
+        """测试没有记录时每个座位的概率相同"""
+        posterior = RolePosterior(8)
+        for p in posterior.evil_probabilities():
+            self.assertAlmostEqual(p, 3 / 8)
+        for p in posterior.merlin_probabilities():
+            self.assertAlmostEqual(p, 1 / 8)
+
+    def test_fails_prune_worlds(self):
+        """测试失败票数排除队伍中邪恶方不足的世界"""
+        posterior = RolePosterior(5)
+        posterior.observe_quest([0, 1], 2)
+        self.assertEqual(posterior.world_count, 3)
+        self.assertEqual(posterior.evil_probabilities(), [1.0, 1.0, 0.0, 0.0, 0.0])
+
+    def test_matches_brute_force(self):
+        """测试与逐个完整角色分配计算的结果一致"""
+        model = BehaviourModel()
+        for player_count, seed in ((5, 1), (7, 2), (7, 3)):
+            game = random_history(player_count, 6, seed)
+            posterior = RolePosterior.from_game(game, model)
+            evil, merlin = brute_force(player_count, game.history, model)
+            for a, b in zip(posterior.evil_probabilities() + posterior.merlin_probabilities(), evil + merlin):
+                self.assertAlmostEqual(a, b)
+
+    def test_incremental_sync(self):
+        """测试逐个事件同步与一次性计算的结果相同，重复同步不再计入"""
+        game = AvalonGame(10)
+        game.assign_roles()
+        incremental = RolePosterior(10)
+        rng = random.Random(5)
+        for _ in range(4):
+            game.propose_team(game.leader_index, rng.sample(range(10), game.get_quest_requirement()))
+            incremental.sync(game.history)
+            for seat in range(10):
+                game.cast_team_vote(seat, seat % 3 != 0)
+                incremental.sync(game.history)
+            if game.quest_ballot is not None:
+                for seat in game.quest_team:
+                    game.cast_quest_vote(seat, not game.evil_mask >> seat & 1)
+                incremental.sync(game.history)
+        events = incremental.events
+        incremental.sync(game.history)
+        self.assertEqual(incremental.events, events)
+        scratch = RolePosterior.from_game(game)
+        self.assertEqual(scratch.events, events)
+        for a, b in zip(incremental.evil_probabilities(), scratch.evil_probabilities()):
+            self.assertAlmostEqual(a, b)
+
+    def test_history_survives_state_round_trip(self):
+        """测试公开记录随紧凑状态保存和恢复"""
+        game = random_history(7, 4, 7)
+        restored = AvalonGame.from_state(game.to_state())
+        self.assertEqual(restored.history, game.history)
+        self.assertTrue(all(entry[2] is not None for entry in game.history))
+
+
+class TestRoleProbabilitiesEvent(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置"""
+        app.config['TESTING'] = True
+        self.game_id, self.clients = start_five_player_game()
+
+    def reply(self, client):
+        return [m for m in client.get_received() if m['name'] in ('role_probabilities', 'error')][-1]
+
+    def test_only_after_game_over(self):
+        """测试游戏结束前拒绝，连续5次否决后返回每个座位的概率"""
+        observer = self.clients[1]
+        observer.emit('request_role_probabilities', {'game_id': self.game_id})
+        self.assertEqual(self.reply(observer)['name'], 'error')
+
+        for _ in range(5):
+            game = games[self.game_id]
+            self.clients[game.leader_index].emit('propose_team', {'game_id': self.game_id, 'team': [1, 2]})
+            for i, client in enumerate(self.clients):
+                client.emit('team_vote', {'game_id': self.game_id, 'player_id': i + 1, 'vote': False})
+        observer.emit('request_role_probabilities', {'game_id': self.game_id})
+        reply = self.reply(observer)
+        self.assertEqual(reply['name'], 'role_probabilities')
+        players = reply['args'][0]['players']
+        self.assertEqual([p['player_id'] for p in players], [1, 2, 3, 4, 5])
+        self.assertAlmostEqual(sum(p['evil'] for p in players), 2, places=2)
+        self.assertAlmostEqual(sum(p['merlin'] for p in players), 1, places=2)
+
+    def test_refused_during_assassination(self):
+        """测试正义方完成3次任务后、刺杀结算前，刺客不能查看推断（会暴露梅林）"""
+        game = games[self.game_id]
+        game.quest_results = [True, True, True]
+        game.current_quest = 3
+        assassin = self.clients[game.assassin_index]
+        assassin.emit('request_role_probabilities', {'game_id': self.game_id})
+        reply = self.reply(assassin)
+        self.assertEqual(reply['name'], 'error')
+        self.assertEqual(reply['args'][0]['message'], '游戏结束后才能查看推断')
+
+        target = next(i for i in range(5) if i not in (game.merlin_index, game.assassin_index))
+        assassin.emit('assassinate', {'game_id': self.game_id, 'target': target + 1})
+        assassin.emit('request_role_probabilities', {'game_id': self.game_id})
+        self.assertEqual(self.reply(assassin)['name'], 'role_probabilities')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import app, socketio, rooms, games, game_states, throttled_events, duplicate_votes, dropped_frames
+from helpers import start_five_player_game
+from rate_limit import RateLimiter
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置"""
+        self.now = 0.0
+        self.limiter = RateLimiter(2, 3, clock=lambda: self.now)
+
+    def test_burst_then_refill(self):
+        """测试突发用完后按速率补充令牌"""
+        self.assertEqual([self.limiter.allow('a') for _ in range(4)], [True, True, True, False])
+        self.now = 0.5
+        self.assertTrue(self.limiter.allow('a'))
+        self.assertFalse(self.limiter.allow('a'))
+        self.now = 10
+        self.assertEqual([self.limiter.allow('a') for _ in range(4)], [True, True, True, False])
+
+    def test_keys_independent(self):
+        """测试不同的键各自计数，forget 后重新开始"""
+        for _ in range(3):
+            self.limiter.allow('a')
+        self.assertTrue(self.limiter.allow('b'))
+        self.assertFalse(self.limiter.allow('a'))
+        self.limiter.forget('a')
+        self.assertTrue(self.limiter.allow('a'))
+        self.assertEqual(len(self.limiter), 2)
+
+    def test_disabled(self):
+        """测试速率为 0 时不限制"""
+        limiter = RateLimiter(0, 0)
+        self.assertTrue(all(limiter.allow('a') for _ in range(100)))
+
+
+class TestFloodProtection(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置：5名玩家开始游戏并提名队伍"""
+        app.config['TESTING'] = True
+        rooms.clear()
+        games.clear()
+        self.game_id, self.clients = start_five_player_game()
+        game = games[self.game_id]
+        self.clients[game.leader_index].emit('propose_team', {'game_id': self.game_id, 'team': [1, 2]})
+        for client in self.clients:
+            client.get_received()
+
+    def tearDown(self):
+        """测试后的清理"""
+        for client in self.clients:
+            client.disconnect()
+        rooms.clear()
+        games.clear()
+
+    def patch(self, name, value):
+        self.addCleanup(setattr, app_module, name, getattr(app_module, name))
+        setattr(app_module, name, value)
+
+    def vote(self, number, vote=True):
+        self.clients[number - 1].emit('team_vote', {'game_id': self.game_id, 'player_id': number, 'vote': vote})
+
+    def test_flood_throttled_with_one_notice(self):
+        """测试超出连接限流的事件不执行，连续被拒绝只收到一次提示"""
+        self.patch('sid_limiter', RateLimiter(1, 3, clock=lambda: 0.0))
+        before = throttled_events.values['team_vote']
+        for i in range(10):
+            self.vote(1, i % 2 == 0)
+        self.assertEqual(throttled_events.values['team_vote'] - before, 7)
+        errors = [m for m in self.clients[0].get_received() if m['name'] == 'error']
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(games[self.game_id].team_ballot.vote_of(0))
+
+    def test_room_limit(self):
+        """测试同一房间内所有连接共享房间限流"""
+        self.patch('room_limiter', RateLimiter(1, 2, clock=lambda: 0.0))
+        for number in range(1, 6):
+            self.vote(number)
+        self.assertEqual(games[self.game_id].team_ballot.votes(), {0: True, 1: True})
+
+    def test_repeated_vote_ignored(self):
+        """测试重复提交相同的票不记录也不写入，改票仍然生效"""
+        self.vote(1)
+        game_states[self.game_id].pop('dirty', None)
+        before = duplicate_votes.values['team_vote']
+        self.vote(1)
+        self.assertEqual(duplicate_votes.values['team_vote'] - before, 1)
+        self.assertNotIn('dirty', game_states[self.game_id])
+        self.vote(1, False)
+        self.assertFalse(games[self.game_id].team_ballot.vote_of(0))
+
+    def test_slow_connection_skips_game_state(self):
+        """测试发送积压过多的连接不再收到 game_state，合并帧中的其他事件照常收到"""
+        slow = socketio.test_client(app, auth={'batch': True})
+        self.clients.append(slow)
+        slow_eio = slow.eio_sid
+        # 第6个连接作为观察者加入玩家房间
+        slow_sid = socketio.server.manager.sid_from_eio_sid(slow_eio, '/')
+        socketio.server.enter_room(slow_sid, self.game_id)
+        socketio.server.enter_room(slow_sid, f"{self.game_id}:batch")
+        self.patch('eio_backlog', lambda eio_sid: 1000 if eio_sid == slow_eio else 0)
+
+        before = dropped_frames.values['game_state']
+        for number in range(1, 6):
+            self.vote(number, False)
+        frames = slow.get_received()
+        self.assertEqual(len(frames), 1)
+        self.assertEqual([name for name, _ in frames[0]['args'][0]], ['team_vote_result'])
+        self.assertEqual(dropped_frames.values['game_state'] - before, 1)
+        names = [m['name'] for m in self.clients[0].get_received()]
+        self.assertEqual(names[-2:], ['team_vote_result', 'game_state'])
+
+    def test_slow_connection_receives_requested_snapshot(self):
+        """测试慢连接请求的完整快照是直接回复，不会因为发送积压被丢弃"""
+        slow = self.clients[1]
+        self.patch('eio_backlog', lambda eio_sid: 1000 if eio_sid == slow.eio_sid else 0)
+        self.vote(1, False)
+        slow.get_received()
+
+        before = dropped_frames.values['game_state']
+        slow.emit('request_game_state', {'game_id': self.game_id})
+        states = [m['args'][0] for m in slow.get_received() if m['name'] == 'game_state']
+        self.assertEqual(len(states), 1)
+        self.assertFalse(states[0]['delta'])
+        self.assertEqual(states[0]['version'], game_states[self.game_id]['state_version'])
+        self.assertEqual(dropped_frames.values['game_state'], before)
+
+
+if __name__ == '__main__':
+    unittest.main()
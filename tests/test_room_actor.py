@@ -0,0 +1,61 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engineio
+from room_actor import RoomScheduler, MailboxFull
+
+class TestRoomScheduler(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置"""
+        self.server = engineio.Server(async_mode='gevent')
+        self.scheduler = RoomScheduler(self.server, mailbox_size=4)
+
+    def test_events_in_same_room_run_in_order(self):
+        """测试同一房间的事件按投递顺序执行"""
+        order = []
+        envelopes = [self.scheduler.submit('1000', order.append, i) for i in range(2)]
+        self.scheduler.call('1000', order.append, 2)
+        for envelope in envelopes:
+            self.assertTrue(envelope.done.is_set())
+        self.assertEqual(order, [0, 1, 2])
+
+    def test_rooms_have_independent_actors(self):
+        """测试不同房间由不同的 actor 处理"""
+        self.scheduler.call('1000', lambda: None)
+        self.scheduler.call('2000', lambda: None)
+        self.assertEqual(len(self.scheduler), 2)
+        self.assertIsNot(self.scheduler.actor('1000'), self.scheduler.actor('2000'))
+
+    def test_mailbox_full(self):
+        """测试邮箱满时拒绝新事件"""
+        for _ in range(4):
+            self.scheduler.submit('1000', lambda: None)
+        with self.assertRaises(MailboxFull):
+            self.scheduler.submit('1000', lambda: None)
+
+    def test_call_propagates_errors(self):
+        """测试处理函数的异常会传递给调用方"""
+        def fail():
+            raise ValueError("boom")
+        with self.assertRaises(ValueError):
+            self.scheduler.call('1000', fail)
+        # actor 在异常后仍然可用
+        self.assertEqual(self.scheduler.call('1000', lambda: 42), 42)
+
+    def test_nested_call_runs_inline(self):
+        """测试 actor 内部的嵌套调用不会死锁"""
+        result = self.scheduler.call('1000', lambda: self.scheduler.call('1000', lambda: 'inner'))
+        self.assertEqual(result, 'inner')
+
+    def test_close(self):
+        """测试关闭房间后移除 actor"""
+        self.scheduler.call('1000', lambda: None)
+        self.scheduler.close('1000')
+        self.assertEqual(len(self.scheduler), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_reaper import RoomReaper
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestRoomReaper(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置"""
+        self.clock = FakeClock()
+        self.reaper = RoomReaper(idle_ttl=100, finished_ttl=10, max_rooms=3, clock=self.clock)
+
+    def test_idle_rooms_expire(self):
+        """测试空闲超时的房间被回收"""
+        self.reaper.touch('1000')
+        self.clock.now = 50
+        self.reaper.touch('2000')
+        self.assertEqual(self.reaper.expired(now=99), [])
+        self.assertEqual(self.reaper.expired(now=100), [('1000', 'idle')])
+        self.assertEqual(self.reaper.expired(now=150), [('2000', 'idle')])
+        self.assertEqual(len(self.reaper), 0)
+
+    def test_activity_extends_deadline(self):
+        """测试房间有活动时推迟回收"""
+        self.reaper.touch('1000')
+        self.clock.now = 90
+        self.reaper.touch('1000')
+        self.assertEqual(self.reaper.expired(now=100), [])
+        self.assertEqual(self.reaper.expired(now=190), [('1000', 'idle')])
+
+    def test_finished_rooms_use_short_ttl(self):
+        """测试已结束的游戏使用较短的保留时间"""
+        self.reaper.touch('1000')
+        self.reaper.mark_finished('1000')
+        self.assertEqual(self.reaper.expired(now=10), [('1000', 'finished')])
+
+    def test_forget(self):
+        """测试已关闭的房间不会再被回收"""
+        self.reaper.touch('1000')
+        self.reaper.forget('1000')
+        self.assertEqual(self.reaper.expired(now=1000), [])
+
+    def test_over_capacity_evicts_least_recently_active(self):
+        """测试超过房间上限时回收最久没有活动的已结束房间"""
+        for i, room in enumerate(['1000', '2000', '3000', '4000', '5000']):
+            self.clock.now = i
+            self.reaper.touch(room)
+            self.reaper.mark_finished(room)
+        self.clock.now = 10
+        self.reaper.touch('1000')
+        self.assertEqual(self.reaper.over_capacity(), [('2000', 'capacity'), ('3000', 'capacity')])
+        self.assertEqual(len(self.reaper), 3)
+
+    def test_over_capacity_keeps_live_games(self):
+        """测试容量回收跳过进行中的房间，只剩进行中的房间时不再回收"""
+        for i, room in enumerate(['1000', '2000', '3000', '4000', '5000']):
+            self.clock.now = i
+            self.reaper.touch(room)
+        self.reaper.mark_finished('4000')
+        self.assertEqual(self.reaper.over_capacity(), [('4000', 'capacity')])
+        self.assertEqual(self.reaper.over_capacity(), [])
+        self.assertEqual(len(self.reaper), 4)
+
+    def test_reopen(self):
+        """测试重新有人的房间恢复使用空闲超时"""
+        self.reaper.touch('1000')
+        self.reaper.mark_finished('1000')
+        self.reaper.reopen('1000')
+        self.assertEqual(self.reaper.expired(now=10), [])
+        self.assertEqual(self.reaper.over_capacity(), [])
+        self.assertEqual(self.reaper.expired(now=100), [('1000', 'idle')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,445 @@
+import unittest
+import sys
+import os
+import socketserver
+import tempfile
+import threading
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import app, socketio, rooms, games, game_states
+from avalon import AvalonGame
+from room_store import MemoryStore, SQLiteStore, RedisStore, CachedStore, StoreError, open_store
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    """本地替代 Redis 的最小 RESP 服务，只实现 RedisStore 用到的命令"""
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def handle(self):
+        watched = {}  # 键 -> WATCH 时的修改计数
+        queued = None  # MULTI 之后排队的命令
+        while True:
+            command = self.read_command()
+            if command is None:
+                return
+            name, args = command[0].upper(), command[1:]
+            self.server.commands.append(name)
+            with self.server.lock:
+                if name == b'WATCH':
+                    watched.update((key, self.server.writes.get(key, 0)) for key in args)
+                    reply = 'OK'
+                elif name == b'UNWATCH':
+                    watched.clear()
+                    reply = 'OK'
+                elif name == b'MULTI':
+                    queued = []
+                    reply = 'OK'
+                elif name == b'EXEC':
+                    if any(self.server.writes.get(key, 0) != count for key, count in watched.items()):
+                        reply = None
+                    else:
+                        reply = [self.run(*command) for command in queued]
+                    watched.clear()
+                    queued = None
+                elif queued is not None:
+                    queued.append((name, args))
+                    reply = 'QUEUED'
+                else:
+                    reply = self.run(name, args)
+            self.wfile.write(self.encode(reply))
+
+    def run(self, name, args):
+        data = self.server.data
+        written = {b'MSET': args[::2], b'SET': args[:1], b'DEL': args}.get(name, ())
+        for key in written:
+            self.server.writes[key] = self.server.writes.get(key, 0) + 1
+        if name == b'GET':
+            return data.get(args[0])
+        if name == b'MGET':
+            return [data.get(key) for key in args]
+        if name == b'MSET':
+            for key, value in zip(args[::2], args[1::2]):
+                data[key] = value
+            return 'OK'
+        if name == b'SET':
+            if b'NX' in args[2:] and args[0] in data:
+                return None
+            data[args[0]] = args[1]
+            return 'OK'
+        if name == b'DEL':
+            return sum(data.pop(key, None) is not None for key in args)
+        if name == b'SADD':
+            members = data.setdefault(args[0], set())
+            reply = len(set(args[1:]) - members)
+            members.update(args[1:])
+            return reply
+        if name == b'SREM':
+            members = data.get(args[0], set())
+            reply = len(members & set(args[1:]))
+            members.difference_update(args[1:])
+            return reply
+        if name == b'SMEMBERS':
+            return list(data.get(args[0], ()))
+        return StoreError(f"ERR unknown command '{name.decode()}'")
+
+    def encode(self, reply):
+        if reply is None:
+            return b'$-1\r\n'
+        if isinstance(reply, StoreError):
+            return b'-%s\r\n' % str(reply).encode()
+        if isinstance(reply, str):
+            return b'+%s\r\n' % reply.encode()
+        if isinstance(reply, int):
+            return b':%d\r\n' % reply
+        if isinstance(reply, bytes):
+            return b'$%d\r\n%s\r\n' % (len(reply), reply)
+        return b'*%d\r\n' % len(reply) + b''.join(self.encode(item) for item in reply)
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RespHandler)
+        self.data = {}
+        self.writes = {}  # 键 -> 修改次数，用于 WATCH
+        self.commands = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class StoreContract:
+    """所有存储后端共同的行为"""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        """测试前的设置"""
+        self.store = self.make_store()
+
+    def tearDown(self):
+        """测试后的清理"""
+        self.store.close()
+
+    def test_save_and_load(self):
+        """测试记录写入后原样读回，不存在的房间返回 None"""
+        record = {'players': [1, 2], 'started': False, 'game': None, 'version': 3}
+        self.store.save('1234', record)
+        self.assertEqual(self.store.load('1234'), record)
+        self.assertIsNone(self.store.load('9999'))
+
+    def test_batched(self):
+        """测试批量读取记录和版本号"""
+        records = {str(1000 + i): {'players': [1], 'started': False, 'game': None, 'version': i}
+                   for i in range(20)}
+        for room, record in records.items():
+            self.store.save(room, record)
+        self.assertEqual(self.store.load_many(list(records) + ['9999']), records)
+        self.assertEqual(self.store.versions(list(records) + ['9999']), {room: i for i, room in enumerate(records)})
+        self.assertEqual(sorted(self.store.room_ids()), sorted(records))
+
+    def test_create_only_once(self):
+        """测试 create 只在房间不存在时成功"""
+        self.assertTrue(self.store.create('1234', {'version': 0}))
+        self.assertFalse(self.store.create('1234', {'version': 5}))
+        self.assertEqual(self.store.load('1234'), {'version': 0})
+
+    def test_delete(self):
+        """测试删除房间"""
+        self.store.save('1234', {'version': 1})
+        self.store.delete('1234')
+        self.assertIsNone(self.store.load('1234'))
+        self.assertEqual(self.store.room_ids(), [])
+
+    def test_save_if_version_matches(self):
+        """测试条件写入：版本号不是读取时的版本号时不写入"""
+        self.assertTrue(self.store.create('1234', {'version': 0}))
+        self.assertTrue(self.store.save_if('1234', {'version': 1, 'by': 'a'}, 0))
+        self.assertFalse(self.store.save_if('1234', {'version': 1, 'by': 'b'}, 0))
+        self.assertEqual(self.store.load('1234'), {'version': 1, 'by': 'a'})
+        self.assertTrue(self.store.save_if('1234', {'version': 2, 'by': 'b'}, 1))
+        # 不存在的房间视为版本 0
+        self.assertFalse(self.store.save_if('5678', {'version': 3}, 2))
+        self.assertTrue(self.store.save_if('5678', {'version': 1}, 0))
+        self.assertEqual(sorted(self.store.room_ids()), ['1234', '5678'])
+
+
+class TestMemoryStore(StoreContract, unittest.TestCase):
+    def make_store(self):
+        return MemoryStore()
+
+
+class TestSQLiteStore(StoreContract, unittest.TestCase):
+    def make_store(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        return SQLiteStore(os.path.join(self.tmp.name, 'rooms.db'))
+
+    def test_shared_between_connections(self):
+        """测试另一个连接（另一个进程）可以读到写入的房间"""
+        self.store.save('1234', {'version': 1})
+        other = SQLiteStore(os.path.join(self.tmp.name, 'rooms.db'))
+        try:
+            self.assertEqual(other.load('1234'), {'version': 1})
+            mode, = other._db.execute('PRAGMA journal_mode').fetchone()
+            self.assertEqual(mode, 'wal')
+        finally:
+            other.close()
+
+
+class TestRedisStore(StoreContract, unittest.TestCase):
+    def make_store(self):
+        self.server = RespServer()
+        self.addCleanup(self.server.stop)
+        return open_store(f"redis://127.0.0.1:{self.server.server_address[1]}/0")
+
+    def test_pipelined(self):
+        """测试一次写入（记录、版本号和房间集合）、批量读取版本号和记录各只有一次往返"""
+        conn = self.store.conn
+        self.store.save('1000', {'version': 1})
+        self.assertEqual(conn.round_trips, 1)
+        self.store.save('2000', {'version': 1})
+        self.assertEqual(self.store.versions(['1000', '2000', '3000']), {'1000': 1, '2000': 1})
+        self.assertEqual(conn.round_trips, 3)
+        self.store.load_many(['1000', '2000', '3000'])
+        self.assertEqual(conn.round_trips, 4)
+        self.assertEqual(self.server.commands[-7:], [b'MULTI', b'SET', b'SET', b'SADD', b'EXEC', b'MGET', b'MGET'])
+
+    def test_save_if_is_transactional(self):
+        """测试条件写入使用 WATCH/MULTI/EXEC"""
+        self.store.save_if('1000', {'version': 1}, 0)
+        self.assertEqual(self.server.commands, [b'WATCH', b'GET', b'MULTI', b'SET', b'SET', b'SADD', b'EXEC'])
+        self.server.commands.clear()
+        self.assertFalse(self.store.save_if('1000', {'version': 2}, 0))
+        self.assertEqual(self.server.commands, [b'WATCH', b'GET', b'UNWATCH'])
+
+    def test_connection_shared_between_threads(self):
+        """测试多个线程共用一个连接时每个请求收到自己的回复"""
+        records = {str(1000 + i): {'version': i} for i in range(8)}
+        for room, record in records.items():
+            self.store.save(room, record)
+        mismatches = []
+
+        def reader(room):
+            for _ in range(50):
+                if self.store.load(room) != records[room]:
+                    mismatches.append(room)
+
+        threads = [threading.Thread(target=reader, args=(room,)) for room in records]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(mismatches, [])
+
+    def test_error_reply(self):
+        """测试错误回复抛出 StoreError"""
+        with self.assertRaises(StoreError):
+            self.store.conn.execute(('FLUSHALL',))
+
+    def test_unavailable(self):
+        """测试服务不可用时抛出 StoreError"""
+        port = self.server.server_address[1]
+        self.server.stop()
+        store = RedisStore('127.0.0.1', port)
+        with self.assertRaises(StoreError):
+            store.load('1234')
+
+
+class TestCachedStore(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置"""
+        self.backend = MemoryStore()
+        self.store = CachedStore(self.backend)
+
+    def test_cached_until_version_changes(self):
+        """测试版本号未变时使用缓存的记录，其他进程写入新版本后立即读到"""
+        self.backend.save('1234', {'version': 1})
+        record = self.store.load('1234')
+        self.assertEqual(record, {'version': 1})
+        self.assertIs(self.store.load('1234'), record)
+        self.assertEqual((self.store.hits, self.store.misses), (1, 1))
+        self.backend.save('1234', {'version': 2})
+        self.assertEqual(self.store.load('1234'), {'version': 2})
+        self.assertEqual((self.store.hits, self.store.misses), (1, 2))
+        self.backend.delete('1234')
+        self.assertIsNone(self.store.load('1234'))
+
+    def test_batched_reads(self):
+        """测试批量读取只从后端读取版本号变化的房间"""
+        for room in ('1000', '2000', '3000'):
+            self.store.save(room, {'version': 1})
+        self.backend.save('2000', {'version': 2})
+        loaded = []
+        load_many = self.backend.load_many
+        self.backend.load_many = lambda rooms: loaded.append(list(rooms)) or load_many(rooms)
+        result = self.store.load_many(['1000', '2000', '3000', '4000'])
+        self.assertEqual(result, {'1000': {'version': 1}, '2000': {'version': 2}, '3000': {'version': 1}})
+        self.assertEqual(loaded, [['2000']])
+
+    def test_conditional_write(self):
+        """测试条件写入成功时更新缓存，失败时丢弃缓存"""
+        other = CachedStore(self.backend)
+        self.store.save('1234', {'version': 1})
+        self.assertEqual(other.load('1234'), {'version': 1})
+        self.assertTrue(self.store.save_if('1234', {'version': 2}, 1))
+        self.assertEqual(other.load('1234'), {'version': 2})
+        self.assertFalse(self.store.save_if('1234', {'version': 2, 'stale': True}, 1))
+        self.assertNotIn('1234', self.store._cache)
+        self.assertEqual(self.store.load('1234'), {'version': 2})
+
+    def test_write_through(self):
+        """测试写入同时更新缓存，删除后不再命中"""
+        self.store.save('1234', {'version': 1})
+        self.assertEqual(self.store.load('1234'), {'version': 1})
+        self.assertEqual(self.store.misses, 0)
+        self.store.delete('1234')
+        self.assertIsNone(self.store.load('1234'))
+        self.assertIsNone(self.backend.load('1234'))
+
+
+class TestSharedRooms(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置"""
+        app.config['TESTING'] = True
+        self.backend = MemoryStore()
+        app_module.room_store = CachedStore(self.backend)
+        rooms.clear()
+        games.clear()
+
+    def tearDown(self):
+        """测试后的清理"""
+        app_module.room_store = None
+        rooms.clear()
+        games.clear()
+
+    def forget_local(self, game_id):
+        """模拟另一个进程：本地没有该房间的任何状态"""
+        rooms.pop(game_id)
+        games.pop(game_id, None)
+        game_states.pop(game_id)
+        app_module.room_scheduler.close(game_id)
+
+    def test_room_written_once_per_event(self):
+        """测试每个被接受的事件写入一次，记录带递增的版本号"""
+        host = socketio.test_client(app)
+        host.emit('create_game')
+        game_id = host.get_received()[0]['args'][0]['game_id']
+        self.assertEqual(self.backend.load(game_id)['version'], 1)
+        guest = socketio.test_client(app)
+        guest.emit('join_game', {'game_id': game_id})
+        record = self.backend.load(game_id)
+        self.assertEqual(record['version'], 2)
+        self.assertEqual(record['players'], [1, 2])
+
+        # 被拒绝的事件不写入
+        guest.emit('join_game', {'game_id': game_id})
+        self.assertEqual(self.backend.load(game_id)['version'], 2)
+
+    def test_any_instance_serves_room(self):
+        """测试本地没有的房间从共享存储加载后继续游戏"""
+        host = socketio.test_client(app)
+        host.emit('create_game')
+        game_id = host.get_received()[0]['args'][0]['game_id']
+        clients = [host] + [socketio.test_client(app) for _ in range(4)]
+        for client in clients[1:]:
+            client.emit('join_game', {'game_id': game_id})
+        host.emit('start_game_manual', {'game_id': game_id})
+        host.emit('propose_team', {'game_id': game_id, 'team': [1, 2]})
+        expected = games[game_id].to_state()
+        self.forget_local(game_id)
+
+        observer = socketio.test_client(app)
+        observer.emit('validate_game', {'game_id': game_id})
+        reply = observer.get_received()[-1]['args'][0]
+        self.assertTrue(reply['valid'])
+        self.assertEqual(reply['player_count'], 5)
+        self.assertEqual(games[game_id].to_state(), expected)
+        self.assertEqual([p['number'] for p in rooms[game_id]['players']], [1, 2, 3, 4, 5])
+
+        # 另一个进程修改了房间：下一个事件之前重新加载
+        record = self.backend.load(game_id)
+        other = AvalonGame.from_state(record['game'])
+        other.cast_team_vote(0, True)
+        self.backend.save(game_id, {**record, 'game': other.to_state(), 'version': record['version'] + 1})
+        observer.emit('request_game_state', {'game_id': game_id})
+        self.assertEqual(games[game_id].team_ballot.votes(), {0: True})
+
+    def test_concurrent_write_discarded(self):
+        """测试处理事件期间另一个进程修改了房间：本地修改不写入，重新加载并通知发送者"""
+        host = socketio.test_client(app)
+        host.emit('create_game')
+        game_id = host.get_received()[0]['args'][0]['game_id']
+        clients = [host] + [socketio.test_client(app) for _ in range(4)]
+        for client in clients[1:]:
+            client.emit('join_game', {'game_id': game_id})
+        host.emit('start_game_manual', {'game_id': game_id})
+        host.emit('propose_team', {'game_id': game_id, 'team': [1, 2]})
+        for client in clients:
+            client.get_received()
+
+        sync_room = app_module.sync_room
+
+        def sync_then_other_writes(room):
+            # 本进程读取之后，另一个进程抢先写入了第5名玩家的表决
+            exists = sync_room(room)
+            record = self.backend.load(room)
+            other = AvalonGame.from_state(record['game'])
+            other.cast_team_vote(4, False)
+            self.backend.save(room, {**record, 'game': other.to_state(), 'version': record['version'] + 1})
+            return exists
+
+        self.addCleanup(setattr, app_module, 'sync_room', sync_room)
+        app_module.sync_room = sync_then_other_writes
+        version = self.backend.load(game_id)['version']
+        clients[1].emit('team_vote', {'game_id': game_id, 'player_id': 2, 'vote': True})
+        app_module.sync_room = sync_room
+
+        self.assertEqual(self.backend.load(game_id)['version'], version + 1)
+        self.assertEqual(games[game_id].team_ballot.votes(), {4: False})
+        errors = [m['args'][0]['message'] for m in clients[1].get_received() if m['name'] == 'error']
+        self.assertEqual(errors, ['房间状态已被其他服务器更新，请重试'])
+        snapshots = [m['args'][0] for m in clients[0].get_received() if m['name'] == 'game_state']
+        self.assertFalse(snapshots[-1]['delta'])
+
+    def test_closed_room_removed(self):
+        """测试回收房间时从共享存储删除"""
+        host = socketio.test_client(app)
+        host.emit('create_game')
+        game_id = host.get_received()[0]['args'][0]['game_id']
+        app_module.evict_room(game_id, 'idle')
+        self.assertIsNone(self.backend.load(game_id))
+
+    def test_game_id_taken_elsewhere(self):
+        """测试共享存储中已被占用的游戏ID不会分配"""
+        allocator = app_module.game_id_allocator
+        taken = set()
+        for _ in range(50):
+            game_id = allocator.allocate()
+            allocator.release(game_id)
+            self.backend.create(game_id, {'version': 0})
+            taken.add(game_id)
+        for _ in range(20):
+            self.assertNotIn(app_module.generate_game_id(), taken)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import app, socketio, rooms, games, spectator_hub, flush_spectators, emit_messages, emit_recipients
+from helpers import start_five_player_game
+from spectators import SpectatorHub, sanitize
+
+
+class TestSpectatorHub(unittest.TestCase):
+    def test_publish_only_with_watchers(self):
+        """测试没有观众的房间不保存事件，私有事件不转发"""
+        hub = SpectatorHub()
+        hub.publish('1234', 'game_state', {'leader': 1})
+        self.assertEqual(hub.take(), [])
+        hub.watch('1234', 'a')
+        hub.publish('1234', 'role_info', {'role': '梅林'})
+        hub.publish('1234', 'game_state', {'leader': 1})
+        self.assertEqual(hub.take(), [('1234', 1, [['game_state', {'leader': 1}]])])
+        self.assertEqual(hub.take(), [])
+
+    def test_sanitize(self):
+        """测试去掉角色和阵营字段，没有私有字段时不复制"""
+        data = {'team': [1, 2]}
+        self.assertIs(sanitize(data), data)
+        self.assertEqual(sanitize({'team': [1], 'camps': ['邪恶方'], 'role_info': {}}), {'team': [1]})
+
+    def test_overflow_falls_back_to_snapshot(self):
+        """测试待发事件超过上限时改为发送快照"""
+        hub = SpectatorHub(max_pending=3)
+        hub.watch('1234', 'a')
+        for i in range(5):
+            hub.publish('1234', 'game_state', {'version': i})
+        self.assertEqual(hub.take(), [('1234', 1, None)])
+
+    def test_watcher_limit_and_switch(self):
+        """测试观众上限，以及观看另一个房间时退出原来的房间"""
+        hub = SpectatorHub(max_watchers=1)
+        self.assertTrue(hub.watch('1234', 'a'))
+        self.assertFalse(hub.watch('1234', 'b'))
+        self.assertTrue(hub.watch('5678', 'a'))
+        self.assertEqual(hub.watchers('1234'), set())
+        self.assertEqual(hub.unwatch('a'), '5678')
+        self.assertEqual(len(hub), 0)
+
+
+class TestSpectating(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置：5名玩家开始游戏"""
+        app.config['TESTING'] = True
+        rooms.clear()
+        games.clear()
+        self.game_id, self.players = start_five_player_game()
+
+    def tearDown(self):
+        """测试后的清理"""
+        for client in self.players:
+            client.disconnect()
+        rooms.clear()
+        games.clear()
+
+    def spectate(self):
+        client = socketio.test_client(app)
+        client.emit('spectate_game', {'game_id': self.game_id})
+        received = client.get_received()
+        self.assertEqual(received[-1]['name'], 'spectating')
+        return client, received[-1]['args'][0]
+
+    def updates(self, client):
+        return [m['args'][0] for m in client.get_received() if m['name'] == 'spectator_update']
+
+    def play_round(self):
+        game = games[self.game_id]
+        self.players[game.leader_index].emit('propose_team', {'game_id': self.game_id, 'team': [1, 2]})
+        for i, client in enumerate(self.players):
+            client.emit('team_vote', {'game_id': self.game_id, 'player_id': i + 1, 'vote': False})
+
+    def test_snapshot_has_no_roles(self):
+        """测试观战快照只包含公开状态"""
+        watcher, snapshot = self.spectate()
+        self.assertEqual(snapshot['player_count'], 5)
+        self.assertTrue(snapshot['started'])
+        self.assertEqual(snapshot['state']['current_quest'], 1)
+        self.assertNotIn('role_info', snapshot)
+        watcher.disconnect()
+        self.assertEqual(len(spectator_hub), 0)
+
+    def test_frames_batched_and_shared(self):
+        """测试观众在后台发送时收到合并的一帧，一帧只编码一次发给所有观众"""
+        watchers = [self.spectate()[0] for _ in range(3)]
+        self.play_round()
+        # 玩家立即收到结果，观众在下一次发送前什么也收不到
+        self.assertIn('team_vote_result', [m['name'] for m in self.players[0].get_received()])
+        self.assertEqual(self.updates(watchers[0]), [])
+
+        messages = emit_messages.values['spectator_update']
+        recipients = emit_recipients.values['spectator_update']
+        flush_spectators()
+        self.assertEqual(emit_messages.values['spectator_update'] - messages, 1)
+        self.assertEqual(emit_recipients.values['spectator_update'] - recipients, 3)
+        frames = [self.updates(w) for w in watchers]
+        self.assertEqual(frames[0], frames[1])
+        names = [event for event, _ in frames[0][0]['events']]
+        self.assertEqual(names, ['team_proposed', 'team_vote_result', 'game_state'])
+        for client in watchers:
+            client.disconnect()
+
+    def test_slow_watcher_skipped_then_resynced(self):
+        """测试积压过多的观众跳过当前帧，恢复后收到快照"""
+        fast, _ = self.spectate()
+        slow, _ = self.spectate()
+        slow_sid = socketio.server.manager.sid_from_eio_sid(slow.eio_sid, '/')
+        self.addCleanup(setattr, app_module, 'outbound_backlog', app_module.outbound_backlog)
+        backlog = {slow_sid: app_module.SPECTATOR_MAX_BACKLOG + 1}
+        app_module.outbound_backlog = lambda sid: backlog.get(sid, 0)
+
+        self.play_round()
+        flush_spectators()
+        self.assertEqual(len(self.updates(fast)), 1)
+        self.assertEqual(self.updates(slow), [])
+
+        backlog.clear()
+        self.play_round()
+        flush_spectators()
+        self.assertIn('events', self.updates(fast)[0])
+        frame, = self.updates(slow)
+        self.assertEqual(frame['snapshot']['history'][-1]['approvals'], [])
+        fast.disconnect()
+        slow.disconnect()
+
+    def test_spectator_sees_posterior(self):
+        """测试观众在游戏进行中可以查看角色推断，玩家不可以"""
+        watcher, _ = self.spectate()
+        self.play_round()
+        watcher.emit('request_role_probabilities', {'game_id': self.game_id})
+        self.assertEqual(watcher.get_received()[-1]['name'], 'role_probabilities')
+        self.players[0].emit('request_role_probabilities', {'game_id': self.game_id})
+        self.assertEqual(self.players[0].get_received()[-1]['name'], 'error')
+        watcher.disconnect()
+
+
+if __name__ == '__main__':
+    unittest.main()
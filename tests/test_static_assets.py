@@ -0,0 +1,54 @@
+import unittest
+import gzip
+import sys
+import os
+from werkzeug.exceptions import NotFound
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, index, static_asset, static_assets, index_page
+
+class TestStaticAssets(unittest.TestCase):
+    def get(self, view, path, headers=None, **kwargs):
+        with app.test_request_context(path, headers=headers or {}):
+            return view(**kwargs)
+
+    def test_index_is_prerendered_with_hashed_assets(self):
+        """测试页面预先渲染，引用带哈希的本地资源而不是 CDN"""
+        html = index_page.bodies['identity'].decode('utf-8')
+        self.assertIn(static_assets.url('js/app.js'), html)
+        self.assertIn(static_assets.url('vendor/socket.io.min.js'), html)
+        self.assertNotIn('cdnjs.cloudflare.com/ajax/libs/socket.io', html)
+
+    def test_index_gzip_and_304(self):
+        """测试按 Accept-Encoding 发送压缩内容，ETag 匹配时返回 304"""
+        response = self.get(index, '/', {'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        self.assertEqual(gzip.decompress(response.get_data()), index_page.bodies['identity'])
+        
+        etag = response.headers['ETag']
+        response = self.get(index, '/', {'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b'')
+        
+        # 不支持压缩的客户端拿到原文和不同的 ETag
+        response = self.get(index, '/', {'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_hashed_asset_is_immutable(self):
+        """测试带哈希的资源可以永久缓存，未知地址返回 404"""
+        url = static_assets.url('js/app.js')
+        filename = url[len('/assets/'):]
+        response = self.get(static_asset, url, filename=filename)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('javascript', response.headers['Content-Type'])
+        with self.assertRaises(NotFound):
+            self.get(static_asset, '/assets/js/app.js', filename='js/app.js')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import app, socketio, rooms, games, game_states, phase_timeouts
+from helpers import start_five_player_game
+from timer_wheel import TimerWheel
+
+
+class TestTimerWheel(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置：3层、每层4个槽，最低层每个 tick 1 秒"""
+        self.now = 0.0
+        self.wheel = TimerWheel(tick=1, slots=4, levels=3, clock=lambda: self.now)
+
+    def fire_times(self, delays, until):
+        for delay in delays:
+            self.wheel.schedule(delay, delay)
+        fired = {}
+        for second in range(1, until + 1):
+            for payload in self.wheel.advance(second):
+                fired[payload] = second
+        return fired
+
+    def test_fires_on_time_across_levels(self):
+        """测试各层的定时器都在到期的 tick 触发（包括需要逐层下移的）"""
+        delays = [1, 3, 4, 5, 15, 16, 17, 40, 63, 64, 100]
+        fired = self.fire_times(delays, 120)
+        self.assertEqual(fired, {delay: delay for delay in delays})
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_rounds_up_to_tick(self):
+        """测试不足一个 tick 的延迟向上取整"""
+        fired = self.fire_times([0, 0.2, 2.5], 5)
+        self.assertEqual(fired, {0: 1, 0.2: 1, 2.5: 3})
+
+    def test_cancel(self):
+        """测试取消的定时器不再触发，重复取消没有影响"""
+        keep = self.wheel.schedule(20, 'keep')
+        drop = self.wheel.schedule(20, 'drop')
+        drop.cancel()
+        drop.cancel()
+        self.assertFalse(drop.active)
+        self.assertEqual(self.wheel.advance(20), ['keep'])
+        self.assertFalse(keep.active)
+
+    def test_advance_catches_up(self):
+        """测试一次推进多个 tick 时按到期顺序返回"""
+        for delay in (9, 2, 30):
+            self.wheel.schedule(delay, delay)
+        self.assertEqual(self.wheel.advance(31), [2, 9, 30])
+
+
+class TestPhaseDeadlines(unittest.TestCase):
+    def setUp(self):
+        """测试前的设置：使用手动推进的时间轮，5名玩家开始游戏"""
+        app.config['TESTING'] = True
+        rooms.clear()
+        games.clear()
+        self.now = 0.0
+        self.patch('deadline_wheel', TimerWheel(tick=1, clock=lambda: self.now))
+        self.game_id, self.clients = start_five_player_game()
+
+    def tearDown(self):
+        """测试后的清理"""
+        for client in self.clients:
+            client.disconnect()
+        rooms.clear()
+        games.clear()
+
+    def patch(self, name, value):
+        self.addCleanup(setattr, app_module, name, getattr(app_module, name))
+        setattr(app_module, name, value)
+
+    def expire(self, phase):
+        """把时间推进到当前阶段的截止时间之后，等待房间 actor 执行默认操作"""
+        self.now += app_module.PHASE_TIMEOUTS[phase] + 1
+        fired = app_module.expire_deadlines(self.now)
+        socketio.sleep(0.01)
+        return fired
+
+    def test_idle_players_act_by_default(self):
+        """测试队长超时自动提名，未表决的玩家赞成，未投票的队员投成功"""
+        game = games[self.game_id]
+        leader = game.leader_index
+        before = phase_timeouts.values['proposal']
+        self.assertEqual(len(self.expire('proposal')), 1)
+        self.assertEqual(phase_timeouts.values['proposal'] - before, 1)
+        self.assertEqual(game.quest_team, [leader, (leader + 1) % 5])
+
+        self.clients[0].emit('team_vote', {'game_id': self.game_id, 'player_id': 1, 'vote': False})
+        self.expire('team_vote')
+        self.assertEqual(game.history[-1][2], 0b11110)
+        self.assertIsNotNone(game.quest_ballot)
+
+        self.expire('quest_vote')
+        self.assertEqual(game.quest_results, [True])
+        names = [m['name'] for m in self.clients[0].get_received()]
+        self.assertEqual(names.count('phase_timeout'), 3)
+        self.assertIn('quest_vote_result', names)
+
+    def test_action_before_deadline_rearms(self):
+        """测试玩家在截止前行动后，旧的截止时间不再生效，新阶段重新计时"""
+        game = games[self.game_id]
+        proposal = game_states[self.game_id]['deadline']
+        self.clients[game.leader_index].emit('propose_team', {'game_id': self.game_id, 'team': [1, 2]})
+        self.assertFalse(proposal.active)
+        self.assertEqual(game_states[self.game_id]['deadline'].payload[1][0], 'team_vote')
+        self.assertEqual(len(app_module.deadline_wheel), 1)
+        fired = self.expire('proposal')
+        self.assertEqual([key[0] for _, key in fired], ['team_vote'])
+        self.assertEqual(game.history[-1][2], 0b11111)
+
+    def test_assassin_timeout_forfeits(self):
+        """测试刺客超时视为放弃刺杀，之后不能再刺杀，房间不再计时"""
+        game = games[self.game_id]
+        game.quest_results = [True, True, True]
+        game.current_quest = 3
+        self.clients[0].emit('request_game_state', {'game_id': self.game_id})
+        self.assertEqual(game_states[self.game_id]['deadline'].payload[1][0], 'assassination')
+        self.expire('assassination')
+        result = [m['args'][0] for m in self.clients[0].get_received() if m['name'] == 'assassination_result']
+        self.assertEqual(result, [{'success': False, 'message': '刺客未在时限内行动！正义方获胜！'}])
+        self.assertNotIn('deadline', game_states[self.game_id])
+
+        self.clients[game.assassin_index].emit('assassinate', {'game_id': self.game_id, 'target': 1})
+        errors = [m for m in self.clients[game.assassin_index].get_received() if m['name'] == 'error']
+        self.assertEqual(errors[0]['args'][0]['message'], '刺杀已经结束')
+
+    def test_assassinate_only_in_assassination_phase(self):
+        """测试正义方完成3次任务之前不能刺杀"""
+        game = games[self.game_id]
+        self.clients[game.assassin_index].emit('assassinate', {'game_id': self.game_id, 'target': 1})
+        errors = [m for m in self.clients[game.assassin_index].get_received() if m['name'] == 'error']
+        self.assertEqual(errors[0]['args'][0]['message'], '现在不是刺杀阶段')
+        self.assertFalse(game_states[self.game_id].get('assassinated'))
+        self.assertEqual(game_states[self.game_id]['deadline'].payload[1][0], 'proposal')
+
+    def test_game_end_cancels(self):
+        """测试连续5次否决结束游戏后不再计时"""
+        game = games[self.game_id]
+        for _ in range(5):
+            self.clients[game.leader_index].emit('propose_team', {'game_id': self.game_id, 'team': [1, 2]})
+            for i, client in enumerate(self.clients):
+                client.emit('team_vote', {'game_id': self.game_id, 'player_id': i + 1, 'vote': False})
+        self.assertEqual(game.vote_track, 5)
+        self.assertNotIn('deadline', game_states[self.game_id])
+        self.assertEqual(len(app_module.deadline_wheel), 0)
+
+    def test_close_room_cancels(self):
+        """测试关闭房间时取消其截止时间"""
+        app_module.close_room(self.game_id)
+        self.assertEqual(len(app_module.deadline_wheel), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
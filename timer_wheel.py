@@ -0,0 +1,91 @@
+import time
+
+
+class Timer:
+    """时间轮中的一个定时器；cancel() 后不会再触发"""
+    __slots__ = ('expires', 'payload', 'bucket')
+
+    def __init__(self, expires: int, payload):
+        self.expires = expires  # 到期的 tick
+        self.payload = payload
+        self.bucket = None  # 所在的槽（集合），已触发或已取消时为 None
+
+    def cancel(self):
+        if self.bucket is not None:
+            self.bucket.discard(self)
+            self.bucket = None
+
+    @property
+    def active(self) -> bool:
+        return self.bucket is not None
+
+
+class TimerWheel:
+    """分层时间轮：所有房间的阶段截止时间共用一个轮子
+
+    第 i 层每个槽覆盖 tick × slots^i 秒。定时器按距离到期的 tick 数放入能容纳它的
+    最低一层；低层转完一圈时把上一层当前槽中的定时器重新分配到更低的层。
+    设置和取消都是 O(1)（槽是集合），推进时每个 tick 只处理到期的槽，
+    与等待中的定时器总数无关。超出最高层范围的定时器先放在最高层，之后逐层下移。
+    """
+
+    def __init__(self, tick: float = 0.25, slots: int = 64, levels: int = 4, clock=time.monotonic):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self._clock = clock
+        self._start = clock()
+        self._now = 0  # 已处理到的 tick
+        self._wheels = [[set() for _ in range(slots)] for _ in range(levels)]
+        self._spans = [slots ** level for level in range(levels + 1)]
+
+    def schedule(self, delay: float, payload) -> Timer:
+        """delay 秒后到期（按 tick 向上取整，至少一个 tick）"""
+        ticks = max(1, -int(-delay // self.tick))
+        timer = Timer(self._now + ticks, payload)
+        self._place(timer)
+        return timer
+
+    def _place(self, timer: Timer):
+        remaining = timer.expires - self._now
+        for level in range(self.levels):
+            if remaining < self._spans[level + 1] or level == self.levels - 1:
+                span = self._spans[level]
+                expires = min(timer.expires, self._now + self._spans[level + 1] - span)
+                bucket = self._wheels[level][(expires // span) % self.slots]
+                bucket.add(timer)
+                timer.bucket = bucket
+                return
+
+    def advance(self, now: float = None) -> list:
+        """推进到 now，返回到期定时器的 payload 列表（按到期顺序）"""
+        if now is None:
+            now = self._clock()
+        target = int((now - self._start) / self.tick)
+        fired = []
+        while self._now < target:
+            self._now += 1
+            # 先把上层对应的槽下移，再处理最低层当前的槽
+            for level in range(1, self.levels):
+                if self._now % self._spans[level]:
+                    break
+                bucket = self._wheels[level][(self._now // self._spans[level]) % self.slots]
+                timers = list(bucket)
+                bucket.clear()
+                for timer in timers:
+                    self._place(timer)
+            bucket = self._wheels[0][self._now % self.slots]
+            if bucket:
+                due = [timer for timer in bucket if timer.expires <= self._now]
+                for timer in due:
+                    bucket.discard(timer)
+                    timer.bucket = None
+                # 被截断到最高层范围内的定时器重新分配
+                for timer in list(bucket):
+                    bucket.discard(timer)
+                    self._place(timer)
+                fired.extend(timer.payload for timer in due)
+        return fired
+
+    def __len__(self):
+        return sum(len(bucket) for wheel in self._wheels for bucket in wheel)